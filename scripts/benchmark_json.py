@@ -0,0 +1,164 @@
+"""
+Benchmark the json backends on raw Azure API responses and parser outputs.
+
+Builds a large response by merging copies of the sixteen page test fixture, then
+reports the encode and decode throughput of each installed backend in MB/s. Parser
+outputs are serialised by pydantic, and are compared against dumping them to python
+objects for orjson.
+
+Run from the repository root: `poetry run python scripts/benchmark_json.py`
+"""
+
+import argparse
+import json
+import logging
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable
+
+from azure.ai.formrecognizer import AnalyzeResult
+from cpr_sdk.parser_models import BackendDocument, ParserInput, ParserOutput
+
+from azure_pdf_parser.base import PDFPagesBatchExtracted
+from azure_pdf_parser.convert import azure_api_response_to_parser_output
+from azure_pdf_parser.serialization import JSON_BACKENDS, orjson
+from azure_pdf_parser.utils import merge_responses
+
+FIXTURE_PATH = Path("tests/data/sample-sixteen-page.json")
+
+
+def best_time(func: Callable[[], Any], repeats: int) -> float:
+    """The fastest of several runs of func, in seconds."""
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def report(name: str, size: int, seconds: float) -> None:
+    """Print the throughput of an operation over size bytes."""
+    print(f"{name:<40} {seconds * 1000:>9.1f} ms {size / seconds / 1e6:>9.1f} MB/s")
+
+
+def large_response(copies: int) -> AnalyzeResult:
+    """Merge copies of the sixteen page fixture into one large response."""
+    data = json.loads(FIXTURE_PATH.read_text())[0]
+    return merge_responses(
+        [
+            PDFPagesBatchExtracted(
+                page_range=(16 * copy + 1, 16 * copy + 16),
+                extracted_content=AnalyzeResult.from_dict(data),
+                batch_number=copy,
+                batch_size_max=16,
+            )
+            for copy in range(copies)
+        ]
+    )
+
+
+def main(copies: int, repeats: int) -> None:
+    logging.disable(logging.WARNING)
+    response = large_response(copies)
+    print(f"Response of {len(response.pages)} pages")
+
+    response_dict = response.to_dict()
+    # Throughputs are all measured against the size of the stdlib json encoding.
+    size = len(json.dumps(response_dict).encode())
+    report("AnalyzeResult.to_dict", size, best_time(response.to_dict, repeats))
+    for name, backend_class in JSON_BACKENDS.items():
+        if name == "orjson" and orjson is None:
+            print("orjson isn't installed, skipping it.")
+            continue
+        backend = backend_class()
+        encoded = backend.dumps(response_dict)
+        report(
+            f"raw response encode ({name})",
+            size,
+            best_time(lambda: backend.dumps(response_dict), repeats),
+        )
+        report(
+            f"raw response decode ({name})",
+            size,
+            best_time(lambda: backend.loads(encoded), repeats),
+        )
+    report(
+        "AnalyzeResult.from_dict",
+        size,
+        best_time(lambda: AnalyzeResult.from_dict(response_dict), repeats),
+    )
+
+    parser_input = ParserInput(
+        document_id="benchmark",
+        document_name="",
+        document_description="",
+        document_cdn_object="benchmark.pdf",
+        document_content_type="application/pdf",
+        document_md5_sum="",
+        document_slug="",
+        document_metadata=BackendDocument(
+            name="",
+            description="",
+            import_id="benchmark",
+            family_import_id="",
+            family_slug="",
+            slug="",
+            publication_ts=datetime(1900, 1, 1),
+            source_url=None,
+            download_url=None,
+            type="",
+            source="",
+            category="",
+            geography="",
+            languages=[],
+            metadata={},
+        ),
+    )
+    parser_output = azure_api_response_to_parser_output(
+        parser_input=parser_input, md5_sum="", api_response=response
+    )
+    encoded_output = parser_output.model_dump_json()
+    size = len(encoded_output.encode())
+    report(
+        "parser output encode (pydantic)",
+        size,
+        best_time(parser_output.model_dump_json, repeats),
+    )
+    report(
+        "parser output decode (pydantic)",
+        size,
+        best_time(lambda: ParserOutput.model_validate_json(encoded_output), repeats),
+    )
+    if orjson is not None:
+        report(
+            "parser output encode (model_dump, orjson)",
+            size,
+            best_time(
+                lambda: orjson.dumps(parser_output.model_dump(mode="json")), repeats
+            ),
+        )
+        report(
+            "parser output decode (orjson, validate)",
+            size,
+            best_time(
+                lambda: ParserOutput.model_validate(orjson.loads(encoded_output)),
+                repeats,
+            ),
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument(
+        "--copies",
+        type=int,
+        default=8,
+        help="Copies of the sixteen page fixture to merge into one response.",
+    )
+    parser.add_argument(
+        "--repeats", type=int, default=5, help="Runs of each operation to time."
+    )
+    args = parser.parse_args()
+    main(copies=args.copies, repeats=args.repeats)
@@ -1,4 +1,9 @@
+from .async_azure_wrapper import AsyncAzureApiWrapper
 from .azure_wrapper import AzureApiWrapper
 from .base import PDFPagesBatchExtracted
+from .cache import AnalyzeResultCache
+from .checkpoint import BatchCheckpointStore
 from .convert import azure_api_response_to_parser_output
 from .experimental_base import ExperimentalParserOutput
+from .rate_limit import AzureRateLimiter
+from .retry import RetryPolicy
@@ -0,0 +1,537 @@
+import asyncio
+import io
+import logging
+import sys
+from contextlib import aclosing
+from operator import attrgetter
+from tempfile import SpooledTemporaryFile
+from typing import (
+    IO,
+    Any,
+    AsyncIterator,
+    Callable,
+    Coroutine,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+    Union,
+)
+
+import aiohttp
+from azure.ai.formrecognizer import AnalyzeResult
+from azure.ai.formrecognizer.aio import DocumentAnalysisClient
+from azure.core.credentials import AzureKeyCredential
+from azure.core.polling import AsyncLROPoller
+
+from .base import (
+    AZURE_API_VERSION,
+    AZURE_MODEL_ID,
+    PDFPagesBatch,
+    PDFPagesBatchExtracted,
+)
+from .cache import AnalyzeResultCache, get_url_identity
+from .checkpoint import BatchCheckpointStore
+from .rate_limit import AzureRateLimiter
+from .retry import RetryPolicy
+from .utils import (
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_DOWNLOAD_CHUNK_SIZE,
+    DEFAULT_SPOOL_MAX_SIZE,
+    calculate_file_md5_sum,
+    calculate_md5_sum,
+    call_api_with_error_handling_async,
+    get_remote_pdf_page_count,
+    iter_batches,
+    merge_responses,
+    shift_page_numbers,
+    split_into_page_ranges,
+)
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+U = TypeVar("U")
+
+
+class AsyncAzureApiWrapper:
+    """
+    Asyncio wrapper for Azure Form Extraction API.
+
+    Mirrors the analyze methods of AzureApiWrapper, but polling, downloads and batch
+    fan-out for large documents are all awaited on the event loop rather than
+    blocking a thread. The wrapper should be closed once finished with, either with
+    `await wrapper.close()` or by using it as an async context manager.
+    """
+
+    def __init__(
+        self,
+        key: str,
+        endpoint: str,
+        rate_limiter: Optional[AzureRateLimiter] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        cache: Optional[AnalyzeResultCache] = None,
+        checkpoint_store: Optional[BatchCheckpointStore] = None,
+    ):
+        """
+        Create an async client for the Azure API.
+
+        If a rate limiter is given, every request the client makes awaits budget from
+        it first, and the retry policy alone decides which failed calls are retried.
+        The cache and checkpoint store are used as in AzureApiWrapper.
+        """
+        logger.info(
+            "Initializing async Azure API wrapper with endpoint...",
+            extra={"props": {"endpoint": endpoint}},
+        )
+        self.rate_limiter = rate_limiter
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.cache = cache
+        self.checkpoint_store = checkpoint_store
+        self.document_analysis_client = DocumentAnalysisClient(
+            endpoint=endpoint,
+            credential=AzureKeyCredential(key),
+            api_version=AZURE_API_VERSION,
+            retry_total=0,
+            **(
+                rate_limiter.client_kwargs(asynchronous=True)
+                if rate_limiter is not None
+                else {}
+            ),
+        )
+
+    async def __aenter__(self) -> "AsyncAzureApiWrapper":
+        """Open the underlying document analysis client."""
+        await self.document_analysis_client.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc_details) -> None:
+        """Close the underlying document analysis client."""
+        await self.document_analysis_client.__aexit__(*exc_details)
+
+    async def close(self) -> None:
+        """Close the underlying document analysis client."""
+        await self.document_analysis_client.close()
+
+    async def analyze_document_from_url(
+        self,
+        doc_url: str,
+        timeout: Optional[Union[int, None]] = None,
+        pages: Optional[str] = None,
+    ) -> AnalyzeResult:
+        """
+        Analyze a pdf document accessible by an endpoint.
+
+        If pages is given, e.g. "1-50", only those pages are analyzed. Note that the
+        page numbers in the result are then those of the whole document.
+        """
+        cache_key = None
+        if self.cache is not None:
+            cache_key = await asyncio.to_thread(self.cache.key_for_url, doc_url, pages)
+            cached_result = await asyncio.to_thread(self.cache.get, cache_key)
+            if cached_result is not None:
+                return cached_result
+
+        logger.info(
+            "Analyzing document from url...",
+            extra={"props": {"url": doc_url, "pages": pages}},
+        )
+        poller = await self.document_analysis_client.begin_analyze_document_from_url(
+            AZURE_MODEL_ID,
+            doc_url,
+            pages=pages,
+        )
+
+        result = await self.poller_loop(poller, timeout=timeout)
+        if self.cache is not None and cache_key is not None:
+            await asyncio.to_thread(self.cache.set, cache_key, result)
+        return result
+
+    async def analyze_document_from_bytes(
+        self, doc_bytes: bytes, timeout: Optional[Union[int, None]] = None
+    ) -> AnalyzeResult:
+        """Analyze a pdf document in the form of bytes."""
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self.cache.key_for_bytes(doc_bytes)
+            cached_result = await asyncio.to_thread(self.cache.get, cache_key)
+            if cached_result is not None:
+                return cached_result
+
+        logger.info(
+            "Analyzing document from bytes...",
+            extra={"props": {"bytes_size": sys.getsizeof(doc_bytes)}},
+        )
+        poller = await self.document_analysis_client.begin_analyze_document(
+            AZURE_MODEL_ID,
+            doc_bytes,
+        )
+
+        result = await self.poller_loop(poller, timeout=timeout)
+        if self.cache is not None and cache_key is not None:
+            await asyncio.to_thread(self.cache.set, cache_key, result)
+        return result
+
+    async def analyze_large_document_from_url(
+        self,
+        doc_url: str,
+        timeout: Optional[Union[int, None]] = None,
+        batch_size: Optional[int] = None,
+        max_concurrency: Optional[int] = None,
+        remote_page_ranges: bool = False,
+        max_batch_bytes: Optional[int] = None,
+        on_batch: Optional[Callable[[PDFPagesBatchExtracted], None]] = None,
+    ) -> Tuple[Sequence[PDFPagesBatchExtracted], Optional[AnalyzeResult]]:
+        """
+        Analyze a large pdf document (>1500 pages) accessible by an endpoint.
+
+        The document is streamed asynchronously to a spooled temporary file rather
+        than held in memory, and then analyzed as with
+        analyze_large_document_from_bytes.
+
+        With remote_page_ranges, the document isn't downloaded and Azure analyzes page
+        ranges of the document at the url directly, as in AzureApiWrapper.
+
+        If on_batch is given, each batch is passed to it as soon as it has been
+        analyzed instead of being collected, as in AzureApiWrapper.
+        """
+        if remote_page_ranges:
+            page_count = await asyncio.to_thread(get_remote_pdf_page_count, doc_url)
+            if page_count is not None:
+                return await self._analyze_remote_page_ranges(
+                    doc_url=doc_url,
+                    page_count=page_count,
+                    timeout=timeout,
+                    batch_size=batch_size,
+                    max_concurrency=max_concurrency,
+                    on_batch=on_batch,
+                )
+            logger.warning(
+                "Failed to read remote page count, downloading document instead...",
+                extra={"props": {"url": doc_url}},
+            )
+
+        logger.info(
+            "Analyzing large document from url by splitting into individual pages...",
+            extra={"props": {"url": doc_url}},
+        )
+        with await call_api_with_error_handling_async(
+            func=self._download_document,
+            retries=3,
+            retry_policy=self.retry_policy,
+            doc_url=doc_url,
+        ) as document_file:
+            return await self._analyze_large_document(
+                document_file=document_file,
+                timeout=timeout,
+                batch_size=batch_size,
+                max_concurrency=max_concurrency,
+                max_batch_bytes=max_batch_bytes,
+                on_batch=on_batch,
+            )
+
+    async def analyze_large_document_from_bytes(
+        self,
+        doc_bytes: bytes,
+        timeout: Optional[Union[int, None]] = None,
+        batch_size: Optional[int] = None,
+        max_concurrency: Optional[int] = None,
+        max_batch_bytes: Optional[int] = None,
+        on_batch: Optional[Callable[[PDFPagesBatchExtracted], None]] = None,
+    ) -> Tuple[Sequence[PDFPagesBatchExtracted], Optional[AnalyzeResult]]:
+        """
+        Analyze a large pdf document (>1500 pages) in the bytes form.
+
+        Splitting the pdf is CPU bound and so runs in a worker thread. All batches are
+        then analyzed concurrently, with at most max_concurrency in flight at once if
+        it is set. Batch results are returned in batch order.
+
+        If max_batch_bytes is set, batches are kept to at most that many bytes, with
+        batch_size as the maximum number of pages in a batch. See split_into_batches.
+
+        If on_batch is given, each batch is passed to it as soon as it has been
+        analyzed instead of being collected. The batches aren't merged, and an empty
+        sequence and None are returned.
+        """
+        logger.info(
+            "Analyzing large document from bytes by splitting into individual pages...",
+            extra={"props": {"bytes_size": sys.getsizeof(doc_bytes)}},
+        )
+        return await self._analyze_large_document(
+            document_file=io.BytesIO(doc_bytes),
+            timeout=timeout,
+            batch_size=batch_size,
+            max_concurrency=max_concurrency,
+            max_batch_bytes=max_batch_bytes,
+            on_batch=on_batch,
+        )
+
+    async def _analyze_large_document(
+        self,
+        document_file: IO[bytes],
+        timeout: Optional[Union[int, None]] = None,
+        batch_size: Optional[int] = None,
+        max_concurrency: Optional[int] = None,
+        max_batch_bytes: Optional[int] = None,
+        on_batch: Optional[Callable[[PDFPagesBatchExtracted], None]] = None,
+    ) -> Tuple[Sequence[PDFPagesBatchExtracted], Optional[AnalyzeResult]]:
+        """
+        Split a pdf document into batches and analyze them concurrently.
+
+        Batches are written lazily in a worker thread, with the next batch only written
+        once there's room for it among the max_concurrency batches in flight.
+        """
+        if max_concurrency is not None and max_concurrency < 1:
+            raise ValueError("Max concurrency must be greater than 0.")
+
+        document_hash = None
+        if self.checkpoint_store is not None:
+            document_hash = await asyncio.to_thread(
+                calculate_file_md5_sum, document_file
+            )
+
+        async def batches() -> AsyncIterator[PDFPagesBatch]:
+            batch_iterator = iter_batches(
+                document_bytes=document_file,
+                batch_size=batch_size,
+                max_batch_bytes=max_batch_bytes,
+            )
+            try:
+                while True:
+                    batch = await asyncio.to_thread(next, batch_iterator, None)
+                    if batch is None:
+                        return
+                    yield batch
+            finally:
+                await asyncio.to_thread(batch_iterator.close)
+
+        async def analyze_batch(batch: PDFPagesBatch) -> PDFPagesBatchExtracted:
+            return PDFPagesBatchExtracted(
+                page_range=batch.page_range,
+                extracted_content=await call_api_with_error_handling_async(
+                    func=self.analyze_document_from_bytes,
+                    retries=3,
+                    retry_policy=self.retry_policy,
+                    doc_bytes=batch.batch_content,
+                    timeout=timeout,
+                ),
+                batch_number=batch.batch_number,
+                batch_size_max=batch.batch_size_max,
+            )
+
+        page_api_responses = await self._gather_batches(
+            analyze_batch=analyze_batch,
+            batches=batches(),
+            page_range=attrgetter("page_range"),
+            max_concurrency=max_concurrency,
+            document_hash=document_hash,
+            on_batch=on_batch,
+        )
+        if on_batch is not None:
+            return page_api_responses, None
+        return page_api_responses, merge_responses(page_api_responses)
+
+    async def _analyze_remote_page_ranges(
+        self,
+        doc_url: str,
+        page_count: int,
+        timeout: Optional[Union[int, None]] = None,
+        batch_size: Optional[int] = None,
+        max_concurrency: Optional[int] = None,
+        on_batch: Optional[Callable[[PDFPagesBatchExtracted], None]] = None,
+    ) -> Tuple[Sequence[PDFPagesBatchExtracted], Optional[AnalyzeResult]]:
+        """Analyze a remote document in page ranges, without downloading it."""
+        if max_concurrency is not None and max_concurrency < 1:
+            raise ValueError("Max concurrency must be greater than 0.")
+
+        batch_size = batch_size or DEFAULT_BATCH_SIZE
+        page_ranges = split_into_page_ranges(page_count, batch_size)
+        logger.info(
+            "Analyzing large document from url in remote page ranges...",
+            extra={
+                "props": {
+                    "url": doc_url,
+                    "page_count": page_count,
+                    "batch_count": len(page_ranges),
+                }
+            },
+        )
+
+        async def batch_numbers() -> AsyncIterator[int]:
+            for batch_number in range(len(page_ranges)):
+                yield batch_number
+
+        async def analyze_page_range(batch_number: int) -> PDFPagesBatchExtracted:
+            first_page, last_page = page_ranges[batch_number]
+            extracted_content = await call_api_with_error_handling_async(
+                func=self.analyze_document_from_url,
+                retries=3,
+                retry_policy=self.retry_policy,
+                doc_url=doc_url,
+                timeout=timeout,
+                pages=f"{first_page}-{last_page}",
+            )
+            # Azure numbers the pages of a range as in the whole document, where
+            # merge_responses expects them numbered from the start of the batch.
+            return PDFPagesBatchExtracted(
+                page_range=(first_page, last_page),
+                extracted_content=shift_page_numbers(
+                    extracted_content, -(first_page - 1)
+                ),
+                batch_number=batch_number,
+                batch_size_max=batch_size,
+            )
+
+        document_hash = None
+        if self.checkpoint_store is not None:
+            url_identity = await asyncio.to_thread(get_url_identity, doc_url)
+            document_hash = calculate_md5_sum(url_identity.encode())
+
+        page_api_responses = await self._gather_batches(
+            analyze_batch=analyze_page_range,
+            batches=batch_numbers(),
+            page_range=page_ranges.__getitem__,
+            max_concurrency=max_concurrency,
+            document_hash=document_hash,
+            on_batch=on_batch,
+        )
+        if on_batch is not None:
+            return page_api_responses, None
+        return page_api_responses, merge_responses(page_api_responses)
+
+    async def _gather_batches(
+        self,
+        analyze_batch: Callable[[T], Coroutine[Any, Any, PDFPagesBatchExtracted]],
+        batches: AsyncIterator[T],
+        page_range: Callable[[T], Tuple[int, int]],
+        max_concurrency: Optional[int] = None,
+        document_hash: Optional[str] = None,
+        on_batch: Optional[Callable[[PDFPagesBatchExtracted], None]] = None,
+    ) -> list[PDFPagesBatchExtracted]:
+        """
+        Analyze the batches of a document concurrently, resuming from checkpoints.
+
+        analyze_batch is called with each batch whose page range isn't already
+        checkpointed for the document with the given hash. Results are returned in
+        page order, unless on_batch is given, in which case each batch is passed to it
+        as soon as it completes instead.
+        """
+        checkpoint_store = self.checkpoint_store if document_hash is not None else None
+        checkpointed_page_ranges: list[Tuple[int, int]] = []
+        collected: list[PDFPagesBatchExtracted] = []
+        collect = on_batch or collected.append
+
+        async def remaining_batches() -> AsyncIterator[T]:
+            async for batch in batches:
+                batch_extracted = (
+                    await asyncio.to_thread(
+                        checkpoint_store.get, document_hash, page_range(batch)
+                    )
+                    if checkpoint_store is not None
+                    else None
+                )
+                if batch_extracted is None:
+                    yield batch
+                else:
+                    checkpointed_page_ranges.append(batch_extracted.page_range)
+                    collect(batch_extracted)
+
+        async def analyze_and_checkpoint(batch: T) -> None:
+            batch_extracted = await analyze_batch(batch)
+            if checkpoint_store is not None:
+                await asyncio.to_thread(
+                    checkpoint_store.save, document_hash, batch_extracted
+                )
+            collect(batch_extracted)
+
+        async with aclosing(batches), aclosing(remaining_batches()) as remaining:
+            await self._map_concurrently(
+                analyze_and_checkpoint, remaining, max_concurrency
+            )
+
+        if checkpointed_page_ranges:
+            logger.info(
+                "Resumed document from batch checkpoints...",
+                extra={
+                    "props": {
+                        "document_hash": document_hash,
+                        "checkpointed_batches": len(checkpointed_page_ranges),
+                    }
+                },
+            )
+        if checkpoint_store is not None:
+            await asyncio.to_thread(checkpoint_store.clear, document_hash)
+        return sorted(collected, key=lambda batch: batch.page_range)
+
+    @staticmethod
+    async def _map_concurrently(
+        func: Callable[[T], Coroutine[Any, Any, U]],
+        items: AsyncIterator[T],
+        max_concurrency: Optional[int],
+    ) -> list[U]:
+        """
+        Apply an async function to items with at most max_concurrency running at once.
+
+        Items are only taken from the iterator once there's room for them, so that
+        only the items in flight are held in memory. Results are returned in the order
+        of the items. If one fails, the others are cancelled and the error is raised.
+        """
+        tasks: list[asyncio.Task] = []
+        running: set[asyncio.Task] = set()
+        try:
+            async for item in items:
+                tasks.append(asyncio.ensure_future(func(item)))
+                running.add(tasks[-1])
+                if max_concurrency is not None and len(running) >= max_concurrency:
+                    done, running = await asyncio.wait(
+                        running, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    for task in done:
+                        # Raise failures as soon as they happen.
+                        task.result()
+            return list(await asyncio.gather(*tasks))
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+
+    @staticmethod
+    async def _download_document(
+        doc_url: str,
+        chunk_size: int = DEFAULT_DOWNLOAD_CHUNK_SIZE,
+        spool_max_size: int = DEFAULT_SPOOL_MAX_SIZE,
+    ) -> IO[bytes]:
+        """
+        Stream a document into a spooled temporary file without blocking the loop.
+
+        See utils.download_document, which this mirrors.
+        """
+        document_file = SpooledTemporaryFile(max_size=spool_max_size)
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.get(doc_url) as resp:
+                    resp.raise_for_status()
+                    async for chunk in resp.content.iter_chunked(chunk_size):
+                        document_file.write(chunk)
+        except Exception:
+            document_file.close()
+            raise
+
+        document_file.seek(0)
+        return document_file  # type: ignore[return-value]
+
+    @staticmethod
+    async def poller_loop(
+        poller: AsyncLROPoller[AnalyzeResult],
+        timeout: Optional[Union[int, None]] = None,
+    ) -> AnalyzeResult:
+        """
+        Await the result of the poller.
+
+        The SDK's async polling method sleeps on the event loop between status
+        requests, so awaiting here doesn't hold a thread.
+        """
+        logger.info(f"Poller status {poller.status()}...")
+        result = await asyncio.wait_for(poller.result(), timeout=timeout)
+        logger.info(f"Poller status {poller.status()}...")
+        return result
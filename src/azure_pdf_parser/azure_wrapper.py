@@ -2,100 +2,269 @@ import io
 import logging
 import sys
 import time
-from io import BytesIO
-from typing import Optional, Sequence, Tuple, Union
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from functools import partial
+from itertools import islice
+from typing import (
+    Callable,
+    Iterable,
+    Iterator,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+    Union,
+)
 
-import requests
 from azure.ai.formrecognizer import AnalyzeResult, DocumentAnalysisClient
 from azure.core.credentials import AzureKeyCredential
 from azure.core.polling import LROPoller
 
-from .base import PDFPagesBatchExtracted
-from .utils import call_api_with_error_handling, merge_responses, split_into_batches
+from .base import (
+    AZURE_API_VERSION,
+    AZURE_MODEL_ID,
+    PDFPagesBatch,
+    PDFPagesBatchExtracted,
+)
+from .cache import AnalyzeResultCache, get_url_identity
+from .checkpoint import BatchCheckpointStore
+from .polling import DeferredLROPolling, PollMultiplexer
+from .rate_limit import AzureRateLimiter
+from .retry import RetryPolicy
+from .utils import (
+    DEFAULT_BATCH_SIZE,
+    calculate_file_md5_sum,
+    calculate_md5_sum,
+    call_api_with_error_handling,
+    download_document,
+    get_remote_pdf_page_count,
+    iter_batches,
+    merge_responses,
+    shift_page_numbers,
+    split_into_page_ranges,
+)
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+R = TypeVar("R")
+
 
 class AzureApiWrapper:
     """Wrapper for Azure Form Extraction API."""
 
-    def __init__(self, key: str, endpoint: str):
+    def __init__(
+        self,
+        key: str,
+        endpoint: str,
+        rate_limiter: Optional[AzureRateLimiter] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        cache: Optional[AnalyzeResultCache] = None,
+        checkpoint_store: Optional[BatchCheckpointStore] = None,
+    ):
+        """
+        Create a client for the Azure API.
+
+        If a rate limiter is given, every request the client makes waits for budget
+        from it first: analyze submissions and status polls from separate budgets. The
+        same rate limiter can be shared between wrappers, threads and, with a file
+        backed limiter, processes.
+
+        The retry policy decides which failed calls made by the large document methods
+        are retried, and how long to back off first. Its counters aggregate the
+        retries made through this wrapper. The SDK's own retries are turned off, so
+        that the policy alone decides retries and its counters reflect every request
+        sent. Callers of the single call methods retry them with
+        call_api_with_error_handling.
+
+        If a cache is given, documents with a cached result aren't sent to Azure. If a
+        checkpoint store is given, each completed batch of a large document is
+        checkpointed, so that analyzing the document again after a failure only
+        submits the batches that are missing.
+        """
         logger.info(
             "Initializing Azure API wrapper with endpoint...",
             extra={"props": {"endpoint": endpoint}},
         )
+        self.rate_limiter = rate_limiter
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.cache = cache
+        self.checkpoint_store = checkpoint_store
         self.document_analysis_client = DocumentAnalysisClient(
             endpoint=endpoint,
             credential=AzureKeyCredential(key),
+            api_version=AZURE_API_VERSION,
+            retry_total=0,
+            **(rate_limiter.client_kwargs() if rate_limiter is not None else {}),
         )
 
     def analyze_document_from_url(
-        self, doc_url: str, timeout: Optional[Union[int, None]] = None
+        self,
+        doc_url: str,
+        timeout: Optional[Union[int, None]] = None,
+        pages: Optional[str] = None,
     ) -> AnalyzeResult:
-        """Analyze a pdf document accessible by an endpoint."""
-        logger.info("Analyzing document from url...", extra={"props": {"url": doc_url}})
+        """
+        Analyze a pdf document accessible by an endpoint.
+
+        If pages is given, e.g. "1-50", only those pages are analyzed. Note that the
+        page numbers in the result are then those of the whole document.
+        """
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self.cache.key_for_url(doc_url, pages)
+            cached_result = self.cache.get(cache_key)
+            if cached_result is not None:
+                return cached_result
+
+        logger.info(
+            "Analyzing document from url...",
+            extra={"props": {"url": doc_url, "pages": pages}},
+        )
         poller = self.document_analysis_client.begin_analyze_document_from_url(
-            "prebuilt-document",
+            AZURE_MODEL_ID,
             doc_url,
+            pages=pages,
         )
 
         self.poller_loop(poller)
 
-        return poller.result(timeout=timeout)
+        result = poller.result(timeout=timeout)
+        if self.cache is not None and cache_key is not None:
+            self.cache.set(cache_key, result)
+        return result
 
     def analyze_document_from_bytes(
         self, doc_bytes: bytes, timeout: Optional[Union[int, None]] = None
     ) -> AnalyzeResult:
         """Analyze a pdf document in the form of bytes."""
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self.cache.key_for_bytes(doc_bytes)
+            cached_result = self.cache.get(cache_key)
+            if cached_result is not None:
+                return cached_result
+
         logger.info(
             "Analyzing document from bytes...",
             extra={"props": {"bytes_size": sys.getsizeof(doc_bytes)}},
         )
         poller = self.document_analysis_client.begin_analyze_document(
-            "prebuilt-document",
+            AZURE_MODEL_ID,
             doc_bytes,
         )
 
         self.poller_loop(poller)
 
-        return poller.result(timeout=timeout)
+        result = poller.result(timeout=timeout)
+        if self.cache is not None and cache_key is not None:
+            self.cache.set(cache_key, result)
+        return result
+
+    def begin_analyze_document_from_bytes(
+        self, doc_bytes: bytes
+    ) -> LROPoller[AnalyzeResult]:
+        """
+        Submit a pdf document in the form of bytes for analysis, without polling it.
+
+        The returned poller makes no status requests of its own. It is intended to be
+        driven by a PollMultiplexer alongside other in-flight operations.
+        """
+        logger.info(
+            "Submitting document from bytes...",
+            extra={"props": {"bytes_size": sys.getsizeof(doc_bytes)}},
+        )
+        return self.document_analysis_client.begin_analyze_document(
+            AZURE_MODEL_ID,
+            doc_bytes,
+            polling=DeferredLROPolling(),
+        )
 
     def analyze_large_document_from_url(
         self,
         doc_url: str,
         timeout: Optional[Union[int, None]] = None,
         batch_size: Optional[int] = None,
-    ) -> Tuple[Sequence[PDFPagesBatchExtracted], AnalyzeResult]:
-        """Analyze a large pdf document (>1500 pages) accessible by an endpoint."""
+        max_concurrency: Optional[int] = None,
+        multiplex_polling: bool = False,
+        remote_page_ranges: bool = False,
+        max_batch_bytes: Optional[int] = None,
+        split_workers: Optional[int] = None,
+        on_batch: Optional[Callable[[PDFPagesBatchExtracted], None]] = None,
+    ) -> Tuple[Sequence[PDFPagesBatchExtracted], Optional[AnalyzeResult]]:
+        """
+        Analyze a large pdf document (>1500 pages) accessible by an endpoint.
+
+        The document is streamed to a spooled temporary file rather than held in
+        memory, and split into batches from there as they are analyzed.
+
+        If max_concurrency is greater than one, up to that many batches are submitted
+        and polled in parallel. If multiplex_polling is set, batches are submitted up
+        front and polled from a single loop instead. Batch results are always returned
+        in batch order.
+
+        With remote_page_ranges, the document isn't downloaded. Its page count is read
+        with HTTP range requests, and Azure analyzes each range of batch_size pages
+        of the document at the url directly. The ranges are analyzed concurrently, up
+        to max_concurrency at once if set. If the page count can't be read, e.g.
+        because the server doesn't support range requests, the document is downloaded
+        and split as usual.
+
+        If max_batch_bytes is set, batches of the downloaded document are kept to at
+        most that many bytes, with batch_size as the maximum number of pages in a
+        batch. See split_into_batches.
+
+        If split_workers is greater than one, batches are written in a pool of that
+        many processes.
+
+        If on_batch is given, each batch is passed to it as soon as it has been
+        analyzed, in the order they finish and possibly from several threads at once,
+        instead of being collected. The batches aren't merged, and an empty sequence
+        and None are returned.
+        """
+        if remote_page_ranges:
+            page_count = get_remote_pdf_page_count(doc_url)
+            if page_count is not None:
+                return self._analyze_remote_page_ranges(
+                    doc_url=doc_url,
+                    page_count=page_count,
+                    timeout=timeout,
+                    batch_size=batch_size,
+                    max_concurrency=max_concurrency,
+                    on_batch=on_batch,
+                )
+            logger.warning(
+                "Failed to read remote page count, downloading document instead...",
+                extra={"props": {"url": doc_url}},
+            )
+
         logger.info(
             "Analyzing large document from url by splitting into individual pages...",
             extra={"props": {"url": doc_url}},
         )
-        resp: requests.Response = call_api_with_error_handling(
-            func=requests.get, retries=3, url=doc_url
-        )
-        if resp.status_code != 200:
-            resp.raise_for_status()
-
-        batches = split_into_batches(
-            document_bytes=BytesIO(resp.content), batch_size=batch_size
-        )
-
-        page_api_responses = [
-            PDFPagesBatchExtracted(
-                page_range=batch.page_range,
-                extracted_content=call_api_with_error_handling(
-                    func=self.analyze_document_from_bytes,
-                    retries=3,
-                    doc_bytes=batch.batch_content,
-                    timeout=timeout,
+        with call_api_with_error_handling(
+            func=download_document,
+            retries=3,
+            retry_policy=self.retry_policy,
+            doc_url=doc_url,
+        ) as document_file:
+            document_hash = calculate_file_md5_sum(document_file)
+            page_api_responses = self._analyze_batches(
+                batches=iter_batches(
+                    document_bytes=document_file,
+                    batch_size=batch_size,
+                    max_batch_bytes=max_batch_bytes,
+                    max_workers=split_workers,
                 ),
-                batch_number=batch.batch_number,
-                batch_size_max=batch.batch_size_max,
+                timeout=timeout,
+                max_concurrency=max_concurrency,
+                multiplex_polling=multiplex_polling,
+                document_hash=document_hash,
+                on_batch=on_batch,
             )
-            for batch in batches
-        ]
 
+        if on_batch is not None:
+            return page_api_responses, None
         return page_api_responses, merge_responses(page_api_responses)
 
     def analyze_large_document_from_bytes(
@@ -103,32 +272,442 @@ class AzureApiWrapper:
         doc_bytes: bytes,
         timeout: Optional[Union[int, None]] = None,
         batch_size: Optional[int] = None,
-    ) -> Tuple[Sequence[PDFPagesBatchExtracted], AnalyzeResult]:
-        """Analyze a large pdf document (>1500 pages) in the bytes form."""
+        max_concurrency: Optional[int] = None,
+        multiplex_polling: bool = False,
+        max_batch_bytes: Optional[int] = None,
+        split_workers: Optional[int] = None,
+        on_batch: Optional[Callable[[PDFPagesBatchExtracted], None]] = None,
+    ) -> Tuple[Sequence[PDFPagesBatchExtracted], Optional[AnalyzeResult]]:
+        """
+        Analyze a large pdf document (>1500 pages) in the bytes form.
+
+        Batches are written as they are analyzed, so at most as many batches as are in
+        flight are held in memory alongside the document.
+
+        If max_concurrency is greater than one, up to that many batches are submitted
+        and polled in parallel. If multiplex_polling is set, batches are submitted up
+        front and polled from a single loop instead. Batch results are always returned
+        in batch order.
+
+        If max_batch_bytes is set, batches are kept to at most that many bytes, with
+        batch_size as the maximum number of pages in a batch. See split_into_batches.
+
+        If split_workers is greater than one, batches are written in a pool of that
+        many processes.
+
+        If on_batch is given, each batch is passed to it as soon as it has been
+        analyzed, in the order they finish and possibly from several threads at once,
+        instead of being collected. The batches aren't merged, and an empty sequence
+        and None are returned.
+        """
         logger.info(
             "Analyzing large document from bytes by splitting into individual pages...",
             extra={"props": {"bytes_size": sys.getsizeof(doc_bytes)}},
         )
-        batches = split_into_batches(
-            document_bytes=io.BytesIO(doc_bytes), batch_size=batch_size
+        page_api_responses = self._analyze_batches(
+            batches=iter_batches(
+                document_bytes=io.BytesIO(doc_bytes),
+                batch_size=batch_size,
+                max_batch_bytes=max_batch_bytes,
+                max_workers=split_workers,
+            ),
+            timeout=timeout,
+            max_concurrency=max_concurrency,
+            multiplex_polling=multiplex_polling,
+            document_hash=calculate_md5_sum(doc_bytes),
+            on_batch=on_batch,
         )
-        page_api_responses = [
-            PDFPagesBatchExtracted(
-                page_range=batch.page_range,
-                extracted_content=call_api_with_error_handling(
-                    func=self.analyze_document_from_bytes,
-                    retries=3,
-                    doc_bytes=batch.batch_content,
-                    timeout=timeout,
+
+        if on_batch is not None:
+            return page_api_responses, None
+        return page_api_responses, merge_responses(page_api_responses)
+
+    def _load_checkpoints(
+        self,
+        document_hash: Optional[str],
+        page_ranges: Sequence[Tuple[int, int]],
+    ) -> dict[Tuple[int, int], PDFPagesBatchExtracted]:
+        """Load the checkpointed batches of a document, keyed by page range."""
+        if self.checkpoint_store is None or document_hash is None:
+            return {}
+        return self.checkpoint_store.load(document_hash, page_ranges)
+
+    def _skip_checkpointed(
+        self,
+        document_hash: Optional[str],
+        batches: Iterable[PDFPagesBatch],
+        on_checkpointed: Callable[[PDFPagesBatchExtracted], None],
+    ) -> Iterator[PDFPagesBatch]:
+        """
+        Lazily filter out the batches of a document that are already checkpointed.
+
+        Checkpointed batches are passed to on_checkpointed as they are passed over.
+        """
+        for batch in batches:
+            batch_extracted = (
+                self.checkpoint_store.get(document_hash, batch.page_range)
+                if self.checkpoint_store is not None and document_hash is not None
+                else None
+            )
+            if batch_extracted is None:
+                yield batch
+            else:
+                on_checkpointed(batch_extracted)
+
+    def _save_checkpoint(
+        self, document_hash: Optional[str], batch: PDFPagesBatchExtracted
+    ) -> None:
+        """Checkpoint a completed batch of a document, if checkpointing."""
+        if self.checkpoint_store is not None and document_hash is not None:
+            self.checkpoint_store.save(document_hash, batch)
+
+    def _clear_checkpoints(self, document_hash: Optional[str]) -> None:
+        """Clear the checkpoints of a document once all its batches have completed."""
+        if self.checkpoint_store is not None and document_hash is not None:
+            self.checkpoint_store.clear(document_hash)
+
+    def _analyze_batch(
+        self,
+        batch: PDFPagesBatch,
+        timeout: Optional[Union[int, None]] = None,
+        document_hash: Optional[str] = None,
+    ) -> PDFPagesBatchExtracted:
+        """Analyze a single batch of pages, retrying on failure."""
+        batch_extracted = PDFPagesBatchExtracted(
+            page_range=batch.page_range,
+            extracted_content=call_api_with_error_handling(
+                func=self.analyze_document_from_bytes,
+                retries=3,
+                retry_policy=self.retry_policy,
+                doc_bytes=batch.batch_content,
+                timeout=timeout,
+            ),
+            batch_number=batch.batch_number,
+            batch_size_max=batch.batch_size_max,
+        )
+        self._save_checkpoint(document_hash, batch_extracted)
+        return batch_extracted
+
+    def _analyze_batches(
+        self,
+        batches: Iterable[PDFPagesBatch],
+        timeout: Optional[Union[int, None]] = None,
+        max_concurrency: Optional[int] = None,
+        multiplex_polling: bool = False,
+        document_hash: Optional[str] = None,
+        on_batch: Optional[Callable[[PDFPagesBatchExtracted], None]] = None,
+    ) -> list[PDFPagesBatchExtracted]:
+        """
+        Analyze batches of pages, optionally with bounded concurrency.
+
+        Batches are taken from the iterable only as they are needed, so a lazy iterable
+        such as iter_batches holds at most as many batches in memory as are in flight.
+
+        With no max_concurrency (or a value of one) batches are analyzed one after
+        another. Otherwise up to max_concurrency batches are in flight at once. If a
+        batch fails after its retries no further batches are started and the error is
+        raised. Results are returned in the order of the input batches.
+
+        With multiplex_polling, batches are polled from a single loop rather than a
+        thread each, and all batches are in flight at once unless max_concurrency is
+        set.
+
+        If checkpointing, batches of the document with the given hash that are
+        already checkpointed aren't analyzed again.
+
+        If on_batch is given, each batch is passed to it as soon as it completes
+        instead of being returned.
+        """
+        if max_concurrency is not None and max_concurrency < 1:
+            raise ValueError("Max concurrency must be greater than 0.")
+
+        analyzed_batches: list[PDFPagesBatchExtracted] = []
+        collect = on_batch or analyzed_batches.append
+        checkpointed_page_ranges: list[Tuple[int, int]] = []
+
+        def collect_checkpointed(batch: PDFPagesBatchExtracted) -> None:
+            checkpointed_page_ranges.append(batch.page_range)
+            collect(batch)
+
+        remaining_batches = self._skip_checkpointed(
+            document_hash, batches, collect_checkpointed
+        )
+
+        def analyze_and_collect(batch: PDFPagesBatch) -> None:
+            collect(self._analyze_batch(batch, timeout, document_hash))
+
+        if multiplex_polling:
+            self._analyze_batches_multiplexed(
+                batches=remaining_batches,
+                timeout=timeout,
+                max_concurrency=max_concurrency,
+                document_hash=document_hash,
+                on_batch=collect,
+            )
+        elif max_concurrency is None or max_concurrency == 1:
+            for batch in remaining_batches:
+                analyze_and_collect(batch)
+        else:
+            logger.info(
+                "Analyzing batches concurrently...",
+                extra={"props": {"max_concurrency": max_concurrency}},
+            )
+            self._map_concurrently(
+                analyze_and_collect, remaining_batches, max_concurrency
+            )
+
+        if checkpointed_page_ranges:
+            logger.info(
+                "Resumed document from batch checkpoints...",
+                extra={
+                    "props": {
+                        "document_hash": document_hash,
+                        "checkpointed_batches": len(checkpointed_page_ranges),
+                    }
+                },
+            )
+        self._clear_checkpoints(document_hash)
+        return sorted(analyzed_batches, key=lambda batch: batch.page_range)
+
+    def _analyze_remote_page_ranges(
+        self,
+        doc_url: str,
+        page_count: int,
+        timeout: Optional[Union[int, None]] = None,
+        batch_size: Optional[int] = None,
+        max_concurrency: Optional[int] = None,
+        on_batch: Optional[Callable[[PDFPagesBatchExtracted], None]] = None,
+    ) -> Tuple[Sequence[PDFPagesBatchExtracted], Optional[AnalyzeResult]]:
+        """
+        Analyze a remote document in page ranges, without downloading it.
+
+        If on_batch is given, each batch is passed to it as soon as it completes
+        instead of being returned, and the batches aren't merged.
+        """
+        if max_concurrency is not None and max_concurrency < 1:
+            raise ValueError("Max concurrency must be greater than 0.")
+
+        batch_size = batch_size or DEFAULT_BATCH_SIZE
+        page_ranges = split_into_page_ranges(page_count, batch_size)
+        logger.info(
+            "Analyzing large document from url in remote page ranges...",
+            extra={
+                "props": {
+                    "url": doc_url,
+                    "page_count": page_count,
+                    "batch_count": len(page_ranges),
+                }
+            },
+        )
+
+        document_hash = None
+        if self.checkpoint_store is not None:
+            document_hash = calculate_md5_sum(get_url_identity(doc_url).encode())
+        checkpointed = self._load_checkpoints(document_hash, page_ranges)
+        if on_batch is not None:
+            for batch_extracted in checkpointed.values():
+                on_batch(batch_extracted)
+
+        def analyze_page_range(
+            batch_number_and_page_range: Tuple[int, Tuple[int, int]],
+        ) -> Optional[PDFPagesBatchExtracted]:
+            batch_number, (first_page, last_page) = batch_number_and_page_range
+            extracted_content = call_api_with_error_handling(
+                func=self.analyze_document_from_url,
+                retries=3,
+                retry_policy=self.retry_policy,
+                doc_url=doc_url,
+                timeout=timeout,
+                pages=f"{first_page}-{last_page}",
+            )
+            # Azure numbers the pages of a range as in the whole document, where
+            # merge_responses expects them numbered from the start of the batch.
+            batch_extracted = PDFPagesBatchExtracted(
+                page_range=(first_page, last_page),
+                extracted_content=shift_page_numbers(
+                    extracted_content, -(first_page - 1)
                 ),
-                batch_number=batch.batch_number,
-                batch_size_max=batch.batch_size_max,
+                batch_number=batch_number,
+                batch_size_max=batch_size,
             )
-            for batch in batches
+            self._save_checkpoint(document_hash, batch_extracted)
+            if on_batch is None:
+                return batch_extracted
+            # Hand the batch off rather than keeping it until all have completed.
+            on_batch(batch_extracted)
+            return None
+
+        remaining_page_ranges = [
+            (batch_number, page_range)
+            for batch_number, page_range in enumerate(page_ranges)
+            if page_range not in checkpointed
         ]
+        analyzed_batches = self._map_concurrently(
+            analyze_page_range,
+            remaining_page_ranges,
+            max_concurrency or len(remaining_page_ranges),
+        )
 
+        self._clear_checkpoints(document_hash)
+        if on_batch is not None:
+            return [], None
+
+        results = {
+            batch.page_range: batch
+            for batch in [*checkpointed.values(), *analyzed_batches]
+            if batch is not None
+        }
+        page_api_responses = [results[page_range] for page_range in page_ranges]
         return page_api_responses, merge_responses(page_api_responses)
 
+    @staticmethod
+    def _map_concurrently(
+        func: Callable[[T], R], items: Iterable[T], max_concurrency: Optional[int]
+    ) -> list[R]:
+        """
+        Call func on each item with up to max_concurrency calls in parallel.
+
+        Items are taken from the iterable only as earlier calls finish, so at most
+        max_concurrency items are held at once. Results are returned in the order of
+        the items. If a call fails, no further items are taken and the error is raised.
+        """
+        if max_concurrency is None or max_concurrency <= 1:
+            return [func(item) for item in items]
+
+        indexed_items = enumerate(items)
+        results: dict[int, R] = {}
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            in_flight: dict[Future[R], int] = {
+                executor.submit(func, item): index
+                for index, item in islice(indexed_items, max_concurrency)
+            }
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results[in_flight.pop(future)] = future.result()
+                    for index, item in islice(indexed_items, 1):
+                        in_flight[executor.submit(func, item)] = index
+
+        return [results[index] for index in range(len(results))]
+
+    def _analyze_batches_multiplexed(
+        self,
+        batches: Iterable[PDFPagesBatch],
+        timeout: Optional[Union[int, None]] = None,
+        max_concurrency: Optional[int] = None,
+        retries: int = 3,
+        document_hash: Optional[str] = None,
+        on_batch: Optional[Callable[[PDFPagesBatchExtracted], None]] = None,
+    ) -> list[PDFPagesBatchExtracted]:
+        """
+        Submit batches and drive all of their pollers from a single loop.
+
+        Up to max_concurrency batches (or all of them) are submitted before polling
+        starts, and further batches are submitted as earlier ones finish. A batch whose
+        analysis fails is resubmitted up to `retries` times in total, unless the retry
+        policy classifies the error as permanent. The resubmission is scheduled in the
+        multiplexer once the policy's backoff has passed, so it honours Retry-After
+        without stalling polling of the other batches.
+
+        Batches are taken from the iterable only as they are submitted, and are
+        released once their analysis completes. If on_batch is given, each batch is
+        passed to it as soon as it completes instead of being returned.
+        """
+        multiplexer: PollMultiplexer[AnalyzeResult] = PollMultiplexer()
+        in_flight: dict[int, PDFPagesBatch] = {}
+        attempts: dict[int, int] = {}
+        results: list[PDFPagesBatchExtracted] = []
+        collect = on_batch or results.append
+
+        def uncached(batches: Iterable[PDFPagesBatch]) -> Iterator[PDFPagesBatch]:
+            for batch in batches:
+                cached_result = (
+                    self.cache.get(self.cache.key_for_bytes(batch.batch_content))
+                    if self.cache is not None
+                    else None
+                )
+                if cached_result is None:
+                    yield batch
+                    continue
+                collect(
+                    PDFPagesBatchExtracted(
+                        page_range=batch.page_range,
+                        extracted_content=cached_result,
+                        batch_number=batch.batch_number,
+                        batch_size_max=batch.batch_size_max,
+                    )
+                )
+
+        unsubmitted = uncached(batches)
+
+        def begin(batch: PDFPagesBatch) -> LROPoller[AnalyzeResult]:
+            in_flight[batch.batch_number] = batch
+            attempts[batch.batch_number] = attempts.get(batch.batch_number, 0) + 1
+            return call_api_with_error_handling(
+                func=self.begin_analyze_document_from_bytes,
+                retries=retries,
+                retry_policy=self.retry_policy,
+                doc_bytes=batch.batch_content,
+            )
+
+        def submit(batch: PDFPagesBatch) -> None:
+            multiplexer.add(batch.batch_number, begin(batch))
+
+        for batch in unsubmitted:
+            submit(batch)
+            if max_concurrency is not None and len(multiplexer) >= max_concurrency:
+                break
+
+        logger.info(
+            "Polling batches from a single loop...",
+            extra={"props": {"in_flight": len(multiplexer)}},
+        )
+        for batch_number, poller in multiplexer.as_completed():
+            batch = in_flight[batch_number]  # type: ignore[index]
+            try:
+                extracted_content = poller.result(timeout=timeout)
+            except Exception as e:
+                logger.error(
+                    "Error occurred while analyzing batch...",
+                    extra={
+                        "props": {
+                            "batch_number": batch.batch_number,
+                            "attempt": attempts[batch.batch_number],
+                            "error": str(e),
+                        }
+                    },
+                )
+                delay = self.retry_policy.handle_error(
+                    e, attempt=attempts[batch.batch_number] - 1, retries=retries
+                )
+                if delay is None:
+                    raise e
+                multiplexer.schedule(batch.batch_number, partial(begin, batch), delay)
+                continue
+
+            del in_flight[batch.batch_number]
+            if self.cache is not None:
+                self.cache.set(
+                    self.cache.key_for_bytes(batch.batch_content), extracted_content
+                )
+            batch_extracted = PDFPagesBatchExtracted(
+                page_range=batch.page_range,
+                extracted_content=extracted_content,
+                batch_number=batch.batch_number,
+                batch_size_max=batch.batch_size_max,
+            )
+            self._save_checkpoint(document_hash, batch_extracted)
+            collect(batch_extracted)
+            next_batch = next(unsubmitted, None)
+            if next_batch is not None:
+                submit(next_batch)
+
+        logger.info(
+            "Finished polling batches...",
+            extra={"props": {"status_requests": multiplexer.status_requests}},
+        )
+        return sorted(results, key=lambda batch: batch.batch_number)
+
     @staticmethod
     def poller_loop(poller: LROPoller[AnalyzeResult]) -> None:
         """Poll the status of the poller until it is done."""
@@ -1,8 +1,29 @@
-from azure.ai.formrecognizer import AnalyzeResult
+from typing import Any, Type, TypeVar
+
+from azure.ai.formrecognizer import AnalyzeResult, DocumentAnalysisApiVersion
 from pydantic import BaseModel, ConfigDict
 
 DIMENSION_CONVERSION_FACTOR = 72
 
+# The Azure model and API version used for analysis. The API version is pinned so that
+# cached results are only reused for the version that produced them.
+AZURE_MODEL_ID = "prebuilt-document"
+AZURE_API_VERSION = DocumentAnalysisApiVersion.V2023_07_31.value
+
+M = TypeVar("M", bound=BaseModel)
+
+
+def build_model(model: Type[M], trusted: bool = False, **fields: Any) -> M:
+    """
+    Build a pydantic model, skipping validation of trusted fields.
+
+    Trusted fields must already be of the model's field types, as they are when
+    produced by the converter, since model_construct neither checks nor coerces them.
+    """
+    if trusted:
+        return model.model_construct(**fields)
+    return model(**fields)
+
 
 class PDFPagesBatchExtracted(BaseModel):
     """A batch of pdf pages with content spanning a range of pages."""
@@ -0,0 +1,220 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Optional, Union
+
+import requests
+from azure.ai.formrecognizer import AnalyzeResult
+
+from .base import AZURE_API_VERSION, AZURE_MODEL_ID
+from .serialization import JsonBackend, default_json_backend
+from .utils import calculate_md5_sum
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_MAX_SIZE = 1024 * 1024 * 1024
+# Temporary files older than this are left over from interrupted writes, rather than
+# being written by another process, and are removed when the cache is scanned.
+STALE_TEMP_FILE_AGE = 60 * 60
+
+
+def get_url_identity(doc_url: str, timeout: float = 10) -> str:
+    """
+    Identify the current content of a remote document without downloading it.
+
+    The identity is the url together with the ETag, Last-Modified and Content-Length
+    headers of a HEAD request, where the server sends them, so that a changed document
+    gets a new identity. If the HEAD request fails the url alone is used.
+    """
+    try:
+        resp = requests.head(doc_url, allow_redirects=True, timeout=timeout)
+        resp.raise_for_status()
+        validators = [
+            resp.headers.get(header, "")
+            for header in ("etag", "last-modified", "content-length")
+        ]
+    except Exception as e:
+        logger.warning(
+            "Failed to get document validators, caching by url alone...",
+            extra={"props": {"url": doc_url, "error": str(e)}},
+        )
+        validators = []
+    return "|".join([doc_url, *validators])
+
+
+class AnalyzeResultCache:
+    """
+    A content-addressed cache of Azure API responses on local disk.
+
+    Results are keyed by a hash of the document content (or, for urls, the document's
+    identity), the model id, the API version and the pages analyzed, and are stored
+    as serialised AnalyzeResult json. Once the cache grows beyond max_size bytes the
+    least recently used results are evicted. Reads update a result's modification
+    time, which is what recency is measured by.
+
+    Writes are atomic, so the cache can be shared between threads and processes.
+
+    The cache directory is only scanned when the cache is created and when it grows
+    beyond max_size, with a running total of the bytes written kept in between. The
+    total doesn't include writes by other processes sharing the directory, so the
+    cache can grow beyond max_size by what they write until this instance next
+    scans. Scans also remove temporary files left over from interrupted writes.
+
+    Results are encoded with json_backend, which defaults to orjson where it's
+    installed (see default_json_backend).
+    """
+
+    def __init__(
+        self,
+        cache_dir: Union[str, Path],
+        max_size: int = DEFAULT_CACHE_MAX_SIZE,
+        json_backend: Optional[JsonBackend] = None,
+    ):
+        if max_size < 1:
+            raise ValueError("Max cache size must be greater than 0.")
+
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_size = max_size
+        self.json_backend = json_backend or default_json_backend()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._size = sum(size for _, size, _ in self._scan())
+
+    @staticmethod
+    def make_key(
+        document_id: str,
+        pages: Optional[str] = None,
+        model_id: str = AZURE_MODEL_ID,
+        api_version: str = AZURE_API_VERSION,
+    ) -> str:
+        """Make a cache key for an analysis of a document."""
+        return hashlib.sha256(
+            "\n".join([document_id, pages or "", model_id, api_version]).encode()
+        ).hexdigest()
+
+    @classmethod
+    def key_for_bytes(
+        cls,
+        doc_bytes: bytes,
+        pages: Optional[str] = None,
+        model_id: str = AZURE_MODEL_ID,
+        api_version: str = AZURE_API_VERSION,
+    ) -> str:
+        """Make a cache key for an analysis of a document's bytes."""
+        return cls.make_key(
+            f"md5:{calculate_md5_sum(doc_bytes)}", pages, model_id, api_version
+        )
+
+    @classmethod
+    def key_for_url(
+        cls,
+        doc_url: str,
+        pages: Optional[str] = None,
+        model_id: str = AZURE_MODEL_ID,
+        api_version: str = AZURE_API_VERSION,
+    ) -> str:
+        """
+        Make a cache key for an analysis of a document at a url.
+
+        This makes a HEAD request for the document, see get_url_identity.
+        """
+        return cls.make_key(
+            f"url:{get_url_identity(doc_url)}", pages, model_id, api_version
+        )
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[AnalyzeResult]:
+        """Get a cached result, or None if it isn't cached."""
+        path = self._path(key)
+        try:
+            data = path.read_bytes()
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        logger.info("Using cached Azure API response...", extra={"props": {"key": key}})
+        return AnalyzeResult.from_dict(self.json_backend.loads(data))
+
+    def set(self, key: str, result: AnalyzeResult) -> None:
+        """Cache a result, evicting the least recently used results if over size."""
+        path = self._path(key)
+        path.parent.mkdir(exist_ok=True)
+        try:
+            replaced_size = path.stat().st_size
+        except FileNotFoundError:
+            replaced_size = 0
+        with tempfile.NamedTemporaryFile(
+            "wb", dir=path.parent, suffix=".tmp", delete=False
+        ) as temp_file:
+            temp_file.write(self.json_backend.dumps(result.to_dict()))
+            size = temp_file.tell()
+        os.replace(temp_file.name, path)
+
+        with self._lock:
+            self._size += size - replaced_size
+            over_size = self._size > self.max_size
+        if over_size:
+            self.evict()
+
+    def _scan(self) -> list[tuple[float, int, Path]]:
+        """
+        List the (modification time, size, path) of each cached result.
+
+        Temporary files left over from interrupted writes are removed.
+        """
+        stale_before = time.time() - STALE_TEMP_FILE_AGE
+        for path in self.cache_dir.glob("*/*.tmp"):
+            try:
+                if path.stat().st_mtime < stale_before:
+                    path.unlink()
+            except FileNotFoundError:
+                continue
+
+        entries = []
+        for path in self.cache_dir.glob("*/*.json"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def evict(self) -> None:
+        """Remove the least recently used results until the cache fits max_size."""
+        entries = self._scan()
+        total_size = sum(size for _, size, _ in entries)
+
+        if total_size <= self.max_size:
+            with self._lock:
+                self._size = total_size
+            return
+
+        for _, size, path in sorted(entries):
+            path.unlink(missing_ok=True)
+            total_size -= size
+            logger.info(
+                "Evicted cached Azure API response...",
+                extra={"props": {"path": str(path)}},
+            )
+            if total_size <= self.max_size:
+                break
+
+        with self._lock:
+            self._size = total_size
+
+    def stats(self) -> dict[str, Any]:
+        """The cache hit and miss counts."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
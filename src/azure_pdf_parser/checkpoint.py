@@ -0,0 +1,112 @@
+import logging
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Optional, Sequence, Union
+
+from azure.ai.formrecognizer import AnalyzeResult
+
+from .base import PDFPagesBatchExtracted
+from .serialization import JsonBackend, default_json_backend
+
+logger = logging.getLogger(__name__)
+
+
+class BatchCheckpointStore:
+    """
+    Persist the completed batches of large documents, so failed documents can resume.
+
+    Each completed batch is written to a directory for its document, keyed by the
+    document's hash, in a file named after the batch's page range. When the same
+    document is analyzed again after a failure, batches that are already checkpointed
+    aren't submitted to Azure again. A document's checkpoints are cleared once all of
+    its batches have completed.
+
+    Batches are encoded with json_backend, which defaults to orjson where it's
+    installed (see default_json_backend).
+    """
+
+    def __init__(
+        self,
+        checkpoint_dir: Union[str, Path],
+        json_backend: Optional[JsonBackend] = None,
+    ):
+        self.checkpoint_dir = Path(checkpoint_dir)
+        self.checkpoint_dir.mkdir(parents=True, exist_ok=True)
+        self.json_backend = json_backend or default_json_backend()
+
+    def _path(self, document_hash: str, page_range: tuple[int, int]) -> Path:
+        return (
+            self.checkpoint_dir
+            / document_hash
+            / f"{page_range[0]}-{page_range[1]}.json"
+        )
+
+    def get(
+        self, document_hash: str, page_range: tuple[int, int]
+    ) -> Optional[PDFPagesBatchExtracted]:
+        """Get a checkpointed batch of a document, or None if there isn't one."""
+        try:
+            data = self.json_backend.loads(
+                self._path(document_hash, page_range).read_bytes()
+            )
+        except FileNotFoundError:
+            return None
+
+        return PDFPagesBatchExtracted(
+            page_range=tuple(data["page_range"]),
+            extracted_content=AnalyzeResult.from_dict(data["extracted_content"]),
+            batch_number=data["batch_number"],
+            batch_size_max=data["batch_size_max"],
+        )
+
+    def load(
+        self, document_hash: str, page_ranges: Sequence[tuple[int, int]]
+    ) -> dict[tuple[int, int], PDFPagesBatchExtracted]:
+        """Load the checkpointed batches of a document, keyed by page range."""
+        checkpointed = {}
+        for page_range in page_ranges:
+            batch = self.get(document_hash, page_range)
+            if batch is not None:
+                checkpointed[page_range] = batch
+
+        if checkpointed:
+            logger.info(
+                "Resuming document from batch checkpoints...",
+                extra={
+                    "props": {
+                        "document_hash": document_hash,
+                        "checkpointed_batches": len(checkpointed),
+                        "batch_count": len(page_ranges),
+                    }
+                },
+            )
+        return checkpointed
+
+    def save(self, document_hash: str, batch: PDFPagesBatchExtracted) -> None:
+        """Checkpoint a completed batch of a document."""
+        path = self._path(document_hash, batch.page_range)
+        path.parent.mkdir(exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+            "wb", dir=path.parent, suffix=".tmp", delete=False
+        ) as temp_file:
+            temp_file.write(
+                self.json_backend.dumps(
+                    {
+                        "page_range": batch.page_range,
+                        "batch_number": batch.batch_number,
+                        "batch_size_max": batch.batch_size_max,
+                        "extracted_content": batch.extracted_content.to_dict(),
+                    }
+                )
+            )
+        os.replace(temp_file.name, path)
+
+    def clear(self, document_hash: str) -> None:
+        """Remove the checkpoints of a document."""
+        shutil.rmtree(self.checkpoint_dir / document_hash, ignore_errors=True)
+        logger.info(
+            "Cleared batch checkpoints...",
+            extra={"props": {"document_hash": document_hash}},
+        )
@@ -1,6 +1,11 @@
 import logging
-from typing import Sequence, Set, Tuple, Union
+import random
+import threading
+from bisect import bisect_left
+from itertools import accumulate
+from typing import Iterable, Iterator, NamedTuple, Optional, Sequence, Set, Tuple, Union
 
+import numpy as np
 from azure.ai.formrecognizer import (
     AnalyzeResult,
     DocumentParagraph,
@@ -16,17 +21,20 @@ from cpr_sdk.parser_models import (
     PDFTextBlock,
 )
 
-from .base import DIMENSION_CONVERSION_FACTOR
+from .base import DIMENSION_CONVERSION_FACTOR, PDFPagesBatchExtracted, build_model
 from .experimental_base import (
-    ExperimentalBoundingRegion,
+    CompactTable,
     ExperimentalParserOutput,
     ExperimentalPDFData,
     ExperimentalPDFTableBlock,
-    ExperimentalTableCell,
 )
+from .language import BlockLanguageDetector, detect_and_set_languages
 
 logger = logging.getLogger(__name__)
 
+# The number of blocks of each kind validated from trusted output when debug logging.
+TRUSTED_VALIDATION_SAMPLE_SIZE = 20
+
 
 def polygon_to_co_ordinates(polygon: Sequence[Point]) -> list[tuple[float, float]]:
     """
@@ -43,6 +51,53 @@ def polygon_to_co_ordinates(polygon: Sequence[Point]) -> list[tuple[float, float
     return [(vertex.x, vertex.y) for vertex in polygon]
 
 
+def scale_polygon_points(polygons: Sequence[Sequence[Point]]) -> np.ndarray:
+    """
+    Convert polygons from Azure's inches to 72ppi pixels in one vectorised step.
+
+    The points of all the polygons are collected into one contiguous (points, 2)
+    array of floats and scaled together, rather than one point at a time.
+    """
+    points = np.fromiter(
+        (
+            value
+            for polygon in polygons
+            for point in polygon
+            for value in (point.x, point.y)
+        ),
+        dtype=np.float64,
+        count=2 * sum(len(polygon) for polygon in polygons),
+    ).reshape(-1, 2)
+    return DIMENSION_CONVERSION_FACTOR * points
+
+
+def scale_polygons(
+    polygons: Sequence[Sequence[Point]],
+) -> list[list[tuple[float, float]]]:
+    """
+    Convert polygons from Azure's inches to 72ppi pixels in one vectorised step.
+
+    The polygons are scaled together (see scale_polygon_points), and then split back
+    into a list of (x, y) co-ordinates per polygon.
+    """
+    lengths = [len(polygon) for polygon in polygons]
+    # Converting the whole array to lists at once is much faster than reading each
+    # point out of it.
+    scaled_points = scale_polygon_points(polygons).tolist()
+
+    co_ordinates = []
+    start = 0
+    for length in lengths:
+        co_ordinates.append([(x, y) for x, y in scaled_points[start : start + length]])
+        start += length
+    return co_ordinates
+
+
+def shift_page_numbers(page_numbers: Sequence[int], page_offset: int) -> list[int]:
+    """Convert Azure's page numbers, from one, to ours, from zero, plus an offset."""
+    return (np.asarray(page_numbers, dtype=np.int64) + (page_offset - 1)).tolist()
+
+
 def azure_paragraph_to_text_block(
     paragraph_id: int, paragraph: DocumentParagraph
 ) -> PDFTextBlock:
@@ -60,7 +115,9 @@ def azure_paragraph_to_text_block(
     if paragraph.bounding_regions is None:
         raise ValueError("Paragraph must have bounding regions to create text block.")
 
-    return PDFTextBlock(
+    return _paragraph_text_block(
+        paragraph_id=paragraph_id,
+        paragraph=paragraph,
         coords=[
             (
                 DIMENSION_CONVERSION_FACTOR * coord[0],
@@ -69,10 +126,26 @@ def azure_paragraph_to_text_block(
             for coord in polygon_to_co_ordinates(paragraph.bounding_regions[0].polygon)
         ],
         page_number=paragraph.bounding_regions[0].page_number - 1,
+    )
+
+
+def _paragraph_text_block(
+    paragraph_id: int,
+    paragraph: DocumentParagraph,
+    coords: list[tuple[float, float]],
+    page_number: int,
+    trusted: bool = False,
+) -> PDFTextBlock:
+    """Build the text block of a paragraph from its converted co-ordinates."""
+    return build_model(
+        PDFTextBlock,
+        trusted,
+        coords=coords,
+        page_number=page_number,
         text=[paragraph.content],
         text_block_id=str(paragraph_id),
         language=None,
-        type=paragraph.role or "Text",
+        type=BlockType(paragraph.role or "Text"),
         type_confidence=1.0,
     )
 
@@ -98,42 +171,57 @@ def extract_azure_api_response_paragraphs(
 
 
 def azure_table_to_table_block(
-    table: DocumentTable, index: int
+    table: DocumentTable, index: int, page_offset: int = 0, trusted: bool = False
 ) -> ExperimentalPDFTableBlock:
-    """Convert the tables in an api response to an array of table blocks."""
-    return ExperimentalPDFTableBlock(
+    """
+    Convert the tables in an api response to an array of table blocks.
+
+    The polygons and page numbers of all the cells are converted together, with
+    page_offset added to the page numbers. With trusted, the blocks are built
+    without validation (see build_model).
+    """
+    return azure_table_to_compact_table(
+        table=table, index=index, page_offset=page_offset
+    ).to_table_block(trusted=trusted)
+
+
+def azure_table_to_compact_table(
+    table: DocumentTable, index: int, page_offset: int = 0
+) -> CompactTable:
+    """
+    Convert a table in an api response to the column arrays of a CompactTable.
+
+    Cells without bounding regions, kinds or spans are left out. The polygons and
+    page numbers of all the cells are converted together, with page_offset added to
+    the page numbers.
+    """
+    cells = [
+        cell
+        for cell in table.cells
+        if (
+            cell.bounding_regions is not None
+            and cell.kind is not None
+            and cell.row_span is not None
+            and cell.column_span is not None
+        )
+    ]
+    polygons = [cell.bounding_regions[0].polygon for cell in cells]
+
+    return CompactTable(
         table_id=str(index),
         row_count=table.row_count,
         column_count=table.column_count,
-        cells=[
-            ExperimentalTableCell(
-                cell_type=cell.kind,
-                row_index=cell.row_index,
-                column_index=cell.column_index,
-                row_span=cell.row_span,
-                column_span=cell.column_span,
-                content=cell.content,
-                bounding_regions=[
-                    ExperimentalBoundingRegion(
-                        page_number=cell.bounding_regions[0].page_number - 1,
-                        polygon=[
-                            Point(
-                                x=DIMENSION_CONVERSION_FACTOR * point.x,
-                                y=DIMENSION_CONVERSION_FACTOR * point.y,
-                            )
-                            for point in cell.bounding_regions[0].polygon
-                        ],
-                    )
-                ],
-            )
-            for cell in table.cells
-            if (
-                cell.bounding_regions is not None
-                and cell.kind is not None
-                and cell.row_span is not None
-                and cell.column_span is not None
-            )
-        ],
+        cell_types=[cell.kind for cell in cells],
+        row_indices=[cell.row_index for cell in cells],
+        column_indices=[cell.column_index for cell in cells],
+        row_spans=[cell.row_span for cell in cells],
+        column_spans=[cell.column_span for cell in cells],
+        contents=[cell.content for cell in cells],
+        page_numbers=shift_page_numbers(
+            [cell.bounding_regions[0].page_number for cell in cells], page_offset
+        ),
+        polygon_lengths=[len(polygon) for polygon in polygons],
+        polygon_points=scale_polygon_points(polygons),
     )
 
 
@@ -157,7 +245,7 @@ def extract_azure_api_response_tables(
 
 
 def extract_azure_api_response_page_metadata(
-    api_response: AnalyzeResult,
+    api_response: AnalyzeResult, page_offset: int = 0, trusted: bool = False
 ) -> Sequence[PDFPageMetadata]:
     """
     Extract page metadata from an azure api response.
@@ -167,6 +255,9 @@ def extract_azure_api_response_page_metadata(
 
     Dimensions: Azure units are in inches but our corpus is in 72ppi pixels, and thus we
     multiply by a conversion factor.
+
+    page_offset is added to the page numbers, e.g. for the pages of a batch. With
+    trusted, the metadata is built without validation (see build_model).
     """
     pdf_page_metadata = []
     for page in api_response.pages:
@@ -176,8 +267,10 @@ def extract_azure_api_response_page_metadata(
             and page.page_number is not None
         ):
             pdf_page_metadata.append(
-                PDFPageMetadata(
-                    page_number=page.page_number - 1,
+                build_model(
+                    PDFPageMetadata,
+                    trusted,
+                    page_number=page.page_number - 1 + page_offset,
                     dimensions=(
                         page.width * DIMENSION_CONVERSION_FACTOR,
                         page.height * DIMENSION_CONVERSION_FACTOR,
@@ -217,21 +310,115 @@ def get_all_table_cell_spans(api_response: AnalyzeResult) -> Set[Tuple[int, int]
     return table_cell_spans
 
 
+class TableCellSpanIndex:
+    """
+    An index of the spans of the table cells in an api response, sorted by offset.
+
+    Finding the cells that a span overlaps takes a binary search plus a step per
+    overlapping cell, so matching P paragraphs against C cells takes O((P + C) log C)
+    rather than comparing every paragraph with every cell.
+    """
+
+    def __init__(self, cell_spans: Iterable[Tuple[int, int, int, int]]):
+        """Index (offset, length, table index, cell index) tuples of cell spans."""
+        cell_spans = sorted(
+            (offset, offset + length, table_index, cell_index)
+            for offset, length, table_index, cell_index in cell_spans
+        )
+        self._starts = [start for start, _, _, _ in cell_spans]
+        self._cells = [
+            (table_index, cell_index) for *_, table_index, cell_index in cell_spans
+        ]
+        # The furthest any cell up to each position reaches, so a search can stop as
+        # soon as no earlier cell can overlap.
+        self._max_ends = list(accumulate((end for _, end, _, _ in cell_spans), max))
+        self._ends = [end for _, end, _, _ in cell_spans]
+
+    @classmethod
+    def from_api_response(cls, api_response: AnalyzeResult) -> "TableCellSpanIndex":
+        """Index the spans of all the table cells in an api response."""
+        return cls(
+            cell_span
+            for table_index, table in enumerate(api_response.tables or [])
+            for cell_span in table_cell_spans(table_index, table)
+        )
+
+    def overlapping(self, offset: int, length: int) -> list[Tuple[int, int]]:
+        """The (table index, cell index) of each cell that the span overlaps."""
+        return sorted(
+            {
+                self._cells[position]
+                for position in self._overlapping_positions(offset, length)
+            }
+        )
+
+    def overlaps(self, offset: int, length: int) -> bool:
+        """Whether the span overlaps any cell."""
+        return next(self._overlapping_positions(offset, length), None) is not None
+
+    def _overlapping_positions(self, offset: int, length: int) -> Iterator[int]:
+        """The positions in the index of the cell spans that the span overlaps."""
+        position = bisect_left(self._starts, offset + length) - 1
+        while position >= 0 and self._max_ends[position] > offset:
+            if self._ends[position] > offset:
+                yield position
+            position -= 1
+
+
+def table_cell_spans(
+    table_index: int, table: DocumentTable
+) -> Iterator[Tuple[int, int, int, int]]:
+    """The (offset, length, table index, cell index) of the spans of a table's cells."""
+    for cell_index, cell in enumerate(table.cells):
+        if isinstance(cell.spans, list):
+            for span in cell.spans:
+                yield span.offset, span.length, table_index, cell_index
+
+
+def match_table_paragraphs(
+    api_response: AnalyzeResult,
+) -> dict[int, list[Tuple[int, int]]]:
+    """
+    Match the paragraphs of an api response to the table cells their spans overlap.
+
+    Paragraphs are matched whether they cover a whole cell, part of one or several,
+    and are keyed by their index, with the (table index, cell index) of each cell.
+    Paragraphs that don't overlap any table cell aren't included.
+    """
+    if api_response.paragraphs is None or not api_response.tables:
+        return {}
+
+    index = TableCellSpanIndex.from_api_response(api_response)
+    matches = {}
+    for paragraph_index, paragraph in enumerate(api_response.paragraphs):
+        if paragraph is None or not paragraph.spans:
+            continue
+        cells = sorted(
+            {
+                cell
+                for span in paragraph.spans
+                for cell in index.overlapping(span.offset, span.length)
+            }
+        )
+        if cells:
+            matches[paragraph_index] = cells
+    return matches
+
+
 def tag_table_paragraphs(api_response: AnalyzeResult) -> AnalyzeResult:
     """
     Tag the paragraphs that contain data from a Table with the type table-text.
 
-    This is done using the span of the content.
+    This is done using the span of the content, so the spans of the paragraphs and
+    tables must be offsets into the same content, as they are in a single response or
+    one merged with merge_responses. Paragraphs whose spans overlap any table cell are
+    tagged, see match_table_paragraphs.
     """
     if api_response.paragraphs is None:
         return api_response
 
-    table_cell_spans = get_all_table_cell_spans(api_response)
-
-    for paragraph in api_response.paragraphs:
-        paragraph_span = (paragraph.spans[0].length, paragraph.spans[0].offset)
-        if paragraph_span in table_cell_spans:
-            paragraph.role = BlockType.TABLE_CELL.value
+    for paragraph_index in match_table_paragraphs(api_response):
+        api_response.paragraphs[paragraph_index].role = BlockType.TABLE_CELL.value
 
     return api_response
 
@@ -241,6 +428,9 @@ def azure_api_response_to_parser_output(
     md5_sum: str,
     api_response: AnalyzeResult,
     experimental_extract_tables: bool = False,
+    trusted: bool = False,
+    language_detector: Optional[BlockLanguageDetector] = None,
+    compact_tables: bool = False,
 ) -> Union[ParserOutput, ExperimentalParserOutput]:
     """
     Convert the API response AnalyzeResult object to a ParserOutput.
@@ -256,8 +446,126 @@ def azure_api_response_to_parser_output(
         The API response from the Azure Form Recognizer API.
     experimental_extract_tables: bool
         Whether to extract tables from the API response.
+    trusted: bool
+        Whether to build the output without pydantic validation (see
+        build_parser_output).
+    language_detector: Optional[BlockLanguageDetector]
+        Optionally detect the language of each text block with this, rather than the
+        language of the whole document.
+    compact_tables: bool
+        Whether to output extracted tables with their cells in columns (see
+        build_parser_output).
+    """
+    check_parser_input(parser_input)
+
+    extracted_blocks = extract_azure_api_response_blocks(
+        api_response, extract_tables=experimental_extract_tables, trusted=trusted
+    )
+
+    return build_parser_output(
+        parser_input=parser_input,
+        md5_sum=md5_sum,
+        text_blocks=extracted_blocks.text_blocks,
+        page_metadata=extracted_blocks.page_metadata,
+        table_blocks=extracted_blocks.table_blocks,
+        experimental_extract_tables=experimental_extract_tables,
+        trusted=trusted,
+        language_detector=language_detector,
+        compact_tables=compact_tables,
+    )
+
+
+class ExtractedBlocks(NamedTuple):
+    """The blocks converted from an api response."""
+
+    text_blocks: Sequence[PDFTextBlock]
+    page_metadata: Sequence[PDFPageMetadata]
+    table_blocks: Union[Sequence[CompactTable], None]
+
+
+def extract_azure_api_response_blocks(
+    api_response: AnalyzeResult,
+    extract_tables: bool = False,
+    page_offset: int = 0,
+    trusted: bool = False,
+) -> ExtractedBlocks:
+    """
+    Convert an api response to text blocks, page metadata and optionally tables.
+
+    The result is the same as tagging the table paragraphs and then extracting the
+    paragraphs, page metadata and tables one after another, but the tables, paragraphs
+    and pages are each only traversed once. Table cells are indexed as the table
+    tables are converted, and paragraphs are tagged as they are converted. The
+    polygons and page numbers of all the paragraphs are then converted in one
+    vectorised step (see scale_polygons). Tables are kept as CompactTables until the
+    parser output is built. Without extract_tables, table_blocks is None.
+
+    page_offset is added to all page numbers, so the pages of a batch can be numbered
+    as in the whole document without shifting the response first. With trusted, the
+    blocks are built without validation (see build_model).
     """
+    cell_spans: list[Tuple[int, int, int, int]] = []
+    table_blocks = [] if extract_tables else None
+    for table_index, table in enumerate(api_response.tables or []):
+        if table is None:
+            continue
+        cell_spans.extend(table_cell_spans(table_index, table))
+        if table_blocks is not None and all(cell is not None for cell in table.cells):
+            table_blocks.append(
+                azure_table_to_compact_table(
+                    table=table, index=table_index, page_offset=page_offset
+                )
+            )
+    cell_span_index = TableCellSpanIndex(cell_spans)
+
+    located_paragraphs = []
+    for paragraph_index, paragraph in enumerate(api_response.paragraphs or []):
+        if paragraph is None:
+            continue
+        if paragraph.spans and any(
+            cell_span_index.overlaps(span.offset, span.length)
+            for span in paragraph.spans
+        ):
+            paragraph.role = BlockType.TABLE_CELL.value
+        if paragraph.bounding_regions is not None:
+            if len(paragraph.bounding_regions[0].polygon) != 4:
+                raise ValueError("Polygon must have exactly four points.")
+            located_paragraphs.append((paragraph_index, paragraph))
+
+    polygons = scale_polygons(
+        [paragraph.bounding_regions[0].polygon for _, paragraph in located_paragraphs]
+    )
+    page_numbers = shift_page_numbers(
+        [
+            paragraph.bounding_regions[0].page_number
+            for _, paragraph in located_paragraphs
+        ],
+        page_offset,
+    )
+    text_blocks = [
+        _paragraph_text_block(
+            paragraph_id=paragraph_index,
+            paragraph=paragraph,
+            coords=polygon,
+            page_number=page_number,
+            trusted=trusted,
+        )
+        for (paragraph_index, paragraph), polygon, page_number in zip(
+            located_paragraphs, polygons, page_numbers
+        )
+    ]
+
+    return ExtractedBlocks(
+        text_blocks=text_blocks,
+        page_metadata=extract_azure_api_response_page_metadata(
+            api_response, page_offset=page_offset, trusted=trusted
+        ),
+        table_blocks=table_blocks,
+    )
+
 
+def check_parser_input(parser_input: ParserInput) -> None:
+    """Check that the parser input is for a pdf document with a CDN object."""
     if parser_input.document_cdn_object is None:
         raise ValueError("Document must have a CDN object. None provided.")
 
@@ -267,15 +575,69 @@ def azure_api_response_to_parser_output(
     ):
         raise ValueError("CDN object must be a PDF.")
 
-    api_response = tag_table_paragraphs(api_response)
-    text_blocks = extract_azure_api_response_paragraphs(api_response)
-    page_metadata = extract_azure_api_response_page_metadata(api_response)
 
-    if experimental_extract_tables:
-        table_blocks = extract_azure_api_response_tables(api_response=api_response)
+def build_parser_output(
+    parser_input: ParserInput,
+    md5_sum: str,
+    text_blocks: Sequence[PDFTextBlock],
+    page_metadata: Sequence[PDFPageMetadata],
+    table_blocks: Union[
+        Sequence[Union[ExperimentalPDFTableBlock, CompactTable]], None
+    ] = None,
+    experimental_extract_tables: bool = False,
+    trusted: bool = False,
+    language_detector: Optional[BlockLanguageDetector] = None,
+    compact_tables: bool = False,
+) -> Union[ParserOutput, ExperimentalParserOutput]:
+    """
+    Build a ParserOutput from converted text blocks and page metadata.
 
-        return (
-            ExperimentalParserOutput(
+    With experimental_extract_tables an ExperimentalParserOutput containing the table
+    blocks is built instead. CompactTables become table blocks here, or with
+    compact_tables they're output as compact_table_blocks, which keep their cells in
+    columns rather than a model per cell.
+
+    The document language is detected from a sample of the text blocks (see
+    language.detect_language), or with a language_detector the language of each text
+    block is detected, and the document languages are those of enough of its blocks.
+
+    With trusted, the output is built without pydantic validation, for blocks that
+    were converted by this module. If debug logging is enabled, a random sample of
+    the blocks is then validated, raising a ValidationError if they don't match the
+    schema (see validate_trusted_sample).
+    """
+    detect_languages = (
+        language_detector.detect_and_set_languages
+        if language_detector is not None
+        else detect_and_set_languages
+    )
+    if experimental_extract_tables:
+        if compact_tables:
+            tables = {
+                "compact_table_blocks": [
+                    _compact_table(table_block).to_compact_table_block(trusted)
+                    for table_block in table_blocks or []
+                ]
+            }
+        else:
+            tables = {
+                "table_blocks": (
+                    [
+                        (
+                            table_block.to_table_block(trusted)
+                            if isinstance(table_block, CompactTable)
+                            else table_block
+                        )
+                        for table_block in table_blocks
+                    ]
+                    if table_blocks is not None
+                    else None
+                )
+            }
+        parser_output: Union[ParserOutput, ExperimentalParserOutput] = detect_languages(
+            build_model(
+                ExperimentalParserOutput,
+                trusted,
                 document_id=parser_input.document_id,
                 document_metadata=parser_input.document_metadata,
                 document_name=parser_input.document_name,
@@ -288,37 +650,214 @@ def azure_api_response_to_parser_output(
                 languages=None,
                 translated=False,
                 html_data=None,
-                pdf_data=ExperimentalPDFData(
+                pdf_data=build_model(
+                    ExperimentalPDFData,
+                    trusted,
                     page_metadata=page_metadata,
                     md5sum=md5_sum,
                     text_blocks=text_blocks if not None else [],
-                    table_blocks=table_blocks,
+                    **tables,
                 ),
             )
-            .detect_and_set_languages()
-            .set_document_languages_from_text_blocks()
-        )
+        ).set_document_languages_from_text_blocks()
+    else:
+        parser_output = detect_languages(
+            build_model(
+                ParserOutput,
+                trusted,
+                document_id=parser_input.document_id,
+                document_metadata=parser_input.document_metadata,
+                document_name=parser_input.document_name,
+                document_description=parser_input.document_description,
+                document_source_url=parser_input.document_source_url,
+                document_cdn_object=parser_input.document_cdn_object,
+                document_content_type=parser_input.document_content_type,
+                document_md5_sum=md5_sum,
+                document_slug=parser_input.document_slug,
+                languages=None,
+                translated=False,
+                html_data=None,
+                pdf_data=build_model(
+                    PDFData,
+                    trusted,
+                    page_metadata=page_metadata,
+                    md5sum=md5_sum,
+                    text_blocks=text_blocks if not None else [],
+                ),
+            )
+        ).set_document_languages_from_text_blocks()
+
+    if trusted and logger.isEnabledFor(logging.DEBUG):
+        validate_trusted_sample(parser_output)
+
+    return parser_output
+
+
+def _compact_table(
+    table_block: Union[ExperimentalPDFTableBlock, CompactTable],
+) -> CompactTable:
+    """Convert a table block to a CompactTable, if it isn't one already."""
+    if isinstance(table_block, CompactTable):
+        return table_block
+
+    cells = table_block.cells
+    polygons = [cell.bounding_regions[0].polygon for cell in cells]
+    return CompactTable(
+        table_id=table_block.table_id,
+        row_count=table_block.row_count,
+        column_count=table_block.column_count,
+        cell_types=[cell.cell_type for cell in cells],
+        row_indices=[cell.row_index for cell in cells],
+        column_indices=[cell.column_index for cell in cells],
+        row_spans=[cell.row_span for cell in cells],
+        column_spans=[cell.column_span for cell in cells],
+        contents=[cell.content for cell in cells],
+        page_numbers=[cell.bounding_regions[0].page_number for cell in cells],
+        polygon_lengths=[len(polygon) for polygon in polygons],
+        polygon_points=[
+            [point.x, point.y] for polygon in polygons for point in polygon
+        ],
+    )
+
+
+def validate_trusted_sample(
+    parser_output: Union[ParserOutput, ExperimentalParserOutput],
+    sample_size: int = TRUSTED_VALIDATION_SAMPLE_SIZE,
+) -> None:
+    """
+    Validate a random sample of the blocks of parser output built without validation.
+
+    Up to sample_size text blocks, pages of metadata and table blocks are validated
+    along with the rest of the output, so that converter output drifting from the
+    schema is caught without validating every block. Raises a ValidationError if the
+    sample is invalid.
+    """
+    pdf_data = parser_output.pdf_data
+    if pdf_data is None:
+        return
+
+    def sample(items):
+        items = list(items or [])
+        return random.sample(items, min(sample_size, len(items)))
+
+    update = {
+        "text_blocks": sample(pdf_data.text_blocks),
+        "page_metadata": sample(pdf_data.page_metadata),
+    }
+    if isinstance(pdf_data, ExperimentalPDFData):
+        update["table_blocks"] = sample(pdf_data.table_blocks)
+        update["compact_table_blocks"] = sample(pdf_data.compact_table_blocks)
+    sampled_output = parser_output.model_copy(
+        update={"pdf_data": pdf_data.model_copy(update=update)}
+    )
+    type(parser_output).model_validate(sampled_output.model_dump())
+    logger.debug(
+        "Validated a sample of %s text blocks of trusted parser output.",
+        len(update["text_blocks"]),
+    )
 
-    return (
-        ParserOutput(
-            document_id=parser_input.document_id,
-            document_metadata=parser_input.document_metadata,
-            document_name=parser_input.document_name,
-            document_description=parser_input.document_description,
-            document_source_url=parser_input.document_source_url,
-            document_cdn_object=parser_input.document_cdn_object,
-            document_content_type=parser_input.document_content_type,
-            document_md5_sum=md5_sum,
-            document_slug=parser_input.document_slug,
-            languages=None,
-            translated=False,
-            html_data=None,
-            pdf_data=PDFData(
-                page_metadata=page_metadata,
-                md5sum=md5_sum,
-                text_blocks=text_blocks if not None else [],
+
+class BatchedResponseConverter:
+    """
+    Convert the batches of a large document as soon as each has been analyzed.
+
+    Each batch is converted to text blocks, page metadata and optionally table blocks
+    when it's added, and its AnalyzeResult isn't kept, so the merged response for the
+    whole document is never held in memory. Batches can be added in any order and
+    from several threads at once, e.g. as the on_batch callback of the large document
+    methods of AzureApiWrapper.
+
+    Text block and table ids are numbered across the whole document in page order, as
+    they are when converting the merged response, once all batches have been added.
+    With trusted, the blocks and output are built without validation, and with a
+    language_detector the language of each text block is detected. Tables are kept
+    as CompactTables until then, and output compactly with compact_tables (see
+    build_parser_output).
+    """
+
+    def __init__(
+        self,
+        experimental_extract_tables: bool = False,
+        trusted: bool = False,
+        language_detector: Optional[BlockLanguageDetector] = None,
+        compact_tables: bool = False,
+    ):
+        self.experimental_extract_tables = experimental_extract_tables
+        self.trusted = trusted
+        self.language_detector = language_detector
+        self.compact_tables = compact_tables
+        self._batches: dict[tuple[int, int], _ConvertedBatch] = {}
+        self._lock = threading.Lock()
+
+    def add_batch(self, batch: PDFPagesBatchExtracted) -> None:
+        """Convert a batch, numbering its pages as in the document, and keep it."""
+        api_response = batch.extracted_content
+        converted_batch = _ConvertedBatch(
+            paragraph_count=len(api_response.paragraphs or []),
+            table_count=len(api_response.tables or []),
+            blocks=extract_azure_api_response_blocks(
+                api_response,
+                extract_tables=self.experimental_extract_tables,
+                page_offset=batch.page_range[0] - 1,
+                trusted=self.trusted,
             ),
         )
-        .detect_and_set_languages()
-        .set_document_languages_from_text_blocks()
-    )
+        with self._lock:
+            self._batches[batch.page_range] = converted_batch
+
+    def to_parser_output(
+        self, parser_input: ParserInput, md5_sum: str
+    ) -> Union[ParserOutput, ExperimentalParserOutput]:
+        """Build the parser output of the document from all of the added batches."""
+        check_parser_input(parser_input)
+
+        text_blocks: list[PDFTextBlock] = []
+        page_metadata: list[PDFPageMetadata] = []
+        table_blocks: list[CompactTable] = []
+        paragraph_offset = 0
+        table_offset = 0
+        with self._lock:
+            batches = [
+                self._batches[page_range] for page_range in sorted(self._batches)
+            ]
+
+        for batch in batches:
+            for text_block in batch.blocks.text_blocks:
+                text_blocks.append(
+                    text_block.model_copy(
+                        update={
+                            "text_block_id": str(
+                                paragraph_offset + int(text_block.text_block_id)
+                            )
+                        }
+                    )
+                )
+            for table_block in batch.blocks.table_blocks or []:
+                table_blocks.append(
+                    table_block.with_table_id(
+                        str(table_offset + int(table_block.table_id))
+                    )
+                )
+            page_metadata.extend(batch.blocks.page_metadata)
+            paragraph_offset += batch.paragraph_count
+            table_offset += batch.table_count
+
+        return build_parser_output(
+            parser_input=parser_input,
+            md5_sum=md5_sum,
+            text_blocks=text_blocks,
+            page_metadata=page_metadata,
+            table_blocks=table_blocks if self.experimental_extract_tables else None,
+            experimental_extract_tables=self.experimental_extract_tables,
+            trusted=self.trusted,
+            language_detector=self.language_detector,
+            compact_tables=self.compact_tables,
+        )
+
+
+class _ConvertedBatch(NamedTuple):
+    """The converted blocks of a batch, with ids numbered from the start of it."""
+
+    paragraph_count: int
+    table_count: int
+    blocks: ExtractedBlocks
@@ -1,7 +1,10 @@
+import copy
 import logging
+import sys
 from collections import Counter
-from typing import List, Optional, Sequence, Union
+from typing import Any, List, Optional, Sequence, Union
 
+import numpy as np
 from azure.ai.formrecognizer import Point
 from cpr_sdk.parser_models import HTMLData, PDFData, TextBlock
 
@@ -11,9 +14,11 @@ from cpr_sdk.pipeline_general_models import (
     CONTENT_TYPE_PDF,
     BackendDocument,
 )
-from langdetect import DetectorFactory, detect
 from pydantic import AnyHttpUrl, BaseModel, model_validator
 
+from .base import build_model
+from .language import detect_and_set_languages
+
 logger = logging.getLogger(__name__)
 
 #  TODO add tests for the experimental types if we decide to keep them
@@ -55,10 +60,193 @@ class ExperimentalPDFTableBlock(BaseModel):
     cells: List[ExperimentalTableCell]
 
 
+class ExperimentalCompactTableBlock(BaseModel):
+    """
+    Table block with its cells stored as columns, one value per cell in each.
+
+    Each cell's polygon is a flat list of its x and y co-ordinates, alternating.
+    """
+
+    table_id: str
+    row_count: int
+    column_count: int
+    cell_types: List[str]
+    row_indices: List[int]
+    column_indices: List[int]
+    row_spans: List[int]
+    column_spans: List[int]
+    contents: List[str]
+    page_numbers: List[int]
+    polygons: List[List[float]]
+
+
+class CompactTable:
+    """
+    A table's cells held in column arrays, rather than a model per cell and point.
+
+    The row and column indices, spans and page numbers are integer arrays, and the
+    polygons of all the cells are packed into one (points, 2) float array, with the
+    first point of each cell's polygon at polygon_offsets. Cell types are interned,
+    as tables only have a few. This is how tables are held while converting, and
+    they only become pydantic models when building the parser output, as either
+    ExperimentalPDFTableBlock or ExperimentalCompactTableBlock.
+    """
+
+    __slots__ = (
+        "table_id",
+        "row_count",
+        "column_count",
+        "cell_types",
+        "row_indices",
+        "column_indices",
+        "row_spans",
+        "column_spans",
+        "contents",
+        "page_numbers",
+        "polygon_offsets",
+        "polygon_points",
+    )
+
+    def __init__(
+        self,
+        table_id: str,
+        row_count: int,
+        column_count: int,
+        cell_types: Sequence[str],
+        row_indices: Sequence[int],
+        column_indices: Sequence[int],
+        row_spans: Sequence[int],
+        column_spans: Sequence[int],
+        contents: Sequence[str],
+        page_numbers: Sequence[int],
+        polygon_lengths: Sequence[int],
+        polygon_points: Any,
+    ):
+        """Pack the cells' columns, and polygon_points of polygon_lengths each."""
+        self.table_id = table_id
+        self.row_count = row_count
+        self.column_count = column_count
+        self.cell_types = [sys.intern(cell_type) for cell_type in cell_types]
+        self.row_indices = np.asarray(row_indices, dtype=np.int32)
+        self.column_indices = np.asarray(column_indices, dtype=np.int32)
+        self.row_spans = np.asarray(row_spans, dtype=np.int32)
+        self.column_spans = np.asarray(column_spans, dtype=np.int32)
+        self.contents = list(contents)
+        self.page_numbers = np.asarray(page_numbers, dtype=np.int32)
+        self.polygon_offsets = np.concatenate(
+            ([0], np.cumsum(polygon_lengths, dtype=np.int64))
+        )
+        self.polygon_points = np.asarray(polygon_points, dtype=np.float64).reshape(
+            -1, 2
+        )
+
+    def __len__(self) -> int:
+        """The number of cells in the table."""
+        return len(self.contents)
+
+    def with_table_id(self, table_id: str) -> "CompactTable":
+        """Return a copy of the table with another id, sharing its arrays."""
+        table = copy.copy(self)
+        table.table_id = table_id
+        return table
+
+    def _polygons(self) -> list[list[list[float]]]:
+        """The polygon of each cell, as a list of [x, y] points."""
+        points = self.polygon_points.tolist()
+        offsets = self.polygon_offsets.tolist()
+        return [points[start:end] for start, end in zip(offsets, offsets[1:])]
+
+    def to_table_block(self, trusted: bool = False) -> ExperimentalPDFTableBlock:
+        """
+        Build the table block of the table, with a model for each cell.
+
+        With trusted, the models are built without validation.
+        """
+        return build_model(
+            ExperimentalPDFTableBlock,
+            trusted,
+            table_id=self.table_id,
+            row_count=self.row_count,
+            column_count=self.column_count,
+            cells=[
+                build_model(
+                    ExperimentalTableCell,
+                    trusted,
+                    cell_type=cell_type,
+                    row_index=row_index,
+                    column_index=column_index,
+                    row_span=row_span,
+                    column_span=column_span,
+                    content=content,
+                    bounding_regions=[
+                        build_model(
+                            ExperimentalBoundingRegion,
+                            trusted,
+                            page_number=page_number,
+                            polygon=[Point(x=x, y=y) for x, y in polygon],
+                        )
+                    ],
+                )
+                for (
+                    cell_type,
+                    row_index,
+                    column_index,
+                    row_span,
+                    column_span,
+                    content,
+                    page_number,
+                    polygon,
+                ) in zip(
+                    self.cell_types,
+                    self.row_indices.tolist(),
+                    self.column_indices.tolist(),
+                    self.row_spans.tolist(),
+                    self.column_spans.tolist(),
+                    self.contents,
+                    self.page_numbers.tolist(),
+                    self._polygons(),
+                )
+            ],
+        )
+
+    def to_compact_table_block(
+        self, trusted: bool = False
+    ) -> ExperimentalCompactTableBlock:
+        """
+        Build the compact table block of the table, keeping its cells in columns.
+
+        With trusted, the model is built without validation.
+        """
+        return build_model(
+            ExperimentalCompactTableBlock,
+            trusted,
+            table_id=self.table_id,
+            row_count=self.row_count,
+            column_count=self.column_count,
+            cell_types=list(self.cell_types),
+            row_indices=self.row_indices.tolist(),
+            column_indices=self.column_indices.tolist(),
+            row_spans=self.row_spans.tolist(),
+            column_spans=self.column_spans.tolist(),
+            contents=list(self.contents),
+            page_numbers=self.page_numbers.tolist(),
+            polygons=[
+                [value for point in polygon for value in point]
+                for polygon in self._polygons()
+            ],
+        )
+
+
 class ExperimentalPDFData(PDFData):
-    """PDFData object that also optionally contains table blocks."""
+    """
+    PDFData object that also optionally contains table blocks.
+
+    Tables are in table_blocks, or in compact_table_blocks if a compact output was
+    requested.
+    """
 
     table_blocks: Optional[Sequence[ExperimentalPDFTableBlock]] = None
+    compact_table_blocks: Optional[Sequence[ExperimentalCompactTableBlock]] = None
 
 
 class ExperimentalParserOutput(BaseModel):
@@ -137,7 +325,8 @@ class ExperimentalParserOutput(BaseModel):
         Detect language of the text and set the language attribute.
 
         Return an instance of ParserOutput with the language attribute set. Assumes
-        that a document only has one language.
+        that a document only has one language, which is detected from a sample of the
+        text blocks (see language.detect_language).
         """
 
         # TODO: We can remove this now as this api doesn't support language detection
@@ -148,16 +337,7 @@ class ExperimentalParserOutput(BaseModel):
                 "languages detected via other means, e.g. OCR. "
             )
 
-        # language detection is not deterministic, so we need to set a seed
-        DetectorFactory.seed = 0
-
-        if len(self.text_blocks) > 0:
-            detected_language = detect(self.to_string())
-            self.languages = [detected_language]
-            for text_block in self.text_blocks:
-                text_block.language = detected_language
-
-        return self
+        return detect_and_set_languages(self)
 
     def set_document_languages_from_text_blocks(
         self, min_language_proportion: float = 0.4
@@ -0,0 +1,393 @@
+import hashlib
+import logging
+import multiprocessing
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING, Any, Optional, Sequence, TypeVar, Union
+
+import numpy as np
+from cpr_sdk.parser_models import ParserOutput, TextBlock
+from langdetect import detector_factory
+from langdetect.detector import Detector
+from langdetect.lang_detect_exception import LangDetectException
+
+if TYPE_CHECKING:
+    from .experimental_base import ExperimentalParserOutput
+
+logger = logging.getLogger(__name__)
+
+# At most this many blocks, spread evenly through the document, are sampled to detect
+# its language.
+LANGUAGE_DETECTION_MAX_BLOCKS = 200
+# The characters of the sampled blocks are limited to this, which is as much text as
+# langdetect reads from the start of the text it's given.
+LANGUAGE_DETECTION_MAX_CHARS = 10000
+
+# The number of distinct block texts a BlockLanguageDetector keeps the languages of.
+DEFAULT_LANGUAGE_CACHE_SIZE = 100_000
+# The number of block texts sent to a language detection worker process at once.
+DEFAULT_LANGUAGE_BATCH_SIZE = 256
+
+# Digits, punctuation and whitespace, which are ignored when comparing block texts.
+_NON_LETTERS_RE = re.compile(r"[\W\d_]+")
+
+_PO = TypeVar("_PO", bound=Union[ParserOutput, "ExperimentalParserOutput"])
+
+
+class LanguageDetectionStats:
+    """Counters of the language detection run in this process, and its cost."""
+
+    def __init__(self) -> None:
+        self.documents = 0
+        self.blocks_sampled = 0
+        self.cache_hits = 0
+        self.characters = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        blocks_sampled: int,
+        characters: int,
+        seconds: float,
+        cache_hits: int = 0,
+    ) -> None:
+        """Count the detection of a document's languages."""
+        with self._lock:
+            self.documents += 1
+            self.blocks_sampled += blocks_sampled
+            self.cache_hits += cache_hits
+            self.characters += characters
+            self.seconds += seconds
+
+    def stats(self) -> dict[str, Any]:
+        """The numbers of documents, blocks and characters detected, and the time."""
+        with self._lock:
+            return {
+                "documents": self.documents,
+                "blocks_sampled": self.blocks_sampled,
+                "cache_hits": self.cache_hits,
+                "characters": self.characters,
+                "seconds": round(self.seconds, 3),
+            }
+
+
+language_detection_stats = LanguageDetectionStats()
+
+
+def load_language_profiles() -> None:
+    """
+    Load langdetect's language profiles and seed its detectors, once per process.
+
+    langdetect otherwise loads the profiles on the first detection in each process.
+    Call this when a process or worker starts so that no document pays for it. The
+    seed is set on the loaded factory, as language detection is not deterministic.
+    """
+    if detector_factory._factory is None:
+        detector_factory.init_factory()
+        detector_factory._factory.set_seed(0)
+
+
+def sample_text_blocks(
+    text_blocks: Sequence[TextBlock],
+    max_blocks: int = LANGUAGE_DETECTION_MAX_BLOCKS,
+    max_chars: int = LANGUAGE_DETECTION_MAX_CHARS,
+) -> list[str]:
+    """
+    Sample the text of a document's blocks for language detection.
+
+    If the text of all the blocks fits in max_chars, all of it is returned. Otherwise
+    the blocks are split into max_blocks equal strata, and the first block of each
+    stratum is sampled, so that every part of the document is represented. Each
+    sampled block is cut to an equal share of max_chars.
+    """
+    texts = [text_block.to_string().strip() for text_block in text_blocks]
+    if sum(len(text) for text in texts) + len(texts) <= max_chars:
+        return texts
+
+    sample_size = min(max_blocks, len(texts))
+    chars_per_block = max(max_chars // sample_size - 1, 1)
+    return [
+        texts[stratum * len(texts) // sample_size][:chars_per_block]
+        for stratum in range(sample_size)
+    ]
+
+
+def detect_language(text_blocks: Sequence[TextBlock]) -> Optional[str]:
+    """
+    Detect the language of a document from a sample of its text blocks.
+
+    Returns None if no language could be detected. The cost of detection is counted
+    in language_detection_stats.
+    """
+    start = time.perf_counter()
+    load_language_profiles()
+    sample = sample_text_blocks(text_blocks)
+    text = " ".join(sample)
+
+    detector = detector_factory._factory.create()
+    detector.append(text)
+    try:
+        detected_language = detector.detect()
+    except LangDetectException:
+        detected_language = None
+
+    language_detection_stats.record(
+        blocks_sampled=len(sample),
+        characters=len(text),
+        seconds=time.perf_counter() - start,
+    )
+    return detected_language
+
+
+def detect_and_set_languages(parser_output: _PO) -> _PO:
+    """
+    Detect the language of a parser output's text, and set it on all its text blocks.
+
+    This is a sampled alternative to the detect_and_set_languages methods of the
+    parser outputs, which detect the language of the whole text of the document.
+    Assumes that a document only has one language.
+    """
+    text_blocks = parser_output.text_blocks
+    if len(text_blocks) > 0:
+        detected_language = detect_language(text_blocks)
+        if detected_language is None:
+            logger.warning(
+                "Language detection failed for document with id %s",
+                parser_output.document_id,
+            )
+        parser_output.languages = [detected_language] if detected_language else []
+        for text_block in text_blocks:
+            text_block.language = detected_language
+
+    return parser_output
+
+
+class LanguageDetectionEngine(ABC):
+    """
+    Detects the language of a text block's text.
+
+    Engines are pickled to the worker processes of a BlockLanguageDetector, where
+    load is called once when each worker starts.
+    """
+
+    def load(self) -> None:
+        """Load anything the engine needs before detecting, once per process."""
+
+    @abstractmethod
+    def detect(self, text: str) -> Optional[str]:
+        """Detect the language of text, or return None if it can't be detected."""
+
+    def detect_batch(self, texts: Sequence[str]) -> list[Optional[str]]:
+        """Detect the languages of several texts."""
+        return [self.detect(text) for text in texts]
+
+
+class LangdetectEngine(LanguageDetectionEngine):
+    """langdetect's detector, which averages several random walks of the n-grams."""
+
+    def load(self) -> None:
+        """Load langdetect's language profiles."""
+        load_language_profiles()
+
+    def detect(self, text: str) -> Optional[str]:
+        """Detect the language of text with langdetect."""
+        self.load()
+        detector = detector_factory._factory.create()
+        detector.append(text)
+        try:
+            detected_language = detector.detect()
+        except LangDetectException:
+            return None
+        return None if detected_language == Detector.UNKNOWN_LANG else detected_language
+
+
+class NgramEngine(LanguageDetectionEngine):
+    """
+    A faster detector scoring all of a text's n-grams against langdetect's profiles.
+
+    The log probabilities of the text's 1 to 3 character n-grams in each language are
+    summed in a single vectorised step, rather than in langdetect's repeated random
+    walks over the n-grams, so results are deterministic. It's less robust than
+    langdetect on very short or mixed texts.
+    """
+
+    def load(self) -> None:
+        """Load langdetect's language profiles."""
+        load_language_profiles()
+
+    def detect(self, text: str) -> Optional[str]:
+        """Detect the language of text from its n-grams."""
+        self.load()
+        detector = detector_factory._factory.create()
+        detector.append(text)
+        detector.cleaning_text()
+        ngrams = detector._extract_ngrams()
+        if not ngrams:
+            return None
+
+        ngram_probabilities = np.array(
+            [detector.word_lang_prob_map[ngram] for ngram in ngrams]
+        )
+        scores = np.log(ngram_probabilities + detector.alpha / Detector.BASE_FREQ).sum(
+            axis=0
+        )
+        return detector.langlist[int(np.argmax(scores))]
+
+
+LANGUAGE_DETECTION_ENGINES: dict[str, type[LanguageDetectionEngine]] = {
+    "langdetect": LangdetectEngine,
+    "ngram": NgramEngine,
+}
+
+
+def text_hash(text: str) -> Optional[bytes]:
+    """
+    Hash the letters of a block's text, ignoring case, digits and punctuation.
+
+    Repeated headers, footers and boilerplate then share a hash even where page
+    numbers differ. Returns None for text without letters, which has no language.
+    """
+    normalised_text = " ".join(_NON_LETTERS_RE.sub(" ", text.casefold()).split())
+    if not normalised_text:
+        return None
+    return hashlib.blake2b(normalised_text.encode(), digest_size=16).digest()
+
+
+# The engine of each worker process of a BlockLanguageDetector.
+_worker_engine: Optional[LanguageDetectionEngine] = None
+
+
+def _load_worker_engine(engine: LanguageDetectionEngine) -> None:
+    """Load the engine once in a worker process."""
+    global _worker_engine
+    engine.load()
+    _worker_engine = engine
+
+
+def _detect_batch_in_worker(texts: Sequence[str]) -> list[Optional[str]]:
+    """Detect the languages of a batch of texts with the worker process's engine."""
+    return _worker_engine.detect_batch(texts)  # type: ignore[union-attr]
+
+
+class BlockLanguageDetector:
+    """
+    Detect the language of each text block of a document.
+
+    Languages are cached by a hash of each block's normalised text (see text_hash),
+    so headers, footers and boilerplate repeated on every page are only detected once,
+    across all the documents detected with the same detector. With max_workers, the
+    remaining texts are detected in batches of batch_size in a process pool, which is
+    started on first use and kept until the detector is closed.
+
+    The document languages are then those of enough of its blocks (see
+    set_document_languages_from_text_blocks), so multilingual documents get each of
+    their languages.
+    """
+
+    def __init__(
+        self,
+        engine: Optional[LanguageDetectionEngine] = None,
+        max_workers: Optional[int] = None,
+        batch_size: int = DEFAULT_LANGUAGE_BATCH_SIZE,
+        cache_size: int = DEFAULT_LANGUAGE_CACHE_SIZE,
+    ):
+        if batch_size < 1:
+            raise ValueError("Batch size must be greater than 0.")
+
+        self.engine = engine if engine is not None else LangdetectEngine()
+        self.max_workers = max_workers
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self._cache: OrderedDict[bytes, Optional[str]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def __enter__(self) -> "BlockLanguageDetector":
+        """Use the detector, closing it on exit."""
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        """Close the detector."""
+        self.close()
+
+    def close(self) -> None:
+        """Shut down the worker processes, if any were started."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+    def detect(self, texts: Sequence[str]) -> list[Optional[str]]:
+        """Detect the language of each of texts, using cached languages where known."""
+        start = time.perf_counter()
+        keys = [text_hash(text) for text in texts]
+        languages: dict[bytes, Optional[str]] = {}
+        uncached_texts: dict[bytes, str] = {}
+        cache_hits = 0
+        with self._lock:
+            for key, text in zip(keys, texts):
+                if key is None or key in languages or key in uncached_texts:
+                    continue
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    languages[key] = self._cache[key]
+                    cache_hits += 1
+                else:
+                    uncached_texts[key] = text
+
+        detected_languages = self._detect_uncached(list(uncached_texts.values()))
+        with self._lock:
+            for key, language in zip(uncached_texts, detected_languages):
+                languages[key] = language
+                self._cache[key] = language
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+        language_detection_stats.record(
+            blocks_sampled=len(uncached_texts),
+            characters=sum(len(text) for text in uncached_texts.values()),
+            seconds=time.perf_counter() - start,
+            cache_hits=cache_hits,
+        )
+        return [languages[key] if key is not None else None for key in keys]
+
+    def _detect_uncached(self, texts: list[str]) -> list[Optional[str]]:
+        """Detect texts with the engine, in the process pool if there's one."""
+        if self.max_workers is None or len(texts) <= self.batch_size:
+            self.engine.load()
+            return self.engine.detect_batch(texts)
+
+        with self._lock:
+            if self._executor is None:
+                # Workers are spawned rather than forked, as forking a process with
+                # threads running, e.g. those analyzing batches, can deadlock them.
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_load_worker_engine,
+                    initargs=(self.engine,),
+                )
+            executor = self._executor
+
+        batches = executor.map(
+            _detect_batch_in_worker,
+            [
+                texts[start : start + self.batch_size]
+                for start in range(0, len(texts), self.batch_size)
+            ],
+        )
+        return [language for batch in batches for language in batch]
+
+    def detect_and_set_languages(self, parser_output: _PO) -> _PO:
+        """Detect the language of each of a parser output's text blocks, and set it."""
+        text_blocks = parser_output.text_blocks
+        languages = self.detect([text_block.to_string() for text_block in text_blocks])
+        for text_block, language in zip(text_blocks, languages):
+            text_block.language = language
+
+        return parser_output
@@ -0,0 +1,248 @@
+import time
+from collections import deque
+from typing import (
+    Callable,
+    Deque,
+    Dict,
+    Generic,
+    Hashable,
+    Iterator,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+)
+
+from azure.core.exceptions import HttpResponseError
+from azure.core.polling import LROPoller
+from azure.core.polling.base_polling import BadResponse, BadStatus, LROBasePolling
+
+from .retry import parse_retry_after
+
+T = TypeVar("T")
+
+DEFAULT_INITIAL_POLL_DELAY = 1.0
+DEFAULT_MAX_POLL_DELAY = 15.0
+DEFAULT_POLL_BACKOFF_FACTOR = 1.5
+
+
+class DeferredLROPolling(LROBasePolling):
+    """
+    An LRO polling method that leaves the polling loop to the caller.
+
+    The SDK's default polling method polls from a background thread per poller. This
+    polling method makes the poller's thread exit immediately, and instead each call
+    to `step` makes a single status request to the operation-location url. Once the
+    operation has finished, `LROPoller.result()` returns the deserialised result as
+    usual, or raises the error the operation failed with.
+    """
+
+    _error: Optional[Exception] = None
+
+    def run(self) -> None:
+        """Do nothing, status requests are made by calling `step`."""
+
+    def step(self) -> bool:
+        """Make a single status request. Return whether the operation has finished."""
+        if self._error is not None:
+            return True
+
+        try:
+            if not self.finished():
+                try:
+                    self.update_status()
+                except BadStatus as err:
+                    self._status = "Failed"
+                    raise HttpResponseError(
+                        response=self._pipeline_response.http_response, error=err
+                    ) from err
+                except BadResponse as err:
+                    self._status = "Failed"
+                    raise HttpResponseError(
+                        response=self._pipeline_response.http_response,
+                        message=str(err),
+                        error=err,
+                    ) from err
+
+            if self.finished():
+                # The operation is complete, so the base class run won't poll again,
+                # but raises if the operation failed and fetches any final resource.
+                super().run()
+                return True
+        except Exception as e:
+            self._error = e
+            return True
+
+        return False
+
+    def retry_after(self) -> Optional[float]:
+        """The delay requested by the service's Retry-After header, if any."""
+        return parse_retry_after(self._pipeline_response.http_response.headers)
+
+    def resource(self):
+        """Return the built resource, or raise the error the operation failed with."""
+        if self._error is not None:
+            raise self._error
+        return super().resource()
+
+
+class PollMultiplexer(Generic[T]):
+    """
+    Drive many in-flight long running operations from a single loop.
+
+    Pollers are checked round-robin. Each poller has its own delay before its next
+    status request, which starts at `initial_delay` and grows by `backoff_factor` up
+    to `max_delay` while the operation is still running. A Retry-After header from
+    the service is honoured as a minimum delay. Pollers that don't use
+    DeferredLROPolling are polled by the SDK in their own threads, and are only
+    checked for completion here, which makes no requests.
+
+    Pollers can be added while iterating over `as_completed`, which allows callers
+    to keep a bounded number of operations in flight. Operations can also be
+    scheduled to be submitted after a delay, e.g. to resubmit a failed operation
+    once a retry backoff has passed, without stalling the other pollers.
+    """
+
+    def __init__(
+        self,
+        initial_delay: float = DEFAULT_INITIAL_POLL_DELAY,
+        max_delay: float = DEFAULT_MAX_POLL_DELAY,
+        backoff_factor: float = DEFAULT_POLL_BACKOFF_FACTOR,
+    ):
+        if initial_delay < 0 or max_delay < initial_delay:
+            raise ValueError(
+                "Poll delays must satisfy 0 <= initial_delay <= max_delay."
+            )
+        if backoff_factor < 1:
+            raise ValueError("Backoff factor must be at least 1.")
+
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.backoff_factor = backoff_factor
+        self.status_requests = 0
+
+        self._pollers: Dict[Hashable, LROPoller[T]] = {}
+        self._delays: Dict[Hashable, float] = {}
+        self._next_poll_at: Dict[Hashable, float] = {}
+        self._order: Deque[Hashable] = deque()
+        self._scheduled: Dict[Hashable, Tuple[float, Callable[[], LROPoller[T]]]] = {}
+
+    def __len__(self) -> int:
+        """The number of pollers in flight, including those scheduled."""
+        return len(self._pollers) + len(self._scheduled)
+
+    def add(self, key: Hashable, poller: LROPoller[T]) -> None:
+        """Add a poller to be driven, identified by a unique key."""
+        if key in self._pollers or key in self._scheduled:
+            raise ValueError(f"A poller with key {key} is already in flight.")
+
+        self._pollers[key] = poller
+        self._delays[key] = self.initial_delay
+        self._next_poll_at[key] = time.monotonic() + self.initial_delay
+        self._order.append(key)
+
+    def schedule(
+        self, key: Hashable, submit: Callable[[], LROPoller[T]], delay: float
+    ) -> None:
+        """
+        Add a poller to be driven once delay seconds have passed.
+
+        submit is called to start the operation when it is due, from within
+        `as_completed`, and any error it raises is raised from there.
+        """
+        if key in self._pollers or key in self._scheduled:
+            raise ValueError(f"A poller with key {key} is already in flight.")
+
+        self._scheduled[key] = (time.monotonic() + delay, submit)
+
+    def as_completed(self) -> Iterator[Tuple[Hashable, LROPoller[T]]]:
+        """
+        Yield (key, poller) pairs as each operation finishes.
+
+        The operation may have succeeded or failed, calling `result()` on the yielded
+        poller returns the result or raises the error.
+        """
+        while self._pollers or self._scheduled:
+            self._submit_due()
+            now = time.monotonic()
+            for _ in range(len(self._order)):
+                key = self._order[0]
+                self._order.rotate(-1)
+                if self._next_poll_at[key] > now:
+                    continue
+
+                if self._step(key):
+                    yield key, self._remove(key)
+                    # Pollers may have been added or removed while suspended.
+                    now = time.monotonic()
+
+            if self._pollers or self._scheduled:
+                next_poll_at = min(
+                    [
+                        *self._next_poll_at.values(),
+                        *(submit_at for submit_at, _ in self._scheduled.values()),
+                    ]
+                )
+                time.sleep(max(0.0, next_poll_at - time.monotonic()))
+
+    def _submit_due(self) -> None:
+        """Submit the scheduled operations that are due."""
+        now = time.monotonic()
+        for key, (submit_at, submit) in list(self._scheduled.items()):
+            if submit_at <= now:
+                del self._scheduled[key]
+                self.add(key, submit())
+
+    def _step(self, key: Hashable) -> bool:
+        """Check a single poller, and schedule its next check if unfinished."""
+        poller = self._pollers[key]
+        polling_method = poller.polling_method()
+
+        retry_after = None
+        if isinstance(polling_method, DeferredLROPolling):
+            self.status_requests += 1
+            finished = polling_method.step()
+            if not finished:
+                retry_after = polling_method.retry_after()
+        else:
+            finished = poller.done()
+
+        if finished:
+            return True
+
+        delay = min(self.max_delay, self._delays[key] * self.backoff_factor)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        self._delays[key] = delay
+        self._next_poll_at[key] = time.monotonic() + delay
+        return False
+
+    def _remove(self, key: Hashable) -> LROPoller[T]:
+        poller = self._pollers.pop(key)
+        del self._delays[key]
+        del self._next_poll_at[key]
+        self._order.remove(key)
+        return poller
+
+
+def poll_many(
+    pollers: Sequence[LROPoller[T]],
+    initial_delay: float = DEFAULT_INITIAL_POLL_DELAY,
+    max_delay: float = DEFAULT_MAX_POLL_DELAY,
+    backoff_factor: float = DEFAULT_POLL_BACKOFF_FACTOR,
+) -> Iterator[Tuple[int, T]]:
+    """
+    Drive a list of pollers from one loop, yielding (index, result) as each finishes.
+
+    Raises the error of the first operation found to have failed.
+    """
+    multiplexer: PollMultiplexer[T] = PollMultiplexer(
+        initial_delay=initial_delay,
+        max_delay=max_delay,
+        backoff_factor=backoff_factor,
+    )
+    for index, poller in enumerate(pollers):
+        multiplexer.add(index, poller)
+
+    for index, poller in multiplexer.as_completed():
+        yield index, poller.result()  # type: ignore[misc]
@@ -0,0 +1,243 @@
+import asyncio
+import threading
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Optional, Tuple, Union
+
+from azure.core.pipeline import PipelineRequest, PipelineResponse
+from azure.core.pipeline.policies import AsyncHTTPPolicy, HTTPPolicy
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None  # type: ignore[assignment]
+
+# Default transactions per second for a standard (S0) tier Azure Document Intelligence
+# resource. Analyze requests and get-result (status poll) requests have separate
+# limits.
+DEFAULT_ANALYZE_TPS = 15.0
+DEFAULT_POLL_TPS = 50.0
+
+
+class TokenBucket(ABC):
+    """
+    A token bucket rate limiter.
+
+    The bucket holds up to `capacity` tokens and is refilled at `rate` tokens per
+    second. Each request takes a token, and waits for one to be refilled if the
+    bucket is empty. The capacity defaults to one second's worth of tokens, and to
+    a single token for rates below one per second.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        if rate <= 0:
+            raise ValueError("Rate must be greater than 0.")
+
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+
+        if self.capacity < 1:
+            raise ValueError("Capacity must be at least 1.")
+
+    def _take(
+        self, tokens: float, available: float, last_refill: float, now: float
+    ) -> Tuple[float, float, float]:
+        """
+        Refill the bucket and try to take tokens from it.
+
+        Return the new number of available tokens, the new refill time and the number
+        of seconds to wait before retrying, which is 0 if the tokens were taken.
+        """
+        available = min(self.capacity, available + (now - last_refill) * self.rate)
+        if available >= tokens:
+            return available - tokens, now, 0.0
+        return available, now, (tokens - available) / self.rate
+
+    @abstractmethod
+    def try_acquire(self, tokens: float = 1.0) -> float:
+        """
+        Try to take tokens from the bucket without blocking.
+
+        Return 0 if the tokens were taken, otherwise the number of seconds to wait
+        before trying again.
+        """
+
+    def acquire(self, tokens: float = 1.0) -> None:
+        """Take tokens from the bucket, sleeping until they are available."""
+        while (wait := self.try_acquire(tokens)) > 0:
+            time.sleep(wait)
+
+    async def try_acquire_async(self, tokens: float = 1.0) -> float:
+        """Try to take tokens from the bucket without blocking the event loop."""
+        return self.try_acquire(tokens)
+
+    async def acquire_async(self, tokens: float = 1.0) -> None:
+        """Take tokens from the bucket, awaiting until they are available."""
+        while (wait := await self.try_acquire_async(tokens)) > 0:
+            await asyncio.sleep(wait)
+
+
+class LocalTokenBucket(TokenBucket):
+    """A token bucket shared between the threads of a single process."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        super().__init__(rate=rate, capacity=capacity)
+        self._lock = threading.Lock()
+        self._available = self.capacity
+        self._last_refill = time.monotonic()
+
+    def try_acquire(self, tokens: float = 1.0) -> float:
+        """Try to take tokens from the bucket without blocking."""
+        with self._lock:
+            self._available, self._last_refill, wait = self._take(
+                tokens, self._available, self._last_refill, time.monotonic()
+            )
+        return wait
+
+
+class FileTokenBucket(TokenBucket):
+    """
+    A token bucket shared between processes through a state file.
+
+    Every process using the same path shares the same budget, for example worker
+    processes on one machine. The state file is guarded with an exclusive advisory
+    lock (fcntl.flock), so this backend is only available on POSIX systems.
+    """
+
+    def __init__(
+        self, path: Union[str, Path], rate: float, capacity: Optional[float] = None
+    ):
+        if fcntl is None:
+            raise RuntimeError("FileTokenBucket requires fcntl, which is unavailable.")
+
+        super().__init__(rate=rate, capacity=capacity)
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.touch(exist_ok=True)
+
+    def try_acquire(self, tokens: float = 1.0) -> float:
+        """Try to take tokens from the bucket without blocking on other processes."""
+        # Wall clock time is used as monotonic clocks aren't comparable across
+        # processes.
+        with open(self.path, "r+") as state_file:
+            fcntl.flock(state_file, fcntl.LOCK_EX)  # type: ignore[union-attr]
+            try:
+                now = time.time()
+                try:
+                    available, last_refill = (
+                        float(value) for value in state_file.read().split()
+                    )
+                except ValueError:
+                    available, last_refill = self.capacity, now
+
+                available, last_refill, wait = self._take(
+                    tokens, available, min(last_refill, now), now
+                )
+
+                state_file.seek(0)
+                state_file.truncate()
+                state_file.write(f"{available} {last_refill}")
+                state_file.flush()
+            finally:
+                fcntl.flock(state_file, fcntl.LOCK_UN)  # type: ignore[union-attr]
+        return wait
+
+    async def try_acquire_async(self, tokens: float = 1.0) -> float:
+        """
+        Try to take tokens from the bucket without blocking the event loop.
+
+        Taking the file lock blocks while another process holds it, so this runs in a
+        worker thread.
+        """
+        return await asyncio.to_thread(self.try_acquire, tokens)
+
+
+class AzureRateLimiter:
+    """
+    Client-side rate limiter for Azure Document Intelligence requests.
+
+    Analyze submissions (POST requests) and status polls (GET requests) are limited by
+    separate token buckets, matching the separate transactions-per-second quotas
+    Azure applies to them.
+    """
+
+    def __init__(self, analyze_bucket: TokenBucket, poll_bucket: TokenBucket):
+        self.analyze_bucket = analyze_bucket
+        self.poll_bucket = poll_bucket
+
+    @classmethod
+    def from_tps(
+        cls,
+        analyze_tps: float = DEFAULT_ANALYZE_TPS,
+        poll_tps: float = DEFAULT_POLL_TPS,
+        state_dir: Optional[Union[str, Path]] = None,
+    ) -> "AzureRateLimiter":
+        """
+        Create a rate limiter from transactions-per-second budgets.
+
+        If state_dir is given, the budgets are stored in files in that directory and
+        shared with every process using the same directory. Otherwise they are shared
+        between the threads of this process only.
+        """
+        if state_dir is None:
+            return cls(
+                analyze_bucket=LocalTokenBucket(rate=analyze_tps),
+                poll_bucket=LocalTokenBucket(rate=poll_tps),
+            )
+
+        state_dir = Path(state_dir)
+        return cls(
+            analyze_bucket=FileTokenBucket(state_dir / "analyze.bucket", analyze_tps),
+            poll_bucket=FileTokenBucket(state_dir / "poll.bucket", poll_tps),
+        )
+
+    def bucket_for_method(self, method: str) -> TokenBucket:
+        """Get the bucket that a request with the given HTTP method draws from."""
+        return self.analyze_bucket if method.upper() == "POST" else self.poll_bucket
+
+    def acquire(self, method: str) -> None:
+        """Wait until a request with the given HTTP method is within budget."""
+        self.bucket_for_method(method).acquire()
+
+    async def acquire_async(self, method: str) -> None:
+        """Await until a request with the given HTTP method is within budget."""
+        await self.bucket_for_method(method).acquire_async()
+
+    def client_kwargs(self, asynchronous: bool = False) -> dict[str, Any]:
+        """
+        Get the DocumentAnalysisClient kwargs that install this rate limiter.
+
+        The policy has to follow the pipeline's retry policy so that every request
+        sent is rate limited, the SDK's own retries included. DocumentAnalysisClient
+        can't be given per_retry_policies, as it passes its own alongside them, so
+        the policy takes the custom hook slot, which follows the retry policy.
+        """
+        policy = AsyncRateLimitPolicy(self) if asynchronous else RateLimitPolicy(self)
+        return {"custom_hook_policy": policy}
+
+
+class RateLimitPolicy(HTTPPolicy):
+    """Pipeline policy that waits for the rate limiter before sending requests."""
+
+    def __init__(self, rate_limiter: AzureRateLimiter):
+        super().__init__()
+        self.rate_limiter = rate_limiter
+
+    def send(self, request: PipelineRequest) -> PipelineResponse:
+        """Wait for budget for the request, then send it."""
+        self.rate_limiter.acquire(request.http_request.method)
+        return self.next.send(request)
+
+
+class AsyncRateLimitPolicy(AsyncHTTPPolicy):
+    """Async pipeline policy that awaits the rate limiter before sending requests."""
+
+    def __init__(self, rate_limiter: AzureRateLimiter):
+        super().__init__()
+        self.rate_limiter = rate_limiter
+
+    async def send(self, request: PipelineRequest) -> PipelineResponse:
+        """Await budget for the request, then send it."""
+        await self.rate_limiter.acquire_async(request.http_request.method)
+        return await self.next.send(request)
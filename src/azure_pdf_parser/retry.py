@@ -0,0 +1,273 @@
+import asyncio
+import random
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from enum import Enum
+from typing import Any, Mapping, Optional
+
+import aiohttp
+import requests
+from azure.core.exceptions import (
+    HttpResponseError,
+    ServiceRequestError,
+    ServiceRequestTimeoutError,
+    ServiceResponseError,
+    ServiceResponseTimeoutError,
+)
+from pypdf.errors import PyPdfError
+
+DEFAULT_INITIAL_BACKOFF = 1.0
+DEFAULT_MAX_BACKOFF = 60.0
+DEFAULT_BACKOFF_FACTOR = 2.0
+
+# Error codes of failed analyze operations that will fail again if resubmitted, e.g.
+# corrupt, encrypted or oversized documents.
+PERMANENT_OPERATION_ERROR_CODES = {
+    "InvalidArgument",
+    "InvalidContent",
+    "InvalidContentDimensions",
+    "InvalidContentLength",
+    "InvalidRequest",
+    "UnsupportedContent",
+}
+
+
+class ErrorKind(str, Enum):
+    """Classes of error that decide whether and how a call is retried."""
+
+    THROTTLED = "throttled"
+    SERVER_ERROR = "server_error"
+    TIMEOUT = "timeout"
+    CONNECTION = "connection"
+    PERMANENT = "permanent"
+    UNKNOWN = "unknown"
+
+
+RETRYABLE_ERROR_KINDS = {
+    ErrorKind.THROTTLED,
+    ErrorKind.SERVER_ERROR,
+    ErrorKind.TIMEOUT,
+    ErrorKind.CONNECTION,
+    ErrorKind.UNKNOWN,
+}
+
+
+def parse_retry_after(headers: Mapping[str, str]) -> Optional[float]:
+    """
+    Get the delay in seconds requested by a response's retry headers, if any.
+
+    Azure services may send retry-after-ms or x-ms-retry-after-ms in milliseconds, as
+    well as the standard Retry-After header in seconds or as an HTTP date.
+    """
+    for header in ("retry-after-ms", "x-ms-retry-after-ms"):
+        value = headers.get(header)
+        if value:
+            try:
+                return max(0.0, float(value) / 1000)
+            except ValueError:
+                pass
+
+    value = headers.get("retry-after")
+    if not value:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def _get_status_code(error: BaseException) -> Optional[int]:
+    """Get the HTTP status code of the response an error was raised for, if any."""
+    status_code = None
+    if isinstance(error, HttpResponseError):
+        status_code = error.status_code
+    elif isinstance(error, requests.HTTPError) and error.response is not None:
+        status_code = error.response.status_code
+    elif isinstance(error, aiohttp.ClientResponseError):
+        status_code = error.status
+    return status_code if isinstance(status_code, int) else None
+
+
+def _get_headers(error: BaseException) -> Optional[Mapping[str, str]]:
+    """Get the headers of the response an error was raised for, if any."""
+    if isinstance(error, HttpResponseError) and error.response is not None:
+        return error.response.headers
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        return error.response.headers
+    if isinstance(error, aiohttp.ClientResponseError):
+        return error.headers
+    return None
+
+
+class RetryPolicy:
+    """
+    Decide whether failed API calls are retried, and how long to wait before retrying.
+
+    Errors are classified as throttling (429), server errors (5xx), timeouts,
+    connection errors, permanent errors or unknown. Permanent errors, such as other
+    4xx responses or documents the service rejects as invalid, are never retried as
+    they would only fail again. Everything else is retried after an exponential
+    backoff with full jitter, starting at `initial_backoff` seconds and capped at
+    `max_backoff`. A Retry-After header on the response is honoured as a minimum
+    delay.
+
+    A policy keeps counters of the calls, retries and errors it has seen, and can be
+    shared between threads and wrappers to aggregate them.
+    """
+
+    def __init__(
+        self,
+        initial_backoff: float = DEFAULT_INITIAL_BACKOFF,
+        max_backoff: float = DEFAULT_MAX_BACKOFF,
+        backoff_factor: float = DEFAULT_BACKOFF_FACTOR,
+        jitter: bool = True,
+    ):
+        if initial_backoff < 0 or max_backoff < initial_backoff:
+            raise ValueError(
+                "Backoffs must satisfy 0 <= initial_backoff <= max_backoff."
+            )
+        if backoff_factor < 1:
+            raise ValueError("Backoff factor must be at least 1.")
+
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.backoff_factor = backoff_factor
+        self.jitter = jitter
+
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.successes = 0
+        self.retries = 0
+        self.failures = 0
+        self.errors: Counter[ErrorKind] = Counter()
+
+    @staticmethod
+    def classify(error: BaseException) -> ErrorKind:
+        """Classify an error raised by an API call."""
+        status_code = _get_status_code(error)
+        if status_code is not None and status_code >= 400:
+            if status_code == 429:
+                return ErrorKind.THROTTLED
+            if status_code == 408:
+                return ErrorKind.TIMEOUT
+            if status_code >= 500:
+                return ErrorKind.SERVER_ERROR
+            return ErrorKind.PERMANENT
+
+        if isinstance(error, HttpResponseError):
+            # A failed long running operation, where the final status request itself
+            # succeeded. The operation's error code says whether it could succeed if
+            # resubmitted.
+            code = error.error.code if error.error is not None else None
+            if code in PERMANENT_OPERATION_ERROR_CODES:
+                return ErrorKind.PERMANENT
+            return ErrorKind.UNKNOWN
+
+        if isinstance(
+            error,
+            (
+                ServiceRequestTimeoutError,
+                ServiceResponseTimeoutError,
+                requests.Timeout,
+                asyncio.TimeoutError,
+                TimeoutError,
+            ),
+        ):
+            return ErrorKind.TIMEOUT
+
+        if isinstance(
+            error,
+            (
+                ServiceRequestError,
+                ServiceResponseError,
+                requests.ConnectionError,
+                aiohttp.ClientConnectionError,
+                ConnectionError,
+            ),
+        ):
+            return ErrorKind.CONNECTION
+
+        if isinstance(error, PyPdfError):
+            return ErrorKind.PERMANENT
+
+        return ErrorKind.UNKNOWN
+
+    def backoff(self, attempt: int, error: Optional[BaseException] = None) -> float:
+        """
+        Get the delay in seconds before retrying after the given (zero based) attempt.
+
+        The delay is the larger of the jittered exponential backoff and any
+        Retry-After requested by the response the error was raised for.
+        """
+        delay = min(
+            self.max_backoff, self.initial_backoff * self.backoff_factor**attempt
+        )
+        if self.jitter:
+            delay = random.uniform(0, delay)
+
+        headers = _get_headers(error) if error is not None else None
+        retry_after = parse_retry_after(headers) if headers else None
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    def record_attempt(self) -> None:
+        """Count an attempt at calling an API function."""
+        with self._lock:
+            self.calls += 1
+
+    def record_success(self) -> None:
+        """Count a successful API call."""
+        with self._lock:
+            self.successes += 1
+
+    def handle_error(
+        self, error: BaseException, attempt: int, retries: int
+    ) -> Optional[float]:
+        """
+        Count a failed attempt and decide whether to retry it.
+
+        Return the delay in seconds before the next attempt, or None if the error
+        should be raised because it is permanent or the attempts are exhausted.
+        """
+        kind = self.classify(error)
+        retry = kind in RETRYABLE_ERROR_KINDS and attempt < retries - 1
+        with self._lock:
+            self.errors[kind] += 1
+            if retry:
+                self.retries += 1
+            else:
+                self.failures += 1
+
+        return self.backoff(attempt, error) if retry else None
+
+    def sleep(self, delay: float) -> None:
+        """Sleep before the next attempt."""
+        time.sleep(delay)
+
+    async def sleep_async(self, delay: float) -> None:
+        """Sleep on the event loop before the next attempt."""
+        await asyncio.sleep(delay)
+
+    def stats(self) -> dict[str, Any]:
+        """The counters of the calls, retries and errors seen by this policy."""
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "successes": self.successes,
+                "retries": self.retries,
+                "failures": self.failures,
+                "errors": {kind.value: count for kind, count in self.errors.items()},
+            }
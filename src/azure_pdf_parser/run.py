@@ -1,9 +1,10 @@
-import json
+import io
 import logging
 import os
 from datetime import datetime
+from functools import partial
 from pathlib import Path
-from typing import Callable, Iterable, Optional, Union
+from typing import Callable, Iterable, Optional, Sequence, Tuple, Union
 
 from azure.ai.formrecognizer import AnalyzeResult
 from azure.core.exceptions import HttpResponseError
@@ -13,7 +14,32 @@ from pydantic import AnyHttpUrl
 from tqdm.auto import tqdm
 
 from azure_pdf_parser import AzureApiWrapper
-from azure_pdf_parser.convert import azure_api_response_to_parser_output
+from azure_pdf_parser.base import PDFPagesBatchExtracted
+from azure_pdf_parser.cache import AnalyzeResultCache
+from azure_pdf_parser.checkpoint import BatchCheckpointStore
+from azure_pdf_parser.convert import (
+    BatchedResponseConverter,
+    azure_api_response_to_parser_output,
+)
+from azure_pdf_parser.language import (
+    BlockLanguageDetector,
+    language_detection_stats,
+    load_language_profiles,
+)
+from azure_pdf_parser.rate_limit import AzureRateLimiter
+from azure_pdf_parser.retry import ErrorKind, RetryPolicy
+from azure_pdf_parser.serialization import (
+    JsonBackend,
+    save_analyze_result,
+    save_model_json,
+)
+from azure_pdf_parser.utils import (
+    DEFAULT_SINGLE_CALL_MAX_BYTES,
+    DEFAULT_SINGLE_CALL_MAX_PAGES,
+    call_api_with_error_handling,
+    get_content_length,
+    get_pdf_page_count,
+)
 
 LOGGER = logging.getLogger(__name__)
 LOGGER.setLevel(logging.INFO)
@@ -23,30 +49,140 @@ load_dotenv(find_dotenv())
 AZURE_PROCESSOR_KEY = os.environ.get("AZURE_PROCESSOR_KEY")
 AZURE_PROCESSOR_ENDPOINT = os.environ.get("AZURE_PROCESSOR_ENDPOINT")
 
+SINGLE_CALL_ROUTE = "single call"
+BATCHED_ROUTE = "batched"
+
+
+def choose_processing_route(
+    document_parameter: Union[str, bytes, None],
+    max_single_call_pages: int = DEFAULT_SINGLE_CALL_MAX_PAGES,
+    max_single_call_bytes: int = DEFAULT_SINGLE_CALL_MAX_BYTES,
+) -> str:
+    """
+    Decide whether to analyze a document in a single call or in page batches.
+
+    The byte size and page count of a document are read cheaply up front: for bytes
+    from the pdf trailer, for urls from the Content-Length of a HEAD request, as the
+    page count isn't known without downloading. Documents over either threshold are
+    batched, and documents whose size can't be determined are tried in a single call.
+    """
+    if isinstance(document_parameter, bytes):
+        byte_size: Optional[int] = len(document_parameter)
+        page_count = get_pdf_page_count(io.BytesIO(document_parameter))
+    elif isinstance(document_parameter, str):
+        byte_size = get_content_length(document_parameter)
+        page_count = None
+    else:
+        byte_size, page_count = None, None
+
+    route = SINGLE_CALL_ROUTE
+    if (page_count is not None and page_count > max_single_call_pages) or (
+        byte_size is not None and byte_size > max_single_call_bytes
+    ):
+        route = BATCHED_ROUTE
+
+    LOGGER.info(
+        f"Routing document to the {route} path.",
+        extra={"props": {"page_count": page_count, "byte_size": byte_size}},
+    )
+    return route
+
 
 def process_document(
     document_parameter: Union[str, bytes, None],
     process_callable: Callable,
     process_callable_retry: Callable,
-) -> Union[AnalyzeResult, None]:
-    """Attempt to retrieve an analyze result for a document."""
-    try:
-        return process_callable(document_parameter)
-    except HttpResponseError:
+    retry_policy: Optional[RetryPolicy] = None,
+    retries: int = 3,
+    max_single_call_pages: int = DEFAULT_SINGLE_CALL_MAX_PAGES,
+    max_single_call_bytes: int = DEFAULT_SINGLE_CALL_MAX_BYTES,
+) -> Union[AnalyzeResult, BatchedResponseConverter, None]:
+    """
+    Attempt to retrieve an analyze result for a document.
+
+    Documents known to be too large for a single call are processed with the retry
+    callable straight away. Otherwise transient errors from the single call are
+    retried according to the retry policy. If it fails with a permanent HTTP error,
+    e.g. because the document turned out to be too large to analyze in one call, the
+    document is processed with the retry callable instead.
+
+    The retry callable returns the batches and merged result of the document, as the
+    large document methods of AzureApiWrapper do, or the batches and a converter that
+    they've been converted with (see analyze_and_convert_batches).
+    """
+    route = choose_processing_route(
+        document_parameter,
+        max_single_call_pages=max_single_call_pages,
+        max_single_call_bytes=max_single_call_bytes,
+    )
+
+    if route == SINGLE_CALL_ROUTE:
         try:
-            return process_callable_retry(document_parameter)[1]
-        except Exception:
-            return None
+            return call_api_with_error_handling(
+                retries,
+                process_callable,
+                document_parameter,
+                retry_policy=retry_policy,
+            )
+        except HttpResponseError as e:
+            # Splitting only helps when Azure rejected the document itself, e.g. for
+            # having too many pages. Retryable errors that outlasted their retries,
+            # such as throttling, would only be made worse by uploading in batches.
+            if RetryPolicy.classify(e) != ErrorKind.PERMANENT:
+                LOGGER.error(f"Failed to process document: {e}")
+                return None
+            LOGGER.info("Single call failed, falling back to the batched path.")
+
+    try:
+        return process_callable_retry(document_parameter)[1]
+    except Exception as e:
+        LOGGER.error(f"Failed to process document: {e}")
+        return None
+
+
+def analyze_and_convert_batches(
+    analyze_large_document: Callable,
+    document_parameter: Union[str, bytes, None],
+    experimental_extract_tables: bool = False,
+    trusted_conversion: bool = False,
+    language_detector: Optional[BlockLanguageDetector] = None,
+    compact_tables: bool = False,
+) -> Tuple[Sequence[PDFPagesBatchExtracted], BatchedResponseConverter]:
+    """
+    Analyze a large document, converting each batch as soon as it's analyzed.
+
+    Batches are converted while others are still being analyzed, and neither they nor
+    the merged response are kept, so no batches are returned alongside the converter.
+    """
+    converter = BatchedResponseConverter(
+        experimental_extract_tables=experimental_extract_tables,
+        trusted=trusted_conversion,
+        language_detector=language_detector,
+        compact_tables=compact_tables,
+    )
+    analyze_large_document(document_parameter, on_batch=converter.add_batch)
+    return [], converter
 
 
 def convert_and_save_api_response(
     import_id: str,
-    api_response: AnalyzeResult,
+    api_response: Union[AnalyzeResult, BatchedResponseConverter],
     output_dir: Path,
     source_url: Optional[str] = None,
     extract_tables: bool = False,
+    trusted_conversion: bool = False,
+    language_detector: Optional[BlockLanguageDetector] = None,
+    compact_tables: bool = False,
 ) -> None:
-    """Convert Azure API response to parser output and save to disk."""
+    """
+    Convert Azure API response to parser output and save to disk.
+
+    The response may also be a converter that the batches of a large document have
+    already been converted with. With trusted_conversion, the parser output is built
+    without pydantic validation, with a language_detector the language of each text
+    block is detected, and with compact_tables extracted tables are output with their
+    cells in columns.
+    """
 
     backend_document = BackendDocument(
         name="",
@@ -78,14 +214,22 @@ def convert_and_save_api_response(
         document_metadata=backend_document,
     )
 
-    parser_output = azure_api_response_to_parser_output(
-        parser_input=parser_input,
-        md5_sum="",
-        api_response=api_response,
-        experimental_extract_tables=extract_tables,
-    )
+    if isinstance(api_response, BatchedResponseConverter):
+        parser_output = api_response.to_parser_output(
+            parser_input=parser_input, md5_sum=""
+        )
+    else:
+        parser_output = azure_api_response_to_parser_output(
+            parser_input=parser_input,
+            md5_sum="",
+            api_response=api_response,
+            experimental_extract_tables=extract_tables,
+            trusted=trusted_conversion,
+            language_detector=language_detector,
+            compact_tables=compact_tables,
+        )
 
-    (output_dir / f"{import_id}.json").write_text(parser_output.model_dump_json())
+    save_model_json(parser_output, output_dir / f"{import_id}.json")
 
     LOGGER.info(f"Successfully processed and saved {import_id}.")
 
@@ -96,6 +240,23 @@ def run_parser(
     pdf_dir: Optional[Path] = None,
     save_raw_azure_response: bool = False,
     experimental_extract_tables: bool = False,
+    max_concurrency: Optional[int] = None,
+    multiplex_polling: bool = False,
+    rate_limiter: Optional[AzureRateLimiter] = None,
+    retry_policy: Optional[RetryPolicy] = None,
+    max_single_call_pages: int = DEFAULT_SINGLE_CALL_MAX_PAGES,
+    max_single_call_bytes: int = DEFAULT_SINGLE_CALL_MAX_BYTES,
+    remote_page_ranges: bool = False,
+    cache: Optional[AnalyzeResultCache] = None,
+    checkpoint_store: Optional[BatchCheckpointStore] = None,
+    batch_size: Optional[int] = None,
+    max_batch_bytes: Optional[int] = None,
+    split_workers: Optional[int] = None,
+    stream_batches: bool = False,
+    trusted_conversion: bool = False,
+    language_detector: Optional[BlockLanguageDetector] = None,
+    compact_tables: bool = False,
+    json_backend: Optional[JsonBackend] = None,
 ) -> None:
     """
     Run Azure PDF parser on a directory of PDFs, or sequence of IDs and source URLs.
@@ -109,6 +270,44 @@ def run_parser(
     :param save_raw_azure_response: optionally save raw Azure API response to disk.
     :param experimental_extract_tables: optionally extract structured representations of
         tables.
+    :param max_concurrency: optional maximum number of page batches to analyze in
+        parallel when a document is too large for a single API call.
+    :param multiplex_polling: optionally submit the batches of a large document up
+        front and poll them all from a single loop.
+    :param rate_limiter: optional client-side rate limiter to keep Azure API calls
+        within the resource's transactions-per-second quotas.
+    :param retry_policy: optional policy deciding which failed API calls are retried,
+        and how long to back off first. Retry counters are logged once finished.
+    :param max_single_call_pages: documents with more pages than this are analyzed in
+        page batches without first trying a single call.
+    :param max_single_call_bytes: documents larger than this many bytes are analyzed
+        in page batches without first trying a single call.
+    :param remote_page_ranges: optionally have Azure analyze page ranges of large
+        documents from source urls directly, rather than downloading and splitting
+        them locally.
+    :param cache: optional on-disk cache of Azure API responses. Documents that are
+        already cached aren't sent to Azure again.
+    :param checkpoint_store: optional store for the completed batches of large
+        documents. A document that fails part way through resumes from its completed
+        batches when run again.
+    :param batch_size: optional maximum number of pages in each batch of a large
+        document.
+    :param max_batch_bytes: optionally keep each batch of a large document to at most
+        this many bytes, splitting it into fewer pages where needed.
+    :param split_workers: optional number of processes to write the batches of a
+        large document in, for documents that are split locally.
+    :param stream_batches: optionally convert each batch of a large document as soon
+        as it's analyzed, rather than merging the batches and converting them once all
+        are done. Raw responses aren't saved for documents converted this way.
+    :param trusted_conversion: optionally build the parser output without pydantic
+        validation, which is faster for large documents. With debug logging, a sample
+        of the output of each document is still validated.
+    :param language_detector: optionally detect the language of each text block with
+        this, rather than the language of the whole document. The caller closes it.
+    :param compact_tables: optionally output extracted tables with their cells in
+        columns, which is much smaller for large tables.
+    :param json_backend: optional json backend to save raw Azure API responses with.
+        Defaults to orjson where it's installed. Load them with load_analyze_result.
     :raises ValueError: if neither source_url or pdf_dir are provided, or if Azure
     API keys are missing from environment variables.
     """
@@ -126,14 +325,48 @@ def run_parser(
     if not ids_and_source_urls and not pdf_dir:
         raise ValueError("""Must provide either source urls or pdf directory.""")
 
-    azure_client = AzureApiWrapper(AZURE_PROCESSOR_KEY, AZURE_PROCESSOR_ENDPOINT)
+    azure_client = AzureApiWrapper(
+        AZURE_PROCESSOR_KEY,
+        AZURE_PROCESSOR_ENDPOINT,
+        rate_limiter=rate_limiter,
+        retry_policy=retry_policy,
+        cache=cache,
+        checkpoint_store=checkpoint_store,
+    )
+
+    load_language_profiles()
+
+    def streamed(analyze_large_document: Callable) -> Callable:
+        if not stream_batches:
+            return analyze_large_document
+        return partial(
+            analyze_and_convert_batches,
+            analyze_large_document,
+            experimental_extract_tables=experimental_extract_tables,
+            trusted_conversion=trusted_conversion,
+            language_detector=language_detector,
+            compact_tables=compact_tables,
+        )
 
     if ids_and_source_urls:
         for import_id, url in ids_and_source_urls:
             analyse_result = process_document(
                 document_parameter=url,
                 process_callable=azure_client.analyze_document_from_url,
-                process_callable_retry=azure_client.analyze_large_document_from_url,
+                process_callable_retry=streamed(
+                    partial(
+                        azure_client.analyze_large_document_from_url,
+                        batch_size=batch_size,
+                        max_concurrency=max_concurrency,
+                        multiplex_polling=multiplex_polling,
+                        remote_page_ranges=remote_page_ranges,
+                        max_batch_bytes=max_batch_bytes,
+                        split_workers=split_workers,
+                    )
+                ),
+                retry_policy=azure_client.retry_policy,
+                max_single_call_pages=max_single_call_pages,
+                max_single_call_bytes=max_single_call_bytes,
             )
 
             if analyse_result:
@@ -143,6 +376,9 @@ def run_parser(
                     api_response=analyse_result,
                     output_dir=output_dir,
                     extract_tables=experimental_extract_tables,
+                    trusted_conversion=trusted_conversion,
+                    language_detector=language_detector,
+                    compact_tables=compact_tables,
                 )
     if pdf_dir:
         for pdf_path in tqdm(list(pdf_dir.glob("*.pdf"))):
@@ -151,12 +387,26 @@ def run_parser(
             analyse_result = process_document(
                 document_parameter=pdf_bytes,
                 process_callable=azure_client.analyze_document_from_bytes,
-                process_callable_retry=azure_client.analyze_large_document_from_bytes,
+                process_callable_retry=streamed(
+                    partial(
+                        azure_client.analyze_large_document_from_bytes,
+                        batch_size=batch_size,
+                        max_concurrency=max_concurrency,
+                        multiplex_polling=multiplex_polling,
+                        max_batch_bytes=max_batch_bytes,
+                        split_workers=split_workers,
+                    )
+                ),
+                retry_policy=azure_client.retry_policy,
+                max_single_call_pages=max_single_call_pages,
+                max_single_call_bytes=max_single_call_bytes,
             )
 
-            if analyse_result and save_raw_azure_response:
-                (output_dir / f"{pdf_path.stem}_raw.json").write_text(
-                    json.dumps(analyse_result.to_dict())
+            if isinstance(analyse_result, AnalyzeResult) and save_raw_azure_response:
+                save_analyze_result(
+                    analyse_result,
+                    output_dir / f"{pdf_path.stem}_raw.json",
+                    backend=json_backend,
                 )
 
             if analyse_result:
@@ -166,4 +416,12 @@ def run_parser(
                     api_response=analyse_result,
                     output_dir=output_dir,
                     extract_tables=experimental_extract_tables,
+                    trusted_conversion=trusted_conversion,
+                    language_detector=language_detector,
+                    compact_tables=compact_tables,
                 )
+
+    LOGGER.info(f"API call retry stats: {azure_client.retry_policy.stats()}")
+    if cache is not None:
+        LOGGER.info(f"Azure API response cache stats: {cache.stats()}")
+    LOGGER.info(f"Language detection stats: {language_detection_stats.stats()}")
@@ -0,0 +1,177 @@
+import json
+import os
+from abc import ABC, abstractmethod
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+from typing import IO, Any, Optional, Union
+
+from azure.ai.formrecognizer import AnalyzeResult
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is an optional dependency
+    orjson = None  # type: ignore[assignment]
+
+# Fields of parser outputs holding a model whose fields are written one at a time.
+STREAMED_MODEL_FIELDS = {"pdf_data"}
+# Fields of parser outputs holding a list of blocks that are written one at a time.
+STREAMED_LIST_FIELDS = {
+    "text_blocks",
+    "page_metadata",
+    "table_blocks",
+    "compact_table_blocks",
+}
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+
+def write_model_json(model: BaseModel, file: IO[str]) -> None:
+    """
+    Write a model, e.g. a parser output, as json to a file a field at a time.
+
+    The blocks of the text block, page metadata and table block lists are serialised
+    and written one at a time, so the json of the whole model is never held in memory
+    alongside it. The output is the same as model_dump_json's.
+    """
+    file.write("{")
+    for index, name in enumerate(type(model).model_fields):
+        if index > 0:
+            file.write(",")
+        value = getattr(model, name)
+        if name in STREAMED_MODEL_FIELDS and isinstance(value, BaseModel):
+            file.write(f"{json.dumps(name)}:")
+            write_model_json(value, file)
+        elif name in STREAMED_LIST_FIELDS and isinstance(value, (list, tuple)):
+            file.write(f"{json.dumps(name)}:[")
+            for item_index, item in enumerate(value):
+                if item_index > 0:
+                    file.write(",")
+                file.write(item.model_dump_json())
+            file.write("]")
+        else:
+            # Serialising the field on its own gives a one-field object, exactly as
+            # the field is serialised in the whole model.
+            file.write(model.model_dump_json(include={name})[1:-1])
+    file.write("}")
+
+
+def save_model_json(model: BaseModel, path: Path) -> None:
+    """
+    Save a model as json, streaming it to a temporary file that replaces path.
+
+    The write is atomic, so path is either the previous file or the whole of the new
+    one, even if writing is interrupted.
+    """
+    with NamedTemporaryFile(
+        "w",
+        encoding="utf-8",
+        buffering=WRITE_BUFFER_SIZE,
+        dir=path.parent,
+        prefix=f".{path.name}.",
+        suffix=".tmp",
+        delete=False,
+    ) as temp_file:
+        try:
+            write_model_json(model, temp_file)
+        except BaseException:
+            temp_file.close()
+            os.unlink(temp_file.name)
+            raise
+    os.replace(temp_file.name, path)
+
+
+class JsonBackend(ABC):
+    """
+    Encodes and decodes json, e.g. the raw Azure API responses saved to disk.
+
+    Parser outputs are serialised by pydantic, whose serialiser is faster than
+    dumping their models to python objects for another encoder.
+    """
+
+    name: str
+
+    @abstractmethod
+    def dumps(self, obj: Any) -> bytes:
+        """Encode an object as utf-8 json."""
+
+    @abstractmethod
+    def loads(self, data: Union[bytes, str]) -> Any:
+        """Decode json."""
+
+
+class StdlibJsonBackend(JsonBackend):
+    """The standard library's json module."""
+
+    name = "json"
+
+    def dumps(self, obj: Any) -> bytes:
+        """Encode an object as json with json.dumps."""
+        return json.dumps(obj).encode("utf-8")
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        """Decode json with json.loads."""
+        return json.loads(data)
+
+
+class OrjsonBackend(JsonBackend):
+    """orjson, which is several times faster than the json module on large objects."""
+
+    name = "orjson"
+
+    def __init__(self) -> None:
+        if orjson is None:
+            raise RuntimeError("OrjsonBackend requires orjson, which isn't installed.")
+
+    def dumps(self, obj: Any) -> bytes:
+        """Encode an object as compact json with orjson."""
+        return orjson.dumps(obj)
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        """Decode json with orjson."""
+        return orjson.loads(data)
+
+
+JSON_BACKENDS: dict[str, type[JsonBackend]] = {
+    StdlibJsonBackend.name: StdlibJsonBackend,
+    OrjsonBackend.name: OrjsonBackend,
+}
+
+
+def default_json_backend() -> JsonBackend:
+    """The orjson backend if orjson is installed, otherwise the json module's."""
+    return OrjsonBackend() if orjson is not None else StdlibJsonBackend()
+
+
+def write_bytes_atomically(data: bytes, path: Path) -> None:
+    """Write data to a temporary file that then replaces path."""
+    with NamedTemporaryFile(
+        "wb", dir=path.parent, prefix=f".{path.name}.", suffix=".tmp", delete=False
+    ) as temp_file:
+        try:
+            temp_file.write(data)
+        except BaseException:
+            temp_file.close()
+            os.unlink(temp_file.name)
+            raise
+    os.replace(temp_file.name, path)
+
+
+def save_analyze_result(
+    result: AnalyzeResult, path: Path, backend: Optional[JsonBackend] = None
+) -> None:
+    """
+    Save a raw Azure API response as json, atomically.
+
+    The json backend defaults to orjson where it's installed (see
+    default_json_backend). Load the response with load_analyze_result.
+    """
+    backend = backend or default_json_backend()
+    write_bytes_atomically(backend.dumps(result.to_dict()), path)
+
+
+def load_analyze_result(
+    path: Path, backend: Optional[JsonBackend] = None
+) -> AnalyzeResult:
+    """Load a raw Azure API response saved as json, by either backend."""
+    backend = backend or default_json_backend()
+    return AnalyzeResult.from_dict(backend.loads(path.read_bytes()))
@@ -1,64 +1,123 @@
 import hashlib
 import io
 import logging
-from io import BytesIO
-from typing import Any, Optional, Sequence
-
+import multiprocessing
+import os
+import shutil
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import contextmanager
+from tempfile import NamedTemporaryFile, SpooledTemporaryFile
+from typing import IO, Any, Awaitable, Callable, Iterator, Optional, Sequence
+
+import requests
 from azure.ai.formrecognizer import AnalyzeResult
-from pypdf import PdfReader, PdfWriter
+from pypdf import PageObject, PdfReader, PdfWriter
+from pypdf.constants import PageAttributes
 
 from .base import PDFPagesBatch, PDFPagesBatchExtracted
+from .retry import RetryPolicy
 
 logger = logging.getLogger(__name__)
 
 
 DEFAULT_BATCH_SIZE = 50
+DEFAULT_DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+DEFAULT_SPOOL_MAX_SIZE = 16 * 1024 * 1024
+
+# Page resource categories that can be pruned to the names a batch's content streams
+# use, with the operator that uses them.
+PRUNABLE_RESOURCE_OPERATORS = {"/Font": b"Tf", "/XObject": b"Do"}
+
+# Documents above either limit are sent straight to the batched large document path,
+# rather than being uploaded in full only for Azure to reject them.
+DEFAULT_SINGLE_CALL_MAX_PAGES = 1500
+DEFAULT_SINGLE_CALL_MAX_BYTES = 500 * 1024 * 1024
+
+
+def call_api_with_error_handling(
+    retries: int,
+    func,
+    *args,
+    retry_policy: Optional[RetryPolicy] = None,
+    **kwargs,
+) -> Any:
+    """
+    Call an API function with retries and error handling.
 
-
-def call_api_with_error_handling(retries: int, func, *args, **kwargs) -> Any:
-    """Call an API function with retries and error handling."""
+    The retry policy decides which errors are retried and how long to back off before
+    each retry. If none is given a default RetryPolicy is used.
+    """
+    retry_policy = retry_policy or RetryPolicy()
     logger.info(
         "Calling API function with retries...", extra={"props": {"retries": retries}}
     )
     for i in range(retries):
+        retry_policy.record_attempt()
         try:
-            return func(*args, **kwargs)
+            result = func(*args, **kwargs)
         except Exception as e:
             logger.error(
                 "Error occurred while calling API function...",
-                extra={"props": {"error": str(e)}},
+                extra={"props": {"error": str(e), "attempt": i + 1}},
             )
-            if i == retries - 1:
+            delay = retry_policy.handle_error(e, attempt=i, retries=retries)
+            if delay is None:
                 raise e
+            retry_policy.sleep(delay)
+        else:
+            retry_policy.record_success()
+            return result
+
+
+async def call_api_with_error_handling_async(
+    retries: int,
+    func: Callable[..., Awaitable[Any]],
+    *args,
+    retry_policy: Optional[RetryPolicy] = None,
+    **kwargs,
+) -> Any:
+    """Await an async API function with retries and error handling."""
+    retry_policy = retry_policy or RetryPolicy()
+    logger.info(
+        "Calling async API function with retries...",
+        extra={"props": {"retries": retries}},
+    )
+    for i in range(retries):
+        retry_policy.record_attempt()
+        try:
+            result = await func(*args, **kwargs)
+        except Exception as e:
+            logger.error(
+                "Error occurred while calling async API function...",
+                extra={"props": {"error": str(e), "attempt": i + 1}},
+            )
+            delay = retry_policy.handle_error(e, attempt=i, retries=retries)
+            if delay is None:
+                raise e
+            await retry_policy.sleep_async(delay)
+        else:
+            retry_policy.record_success()
+            return result
 
 
-def propagate_page_number(batch: PDFPagesBatchExtracted) -> PDFPagesBatchExtracted:
+def shift_page_numbers(
+    analyze_result: AnalyzeResult, page_offset: int
+) -> AnalyzeResult:
     """
-    Correct the page numbers in the batch.
-
-    This is done by propagating the page number of the start index of the batch to the
-    paragraphs and tables.
-
-    Page number in the batch is incremented as follows:
-
-    [1,2,3,4] and a page range of 101-104 -> [101,102,103,104]
-    Thus, incremented page number = page number + batch.page_range[0] - 1
+    Add an offset to the page numbers of the pages, paragraphs and tables of a result.
 
-    E.g.
-    - page number 1 in the batch is page number 101 in the document (1 + 101 - 1).
-    - page number 2 in the batch is page number 102 in the document (2 + 101 - 1).
+    The result is modified in place and returned.
     """
-    page_offset = batch.page_range[0] - 1
-
-    if batch.extracted_content.paragraphs:
-        for paragraph in batch.extracted_content.paragraphs:
+    if analyze_result.paragraphs:
+        for paragraph in analyze_result.paragraphs:
             if paragraph and paragraph.bounding_regions:
                 paragraph.bounding_regions[0].page_number = (
                     paragraph.bounding_regions[0].page_number + page_offset
                 )
 
-    if batch.extracted_content.tables:
-        for table in batch.extracted_content.tables:
+    if analyze_result.tables:
+        for table in analyze_result.tables:
             for cell in table.cells:
                 if cell and cell.bounding_regions:
                     for bounding_region in cell.bounding_regions:
@@ -72,13 +131,86 @@ def propagate_page_number(batch: PDFPagesBatchExtracted) -> PDFPagesBatchExtract
                         bounding_region.page_number + page_offset
                     )
 
-    for page in batch.extracted_content.pages:
+    for page in analyze_result.pages:
         if page and page.page_number:
             page.page_number = page.page_number + page_offset
+    return analyze_result
+
+
+def content_length(analyze_result: AnalyzeResult) -> int:
+    """
+    The length of the content of a result, which its spans are offsets into.
+
+    Results without content, e.g. merged ones, are measured by their page spans.
+    """
+    if analyze_result.content is not None:
+        return len(analyze_result.content)
+    return max(
+        (
+            span.offset + span.length
+            for page in analyze_result.pages
+            for span in page.spans or []
+        ),
+        default=0,
+    )
+
+
+def shift_span_offsets(analyze_result: AnalyzeResult, offset: int) -> AnalyzeResult:
+    """
+    Add an offset to the spans of the pages, paragraphs and tables of a result.
+
+    This covers the spans of the words, lines and selection marks of each page, and
+    of each table cell. The result is modified in place and returned.
+    """
+    elements: list[Any] = [
+        *(analyze_result.paragraphs or []),
+        *(analyze_result.tables or []),
+        *(cell for table in analyze_result.tables or [] for cell in table.cells),
+    ]
+    for page in analyze_result.pages:
+        elements.extend(
+            [
+                page,
+                *(page.words or []),
+                *(page.lines or []),
+                *(page.selection_marks or []),
+            ]
+        )
+
+    for element in elements:
+        if element is None:
+            continue
+        # Words and selection marks have a single span, everything else a list.
+        spans = getattr(element, "spans", None) or [getattr(element, "span", None)]
+        for span in spans:
+            if span is not None:
+                span.offset = span.offset + offset
+    return analyze_result
+
+
+def propagate_page_number(batch: PDFPagesBatchExtracted) -> PDFPagesBatchExtracted:
+    """
+    Correct the page numbers in the batch.
+
+    This is done by propagating the page number of the start index of the batch to the
+    paragraphs and tables.
+
+    Page number in the batch is incremented as follows:
+
+    [1,2,3,4] and a page range of 101-104 -> [101,102,103,104]
+    Thus, incremented page number = page number + batch.page_range[0] - 1
+
+    E.g.
+    - page number 1 in the batch is page number 101 in the document (1 + 101 - 1).
+    - page number 2 in the batch is page number 102 in the document (2 + 101 - 1).
+    """
+    shift_page_numbers(batch.extracted_content, batch.page_range[0] - 1)
     return batch
 
 
-def merge_responses(batches: Sequence[PDFPagesBatchExtracted]) -> AnalyzeResult:
+def merge_responses(
+    batches: Sequence[PDFPagesBatchExtracted], rebuild_content: bool = False
+) -> AnalyzeResult:
     """
     Merge page batch responses from multiple API calls into one.
 
@@ -89,15 +221,33 @@ def merge_responses(batches: Sequence[PDFPagesBatchExtracted]) -> AnalyzeResult:
     concerned with the tables and paragraphs for CPR purposes. If this changes,
     we will be storing the raw api responses and thus will be able to recover state.
 
+    The spans of each batch are offsets into the content of that batch, so they are
+    shifted to where the batch's content starts in the content of the whole document,
+    with the batches' content joined by newlines. Spans then identify the same text
+    across the merged result, e.g. when matching paragraphs to table cells.
+
     Note that the content field is not required to be appended to in the merge analyse
-    result as this content duplicates the data in the paragraphs.
+    result as this content duplicates the data in the paragraphs. It is only rebuilt
+    with rebuild_content.
     """
     batches = [propagate_page_number(batch) for batch in batches]
 
     all_paragraphs = []
     all_tables = []
     all_pages = []
+    all_content = []
+    content_offset = 0
     for batch in batches:
+        batch_content_length = content_length(batch.extracted_content)
+        shift_span_offsets(batch.extracted_content, content_offset)
+        content_offset += batch_content_length + len("\n")
+        if rebuild_content:
+            # Content missing from a batch is padded, so the spans of later batches
+            # still line up with the rebuilt content.
+            all_content.append(
+                batch.extracted_content.content or " " * batch_content_length
+            )
+
         if batch.extracted_content.paragraphs:
             all_paragraphs.extend(batch.extracted_content.paragraphs)
         if batch.extracted_content.tables:
@@ -110,59 +260,542 @@ def merge_responses(batches: Sequence[PDFPagesBatchExtracted]) -> AnalyzeResult:
     merged_analyse_result.paragraphs = all_paragraphs
     merged_analyse_result.tables = all_tables
     merged_analyse_result.pages = all_pages
+    if rebuild_content:
+        merged_analyse_result.content = "\n".join(all_content)
 
     return merged_analyse_result
 
 
+def prune_unused_resources(pages: Sequence[PageObject]) -> None:
+    """
+    Drop the fonts and XObjects that none of the pages' content streams use.
+
+    Documents often share one resources dictionary between all of their pages, so a
+    page copied into a batch brings every font and image of the document with it.
+    Names are pruned against those used by any of the pages, as the pages of a batch
+    can still share a resources dictionary. Resources used from within form XObjects
+    or annotations live in their own resources dictionaries and aren't affected.
+    """
+    used_names: dict[str, set[str]] = {
+        category: set() for category in PRUNABLE_RESOURCE_OPERATORS
+    }
+    for page in pages:
+        contents = page.get_contents()
+        if contents is None:
+            continue
+        for operands, operator in contents.operations:
+            for category, category_operator in PRUNABLE_RESOURCE_OPERATORS.items():
+                if operator == category_operator and operands:
+                    used_names[category].add(str(operands[0]))
+
+    for page in pages:
+        resources = page.get(PageAttributes.RESOURCES)
+        if resources is None:
+            continue
+        resources = resources.get_object()
+        for category, names in used_names.items():
+            category_resources = resources.get(category)
+            if category_resources is None:
+                continue
+            category_resources = category_resources.get_object()
+            for name in list(category_resources.keys()):
+                if name not in names:
+                    del category_resources[name]
+
+
+def write_pdf_pages(pages: Sequence[PageObject], optimize: bool = False) -> bytes:
+    """
+    Write pdf pages to the bytes of a new pdf document.
+
+    With optimize, fonts and XObjects the pages don't use are dropped, content streams
+    are compressed, and identical and unreferenced objects are removed before writing.
+    If the pages' content streams can't be parsed to find the resources they use, the
+    resources are left as they are.
+    """
+    pdf_writer = PdfWriter()
+    batch_pages = [pdf_writer.add_page(page) for page in pages]
+
+    if optimize:
+        try:
+            prune_unused_resources(batch_pages)
+        except Exception as e:
+            logger.warning(
+                "Failed to prune unused resources from pdf pages...",
+                extra={"props": {"error": str(e)}},
+            )
+        for page in batch_pages:
+            page.compress_content_streams()
+        # The pruned resources are removed before deduplicating, in separate passes, as
+        # a combined pass can keep an unreferenced duplicate in place of a used object.
+        pdf_writer.compress_identical_objects(
+            remove_duplicates=False, remove_unreferenced=True
+        )
+        pdf_writer.compress_identical_objects(
+            remove_duplicates=True, remove_unreferenced=False
+        )
+
+    output_buffer = io.BytesIO()
+    pdf_writer.write(output_buffer)
+    return output_buffer.getvalue()
+
+
 def split_into_batches(
-    document_bytes: BytesIO, batch_size: Optional[int] = None
+    document_bytes: IO[bytes],
+    batch_size: Optional[int] = None,
+    max_batch_bytes: Optional[int] = None,
+    optimize: bool = True,
+    max_workers: Optional[int] = None,
 ) -> list[PDFPagesBatch]:
+    """Split a pdf document into batches of pages. See iter_batches."""
+    return list(
+        iter_batches(
+            document_bytes,
+            batch_size=batch_size,
+            max_batch_bytes=max_batch_bytes,
+            optimize=optimize,
+            max_workers=max_workers,
+        )
+    )
+
+
+def iter_batches(
+    document_bytes: IO[bytes],
+    batch_size: Optional[int] = None,
+    max_batch_bytes: Optional[int] = None,
+    optimize: bool = True,
+    max_workers: Optional[int] = None,
+) -> Iterator[PDFPagesBatch]:
+    """
+    Lazily split a pdf document into batches of pages.
+
+    Each batch is written as it is requested, so only the batches a consumer holds on
+    to are kept in memory. The document must stay open until the iterator is
+    exhausted. Validation happens on the first batch requested.
+
+    Without max_batch_bytes every batch has batch_size pages, bar the last. With it,
+    batch_size is the maximum number of pages in a batch and each batch is also kept
+    to at most max_batch_bytes, measured on the written batch bytes. Each batch starts
+    at batch_size pages and is shrunk, in proportion to how far over the limit it is,
+    until it fits. A single page larger than max_batch_bytes can't be split further
+    and is given a batch of its own.
+
+    With optimize, batches are written without the resources their pages don't use and
+    with compressed content streams (see write_pdf_pages). With debug logging, the
+    bytes saved are logged for each batch.
+
+    If max_workers is greater than one, batches are written in a pool of that many
+    processes, each of which opens the document from a path on disk. Documents that
+    aren't already a file on disk are copied to a temporary file first. Up to twice
+    max_workers batches are written ahead of the consumer, and they're yielded in the
+    same order and with the same page ranges as when written serially. Sizing
+    batches by max_batch_bytes depends on where the previous batch ended, so with
+    max_batch_bytes batches are always written serially.
+    """
     if batch_size is None:
         batch_size = DEFAULT_BATCH_SIZE
 
     if batch_size < 1:
         raise ValueError("Batch size must be greater than 0.")
 
-    """Split the API response into a batch of pages."""
+    if max_batch_bytes is not None and max_batch_bytes < 1:
+        raise ValueError("Max batch bytes must be greater than 0.")
+
+    if max_workers is not None and max_workers < 1:
+        raise ValueError("Max workers must be greater than 0.")
+
+    if max_workers is not None and max_workers > 1:
+        if max_batch_bytes is None:
+            yield from _iter_batches_in_processes(
+                document_bytes, batch_size, optimize, max_workers
+            )
+            return
+        logger.warning(
+            "Batches sized by max batch bytes can't be written in parallel, "
+            "writing them serially."
+        )
+
     logger.info(
-        "Splitting pdf into batches.", extra={"props": {"batch size": batch_size}}
+        "Splitting pdf into batches.",
+        extra={"props": {"batch size": batch_size, "max batch bytes": max_batch_bytes}},
     )
     pdf = PdfReader(document_bytes)
+    page_count = len(pdf.pages)
+
+    batch_number = 0
+    page_index = 0
+    while page_index < page_count:
+        batch_page_count = min(batch_size, page_count - page_index)
+        while True:
+            pages = pdf.pages[page_index : page_index + batch_page_count]
+            pdf_batch_bytes = write_pdf_pages(pages, optimize=optimize)
+            if (
+                max_batch_bytes is None
+                or len(pdf_batch_bytes) <= max_batch_bytes
+                or batch_page_count == 1
+            ):
+                break
+            batch_page_count = max(
+                1,
+                min(
+                    batch_page_count - 1,
+                    batch_page_count * max_batch_bytes // len(pdf_batch_bytes),
+                ),
+            )
+
+        if max_batch_bytes is not None and len(pdf_batch_bytes) > max_batch_bytes:
+            logger.warning(
+                "Single page is larger than the max batch bytes.",
+                extra={
+                    "props": {
+                        "page number": page_index + 1,
+                        "bytes size": len(pdf_batch_bytes),
+                    }
+                },
+            )
+
+        if optimize and logger.isEnabledFor(logging.DEBUG):
+            _log_optimized_batch(batch_number, pages, pdf_batch_bytes)
+
+        # Adding one to the page range as we want to go from 1 -> n
+        yield PDFPagesBatch(
+            batch_content=pdf_batch_bytes,
+            page_range=(pages[0].page_number + 1, pages[-1].page_number + 1),
+            batch_number=batch_number,
+            batch_size_max=batch_size,
+        )
+        batch_number += 1
+        page_index += batch_page_count
+
+
+def _log_optimized_batch(
+    batch_number: int, pages: Sequence[PageObject], pdf_batch_bytes: bytes
+) -> None:
+    """
+    Log the bytes saved by optimizing a batch, by writing it again unoptimized.
+
+    This doubles the work of writing the batch, so is only done when debug logging.
+    """
+    unoptimized_bytes_size = len(write_pdf_pages(pages))
+    logger.debug(
+        "Optimized pdf batch.",
+        extra={
+            "props": {
+                "batch number": batch_number,
+                "unoptimized bytes size": unoptimized_bytes_size,
+                "bytes size": len(pdf_batch_bytes),
+                "bytes saved": unoptimized_bytes_size - len(pdf_batch_bytes),
+            }
+        },
+    )
+
+
+@contextmanager
+def _document_path(document_bytes: IO[bytes]) -> Iterator[str]:
+    """Get a path to a document, copying it to a temporary file if it isn't on disk."""
+    name = getattr(document_bytes, "name", None)
+    if isinstance(name, str) and os.path.isfile(name):
+        yield name
+        return
 
-    page_batches: list[list] = [
-        pdf.pages[page_index : page_index + batch_size]
-        for page_index in range(0, len(pdf.pages), batch_size)
+    with NamedTemporaryFile(suffix=".pdf") as temp_file:
+        document_bytes.seek(0)
+        shutil.copyfileobj(document_bytes, temp_file)
+        temp_file.flush()
+        yield temp_file.name
+
+
+# The document opened by each worker process of _iter_batches_in_processes.
+_worker_pdf: Optional[PdfReader] = None
+
+
+def _open_worker_pdf(document_path: str) -> None:
+    """Open the document once in a worker process."""
+    global _worker_pdf
+    _worker_pdf = PdfReader(document_path)
+
+
+def _write_batch_in_worker(
+    page_range: tuple[int, int], batch_number: int, batch_size: int, optimize: bool
+) -> PDFPagesBatch:
+    """Write a batch of the worker process's document."""
+    pages = _worker_pdf.pages[  # type: ignore[union-attr]
+        page_range[0] - 1 : page_range[1]
     ]
+    pdf_batch_bytes = write_pdf_pages(pages, optimize=optimize)
+    if optimize and logger.isEnabledFor(logging.DEBUG):
+        _log_optimized_batch(batch_number, pages, pdf_batch_bytes)
+
+    return PDFPagesBatch(
+        batch_content=pdf_batch_bytes,
+        page_range=page_range,
+        batch_number=batch_number,
+        batch_size_max=batch_size,
+    )
 
-    batches_with_bytes = []
-    for batch_index, pages in enumerate(page_batches):
-        # Create a new PDF writer object
-        pdf_writer = PdfWriter()
 
-        # TODO check the page number is correct
-        [pdf_writer.add_page(page) for page in pages]
+def _iter_batches_in_processes(
+    document_bytes: IO[bytes], batch_size: int, optimize: bool, max_workers: int
+) -> Iterator[PDFPagesBatch]:
+    """Write batches of batch_size pages in a process pool. See iter_batches."""
+    with _document_path(document_bytes) as document_path:
+        page_ranges = split_into_page_ranges(
+            len(PdfReader(document_path).pages), batch_size
+        )
+        logger.info(
+            "Writing pdf batches in parallel.",
+            extra={
+                "props": {"max workers": max_workers, "batch count": len(page_ranges)}
+            },
+        )
+        # Workers are spawned rather than forked, as forking a process with threads
+        # running, e.g. those analyzing other batches, can deadlock the workers.
+        executor = ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_open_worker_pdf,
+            initargs=(document_path,),
+        )
+        try:
+            pending: deque[Future[PDFPagesBatch]] = deque()
+            for batch_number, page_range in enumerate(page_ranges):
+                pending.append(
+                    executor.submit(
+                        _write_batch_in_worker,
+                        page_range,
+                        batch_number,
+                        batch_size,
+                        optimize,
+                    )
+                )
+                if len(pending) >= 2 * max_workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            executor.shutdown(cancel_futures=True)
+
+
+def split_into_page_ranges(
+    page_count: int, batch_size: Optional[int] = None
+) -> list[tuple[int, int]]:
+    """Split a document's pages into (first, last) ranges of up to batch_size pages."""
+    if batch_size is None:
+        batch_size = DEFAULT_BATCH_SIZE
 
-        # Create a BytesIO buffer to write the PDF content
-        output_buffer = io.BytesIO()
-        pdf_writer.write(output_buffer)
+    if batch_size < 1:
+        raise ValueError("Batch size must be greater than 0.")
 
-        # Get the bytes content
-        pdf_batch_bytes = output_buffer.getvalue()
+    return [
+        (first_page, min(first_page + batch_size - 1, page_count))
+        for first_page in range(1, page_count + 1, batch_size)
+    ]
 
-        # TODO check the page number is correct
-        # Adding one to the page range as we want to go from 1 -> n
-        batches_with_bytes.append(
-            PDFPagesBatch(
-                batch_content=pdf_batch_bytes,
-                page_range=(pages[0].page_number + 1, pages[-1].page_number + 1),
-                batch_number=batch_index,
-                batch_size_max=batch_size,
-            )
+
+def download_document(
+    doc_url: str,
+    chunk_size: int = DEFAULT_DOWNLOAD_CHUNK_SIZE,
+    spool_max_size: int = DEFAULT_SPOOL_MAX_SIZE,
+) -> IO[bytes]:
+    """
+    Stream a document from a url into a spooled temporary file.
+
+    The response body is read in chunks of chunk_size bytes. Documents up to
+    spool_max_size bytes are held in memory, larger documents are rolled over to a
+    temporary file on disk, so peak memory doesn't grow with the size of the
+    document. The returned file is positioned at the start and should be closed by the
+    caller once finished with.
+    """
+    resp = requests.get(doc_url, stream=True)
+    try:
+        if resp.status_code != 200:
+            resp.raise_for_status()
+
+        document_file = SpooledTemporaryFile(max_size=spool_max_size)
+        try:
+            for chunk in resp.iter_content(chunk_size=chunk_size):
+                document_file.write(chunk)
+        except Exception:
+            document_file.close()
+            raise
+    finally:
+        resp.close()
+
+    logger.info(
+        "Downloaded document...",
+        extra={"props": {"url": doc_url, "bytes_size": document_file.tell()}},
+    )
+    document_file.seek(0)
+    return document_file  # type: ignore[return-value]
+
+
+def get_pdf_page_count(document: IO[bytes]) -> Optional[int]:
+    """
+    Get the page count of a pdf cheaply, or None if it can't be read.
+
+    The count is read from the page tree root referenced by the trailer, so the pages
+    themselves aren't parsed.
+    """
+    try:
+        reader = PdfReader(document)
+        try:
+            return int(reader.trailer["/Root"]["/Pages"]["/Count"])
+        except (KeyError, TypeError, ValueError):
+            return len(reader.pages)
+    except Exception as e:
+        logger.warning(
+            "Failed to read pdf page count...", extra={"props": {"error": str(e)}}
+        )
+        return None
+
+
+def get_content_length(doc_url: str, timeout: float = 10) -> Optional[int]:
+    """Get the size in bytes of a remote document from a HEAD request, if reported."""
+    try:
+        resp = requests.head(doc_url, allow_redirects=True, timeout=timeout)
+        resp.raise_for_status()
+        return int(resp.headers["content-length"])
+    except Exception as e:
+        logger.warning(
+            "Failed to get document content length...",
+            extra={"props": {"url": doc_url, "error": str(e)}},
         )
+        return None
 
-    return batches_with_bytes
+
+class HttpRangeReader(io.RawIOBase):
+    """
+    A read-only, seekable file over a remote document, read with HTTP range requests.
+
+    Only the byte ranges actually read are fetched, which for a pdf opened with
+    PdfReader is the trailer, cross-reference table and the objects looked up. Wrap it
+    in an io.BufferedReader to read ahead in larger requests.
+    """
+
+    def __init__(self, url: str, size: int, timeout: float = 30):
+        super().__init__()
+        self.url = url
+        self.size = size
+        self.timeout = timeout
+        self.range_requests = 0
+        self._position = 0
+        self._session = requests.Session()
+
+    def readable(self) -> bool:
+        """Whether the file can be read from."""
+        return True
+
+    def seekable(self) -> bool:
+        """Whether the file supports random access."""
+        return True
+
+    def tell(self) -> int:
+        """The current position in the file."""
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        """Move to a new position in the file."""
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            position = self.size + offset
+        else:
+            raise ValueError(f"Invalid whence: {whence}")
+
+        if position < 0:
+            raise ValueError("Negative seek position.")
+        self._position = position
+        return position
+
+    def readinto(self, buffer) -> int:  # type: ignore[override]
+        """Read up to len(buffer) bytes from the current position into buffer."""
+        if self._position >= self.size or len(buffer) == 0:
+            return 0
+
+        last_byte = min(self._position + len(buffer), self.size) - 1
+        resp = self._session.get(
+            self.url,
+            headers={"Range": f"bytes={self._position}-{last_byte}"},
+            timeout=self.timeout,
+        )
+        resp.raise_for_status()
+        if resp.status_code != 206:
+            raise IOError("Server doesn't support range requests.")
+        self.range_requests += 1
+
+        data = resp.content
+        buffer[: len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+    def close(self) -> None:
+        """Close the file and its http session."""
+        self._session.close()
+        super().close()
+
+
+def get_remote_pdf_page_count(
+    doc_url: str, timeout: float = 10, read_ahead: int = 64 * 1024
+) -> Optional[int]:
+    """
+    Get the page count of a remote pdf without downloading it, if possible.
+
+    Only the parts of the pdf needed to find its page count are fetched, using HTTP
+    range requests. Returns None if the server doesn't support range requests or the
+    pdf can't be read.
+    """
+    try:
+        resp = requests.head(doc_url, allow_redirects=True, timeout=timeout)
+        resp.raise_for_status()
+        size = int(resp.headers["content-length"])
+    except Exception as e:
+        logger.warning(
+            "Failed to get document content length...",
+            extra={"props": {"url": doc_url, "error": str(e)}},
+        )
+        return None
+
+    if resp.headers.get("accept-ranges", "").lower() != "bytes":
+        logger.warning(
+            "Server doesn't support range requests...",
+            extra={"props": {"url": doc_url}},
+        )
+        return None
+
+    range_reader = HttpRangeReader(resp.url, size, timeout=timeout)
+    with io.BufferedReader(range_reader, buffer_size=read_ahead) as document_file:
+        page_count = get_pdf_page_count(document_file)
+
+    logger.info(
+        "Read remote pdf page count...",
+        extra={
+            "props": {
+                "url": doc_url,
+                "page_count": page_count,
+                "range_requests": range_reader.range_requests,
+            }
+        },
+    )
+    return page_count
 
 
 def calculate_md5_sum(doc_bytes: bytes) -> str:
     """Calculate the md5 sum of the document bytes."""
     return hashlib.md5(doc_bytes).hexdigest()
+
+
+def calculate_file_md5_sum(
+    document_file: IO[bytes], chunk_size: int = DEFAULT_DOWNLOAD_CHUNK_SIZE
+) -> str:
+    """
+    Calculate the md5 sum of a document file, reading it in chunks.
+
+    The file is read from the start, and left positioned at the start.
+    """
+    md5 = hashlib.md5()
+    document_file.seek(0)
+    while chunk := document_file.read(chunk_size):
+        md5.update(chunk)
+    document_file.seek(0)
+    return md5.hexdigest()
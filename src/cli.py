@@ -4,7 +4,21 @@ from typing import Iterable, Optional
 
 import click
 
+from azure_pdf_parser.cache import DEFAULT_CACHE_MAX_SIZE, AnalyzeResultCache
+from azure_pdf_parser.checkpoint import BatchCheckpointStore
+from azure_pdf_parser.language import LANGUAGE_DETECTION_ENGINES, BlockLanguageDetector
+from azure_pdf_parser.rate_limit import (
+    DEFAULT_ANALYZE_TPS,
+    DEFAULT_POLL_TPS,
+    AzureRateLimiter,
+)
 from azure_pdf_parser.run import run_parser
+from azure_pdf_parser.serialization import JSON_BACKENDS, default_json_backend
+from azure_pdf_parser.utils import (
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_SINGLE_CALL_MAX_BYTES,
+    DEFAULT_SINGLE_CALL_MAX_PAGES,
+)
 
 LOGGER = logging.getLogger(__name__)
 LOGGER.setLevel(logging.INFO)
@@ -44,20 +58,249 @@ LOGGER.setLevel(logging.INFO)
     is_flag=True,
     default=False,
 )
+@click.option(
+    "--max-concurrency",
+    help="""Maximum number of page batches to analyze in parallel for documents that 
+    are too large for a single API call. Batches are analyzed one at a time by 
+    default.""",
+    required=False,
+    type=click.IntRange(min=1),
+)
+@click.option(
+    "--multiplex-polling",
+    help="""Whether to submit the page batches of large documents up front and poll 
+    them all from a single loop, rather than a loop per batch.""",
+    is_flag=True,
+    default=False,
+)
+@click.option(
+    "--analyze-tps",
+    help="""Maximum analyze requests per second to send to Azure. Setting this or 
+    --poll-tps enables client-side rate limiting.""",
+    required=False,
+    type=click.FloatRange(min=0, min_open=True),
+)
+@click.option(
+    "--poll-tps",
+    help="""Maximum status poll requests per second to send to Azure. Setting this 
+    or --analyze-tps enables client-side rate limiting.""",
+    required=False,
+    type=click.FloatRange(min=0, min_open=True),
+)
+@click.option(
+    "--rate-limit-state-dir",
+    help="""Directory to store rate limiter state in. CLI processes using the same 
+    directory share the same rate limits.""",
+    required=False,
+    type=click.Path(file_okay=False, path_type=Path),
+)
+@click.option(
+    "--max-single-call-pages",
+    help="""Documents with more pages than this are split into page batches up 
+    front, rather than first being sent to Azure in a single call.""",
+    default=DEFAULT_SINGLE_CALL_MAX_PAGES,
+    show_default=True,
+    type=click.IntRange(min=1),
+)
+@click.option(
+    "--max-single-call-bytes",
+    help="""Documents larger than this many bytes are split into page batches up 
+    front, rather than first being sent to Azure in a single call.""",
+    default=DEFAULT_SINGLE_CALL_MAX_BYTES,
+    show_default=True,
+    type=click.IntRange(min=1),
+)
+@click.option(
+    "--remote-page-ranges",
+    help="""Whether to have Azure analyze page ranges of large documents from source 
+    urls directly, rather than downloading and splitting them locally. Requires the 
+    source server to support HTTP range requests.""",
+    is_flag=True,
+    default=False,
+)
+@click.option(
+    "--cache-dir",
+    help="""Directory to cache Azure API responses in. Documents with a cached response 
+    aren't sent to Azure again, e.g. when re-running after a converter change.""",
+    required=False,
+    type=click.Path(file_okay=False, path_type=Path),
+)
+@click.option(
+    "--cache-max-size",
+    help="""Maximum size in bytes of the response cache, beyond which the least 
+    recently used responses are evicted.""",
+    default=DEFAULT_CACHE_MAX_SIZE,
+    show_default=True,
+    type=click.IntRange(min=1),
+)
+@click.option(
+    "--checkpoint-dir",
+    help="""Directory to checkpoint the completed page batches of large documents in. 
+    A document that fails part way through only submits its missing batches when run 
+    again.""",
+    required=False,
+    type=click.Path(file_okay=False, path_type=Path),
+)
+@click.option(
+    "--batch-size",
+    help="""Maximum number of pages in each page batch of a large document.""",
+    default=DEFAULT_BATCH_SIZE,
+    show_default=True,
+    type=click.IntRange(min=1),
+)
+@click.option(
+    "--max-batch-bytes",
+    help="""Maximum size in bytes of each page batch of a large document. Batches 
+    over this size are split into fewer pages, so with a larger --batch-size text-only 
+    documents need fewer calls while image-heavy ones stay within Azure's request size 
+    limit.""",
+    required=False,
+    type=click.IntRange(min=1),
+)
+@click.option(
+    "--split-workers",
+    help="""Number of processes to write the page batches of large documents in. 
+    Splitting is CPU bound, so this speeds up very large documents on multi-core 
+    machines. Batches sized by --max-batch-bytes are always written serially.""",
+    required=False,
+    type=click.IntRange(min=1),
+)
+@click.option(
+    "--stream-batches",
+    help="""Whether to convert each page batch of a large document as soon as it's 
+    analyzed, rather than merging the batches once all are done. Raw responses aren't 
+    saved for documents converted this way.""",
+    is_flag=True,
+    default=False,
+)
+@click.option(
+    "--trusted-conversion",
+    help="""Whether to build the parser output without pydantic validation, which is 
+    faster for large documents. With debug logging, a sample of the output of each 
+    document is still validated.""",
+    is_flag=True,
+    default=False,
+)
+@click.option(
+    "--block-languages",
+    help="""Whether to detect the language of each text block, rather than the 
+    language of the whole document, so multilingual documents get all their 
+    languages.""",
+    is_flag=True,
+    default=False,
+)
+@click.option(
+    "--language-engine",
+    help="""The engine detecting the language of each text block with 
+    --block-languages. ngram is faster, langdetect more robust on short blocks.""",
+    default="langdetect",
+    show_default=True,
+    type=click.Choice(list(LANGUAGE_DETECTION_ENGINES)),
+)
+@click.option(
+    "--language-workers",
+    help="""Number of processes to detect the languages of text blocks in with 
+    --block-languages.""",
+    required=False,
+    type=click.IntRange(min=1),
+)
+@click.option(
+    "--compact-tables",
+    help="""Whether to output extracted tables with their cells in columns, rather 
+    than an object per cell, which is much smaller for large tables. Only applies 
+    with --experimental-extract-tables.""",
+    is_flag=True,
+    default=False,
+)
+@click.option(
+    "--json-backend",
+    help="""The json library to save raw Azure API responses, cached responses and 
+    batch checkpoints with. Defaults to orjson where it's installed.""",
+    required=False,
+    type=click.Choice(list(JSON_BACKENDS)),
+)
 def cli(
     id_and_source_url: Optional[Iterable[tuple[str, str]]],
     pdf_dir: Optional[Path],
     output_dir: Path,
     save_raw_azure_response: bool,
     experimental_extract_tables: bool,
+    max_concurrency: Optional[int],
+    multiplex_polling: bool,
+    analyze_tps: Optional[float],
+    poll_tps: Optional[float],
+    rate_limit_state_dir: Optional[Path],
+    max_single_call_pages: int,
+    max_single_call_bytes: int,
+    remote_page_ranges: bool,
+    cache_dir: Optional[Path],
+    cache_max_size: int,
+    checkpoint_dir: Optional[Path],
+    batch_size: int,
+    max_batch_bytes: Optional[int],
+    split_workers: Optional[int],
+    stream_batches: bool,
+    trusted_conversion: bool,
+    block_languages: bool,
+    language_engine: str,
+    language_workers: Optional[int],
+    compact_tables: bool,
+    json_backend: Optional[str],
 ) -> None:
-    return run_parser(
-        output_dir=output_dir,
-        ids_and_source_urls=id_and_source_url,
-        pdf_dir=pdf_dir,
-        save_raw_azure_response=save_raw_azure_response,
-        experimental_extract_tables=experimental_extract_tables,
-    )
+    rate_limiter = None
+    if analyze_tps is not None or poll_tps is not None:
+        rate_limiter = AzureRateLimiter.from_tps(
+            analyze_tps=analyze_tps or DEFAULT_ANALYZE_TPS,
+            poll_tps=poll_tps or DEFAULT_POLL_TPS,
+            state_dir=rate_limit_state_dir,
+        )
+
+    backend = JSON_BACKENDS[json_backend]() if json_backend else default_json_backend()
+
+    cache = None
+    if cache_dir is not None:
+        cache = AnalyzeResultCache(
+            cache_dir, max_size=cache_max_size, json_backend=backend
+        )
+
+    checkpoint_store = None
+    if checkpoint_dir is not None:
+        checkpoint_store = BatchCheckpointStore(checkpoint_dir, json_backend=backend)
+
+    language_detector = None
+    if block_languages:
+        language_detector = BlockLanguageDetector(
+            engine=LANGUAGE_DETECTION_ENGINES[language_engine](),
+            max_workers=language_workers,
+        )
+
+    try:
+        return run_parser(
+            output_dir=output_dir,
+            ids_and_source_urls=id_and_source_url,
+            pdf_dir=pdf_dir,
+            save_raw_azure_response=save_raw_azure_response,
+            experimental_extract_tables=experimental_extract_tables,
+            max_concurrency=max_concurrency,
+            multiplex_polling=multiplex_polling,
+            rate_limiter=rate_limiter,
+            max_single_call_pages=max_single_call_pages,
+            max_single_call_bytes=max_single_call_bytes,
+            remote_page_ranges=remote_page_ranges,
+            cache=cache,
+            checkpoint_store=checkpoint_store,
+            batch_size=batch_size,
+            max_batch_bytes=max_batch_bytes,
+            split_workers=split_workers,
+            stream_batches=stream_batches,
+            trusted_conversion=trusted_conversion,
+            language_detector=language_detector,
+            compact_tables=compact_tables,
+            json_backend=backend,
+        )
+    finally:
+        if language_detector is not None:
+            language_detector.close()
 
 
 if __name__ == "__main__":
@@ -1,5 +1,5 @@
 from typing import Sequence, Tuple
-from unittest.mock import MagicMock, Mock
+from unittest.mock import AsyncMock, MagicMock, Mock
 
 import pytest
 from azure.ai.formrecognizer import (
@@ -13,10 +13,28 @@ from cpr_sdk.parser_models import ParserInput
 from cpr_sdk.pipeline_general_models import BackendDocument
 from pydantic import AnyHttpUrl
 
-from azure_pdf_parser import AzureApiWrapper, PDFPagesBatchExtracted
+from azure_pdf_parser import (
+    AsyncAzureApiWrapper,
+    AzureApiWrapper,
+    PDFPagesBatchExtracted,
+    RetryPolicy,
+)
 from tests.helpers import read_local_json_file, read_pdf_to_bytes
 
 
+@pytest.fixture(autouse=True)
+def retry_sleeps(monkeypatch) -> list[float]:
+    """Record retry backoff delays instead of sleeping, to keep the tests fast."""
+    sleeps: list[float] = []
+
+    async def sleep_async(self, delay: float) -> None:
+        sleeps.append(delay)
+
+    monkeypatch.setattr(RetryPolicy, "sleep", lambda self, delay: sleeps.append(delay))
+    monkeypatch.setattr(RetryPolicy, "sleep_async", sleep_async)
+    return sleeps
+
+
 @pytest.fixture()
 def backend_document_json() -> dict:
     """A sample backend document json."""
@@ -114,12 +132,32 @@ def mock_azure_client_sixteen_page(sixteen_page_analyse_result) -> AzureApiWrapp
     return azure_client
 
 
+@pytest.fixture()
+def mock_async_azure_client(one_page_analyse_result) -> AsyncAzureApiWrapper:
+    """
+    A mock asyncio client to the azure form recognizer api.
+
+    Client contains mocked responses from the api endpoints.
+    """
+    azure_client = AsyncAzureApiWrapper("user", "pass")
+    azure_client.analyze_document_from_url = AsyncMock(
+        return_value=one_page_analyse_result
+    )
+    azure_client.analyze_document_from_bytes = AsyncMock(
+        return_value=one_page_analyse_result
+    )
+    return azure_client
+
+
 @pytest.fixture
 def mock_document_download_response_one_page(one_page_pdf_bytes) -> Mock:
     """Create a mock response to a download request for a pdf document with one page."""
     # Create a mock Response object
     mock_response = Mock()
     mock_response.content = one_page_pdf_bytes
+    mock_response.iter_content.side_effect = lambda chunk_size: iter(
+        [one_page_pdf_bytes]
+    )
 
     # Set the status code and other attributes as needed for your test
     mock_response.status_code = 200
@@ -136,6 +174,9 @@ def mock_document_download_response_sixty_eight_page(
     # Create a mock Response object
     mock_response = Mock()
     mock_response.content = sixty_eight_page_pdf_bytes
+    mock_response.iter_content.side_effect = lambda chunk_size: iter(
+        [sixty_eight_page_pdf_bytes]
+    )
 
     # Set the status code and other attributes as needed for your test
     mock_response.status_code = 200
@@ -150,6 +191,9 @@ def mock_document_download_response_two_page(two_page_pdf_bytes) -> Mock:
     # Create a mock Response object
     mock_response = Mock()
     mock_response.content = two_page_pdf_bytes
+    mock_response.iter_content.side_effect = lambda chunk_size: iter(
+        [two_page_pdf_bytes]
+    )
 
     # Set the status code and other attributes as needed for your test
     mock_response.status_code = 200
@@ -269,8 +313,13 @@ def analyze_result_known_table_content(
     paragraphs we have an object where we know which paragraphs should be tagged with
     the relevant table block type.
     """
-    # Create the spans
-    spans = [DocumentSpan(offset=i, length=i) for i in range(1, 10)]
+    # Create the spans, after the content so that they don't overlap the spans of the
+    # existing paragraphs
+    content_length = len(one_page_analyse_result.content)
+    spans = [
+        DocumentSpan(offset=i, length=i)
+        for i in range(content_length + 1, content_length + 10)
+    ]
 
     # Create the cells
     cells = [
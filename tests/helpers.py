@@ -1,7 +1,14 @@
 import io
 import json
 import re
-from typing import Union
+from typing import Any, Optional, Union
+from unittest.mock import Mock
+
+from azure.core.polling import LROPoller
+from pypdf import PdfWriter
+from pypdf.generic import DictionaryObject, NameObject, StreamObject
+
+from azure_pdf_parser.polling import DeferredLROPolling
 
 
 def is_valid_md5(input_string):
@@ -33,3 +40,105 @@ def read_pdf_to_bytes(file_path: str) -> bytes:
     with open(file_path, "rb") as file:
         pdf_bytes = file.read()
     return pdf_bytes
+
+
+class FakeDeferredLROPolling(DeferredLROPolling):
+    """A deferred polling method whose status requests are simulated."""
+
+    def __init__(
+        self,
+        result: Any,
+        polls_until_done: int,
+        final_status: str = "succeeded",
+        retry_after: Optional[str] = None,
+    ):
+        super().__init__()
+        self.result = result
+        self.polls_until_done = polls_until_done
+        self.final_status = final_status
+        self.status_requests = 0
+        self.headers = {"retry-after": retry_after} if retry_after else {}
+
+    def initialize(self, client, initial_response, deserialization_callback) -> None:
+        """Set the initial state without an http response."""
+        self._operation = Mock()
+        self._operation.get_final_get_url.return_value = None
+        self._status = "running"
+        self._pipeline_response = Mock()
+        self._pipeline_response.http_response.headers = self.headers
+
+    def update_status(self) -> None:
+        """Simulate a status request."""
+        self.status_requests += 1
+        if self.status_requests >= self.polls_until_done:
+            self._status = self.final_status
+
+    def _parse_resource(self, pipeline_response) -> Any:
+        return self.result
+
+
+def make_poller(polling_method: DeferredLROPolling) -> LROPoller:
+    """Create a poller driven by the polling method."""
+    return LROPoller(None, None, lambda response: response, polling_method)
+
+
+def make_range_request_mocks(document_bytes: bytes) -> tuple[Mock, Any]:
+    """
+    Mock a server for a document that supports HTTP range requests.
+
+    Returns the response to a HEAD request and a side effect for GET requests that
+    serves the requested byte range.
+    """
+    head_response = Mock()
+    head_response.url = "https://example.com/test.pdf"
+    head_response.headers = {
+        "content-length": str(len(document_bytes)),
+        "accept-ranges": "bytes",
+    }
+
+    def get(url: str, headers: dict, timeout: float) -> Mock:
+        first_byte, last_byte = (
+            int(byte) for byte in headers["Range"].removeprefix("bytes=").split("-")
+        )
+        response = Mock()
+        response.status_code = 206
+        response.content = document_bytes[first_byte : last_byte + 1]
+        return response
+
+    return head_response, get
+
+
+def make_shared_resources_pdf(page_count: int = 2) -> bytes:
+    """
+    Make a pdf whose pages share one resources dictionary of fonts.
+
+    Page n writes its text in font /Fn, so each page uses only one of the fonts.
+    """
+    pdf_writer = PdfWriter()
+    fonts = DictionaryObject(
+        {
+            NameObject(f"/F{page_number}"): pdf_writer._add_object(
+                DictionaryObject(
+                    {
+                        NameObject("/Type"): NameObject("/Font"),
+                        NameObject("/Subtype"): NameObject("/Type1"),
+                        NameObject("/BaseFont"): NameObject("/Helvetica"),
+                    }
+                )
+            )
+            for page_number in range(1, page_count + 1)
+        }
+    )
+    resources = pdf_writer._add_object(DictionaryObject({NameObject("/Font"): fonts}))
+    for page_number in range(1, page_count + 1):
+        page = pdf_writer.add_blank_page(width=200, height=200)
+        contents = StreamObject()
+        contents.set_data(
+            f"BT /F{page_number} 12 Tf 10 10 Td (page {page_number}) Tj ET".encode()
+        )
+        page[NameObject("/Contents")] = pdf_writer._add_object(contents)
+        page[NameObject("/Resources")] = resources
+
+    output_buffer = io.BytesIO()
+    pdf_writer.write(output_buffer)
+    return output_buffer.getvalue()
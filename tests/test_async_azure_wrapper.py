@@ -0,0 +1,135 @@
+import asyncio
+import io
+from typing import Sequence
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from azure.ai.formrecognizer import AnalyzeResult
+
+from azure_pdf_parser import AsyncAzureApiWrapper, PDFPagesBatchExtracted
+
+
+def test_analyze_document_from_url(
+    mock_async_azure_client: AsyncAzureApiWrapper,
+    one_page_analyse_result: AnalyzeResult,
+) -> None:
+    """Test that the async document from url method returns the correct response."""
+    response = asyncio.run(
+        mock_async_azure_client.analyze_document_from_url(
+            "https://example.com/test.pdf"
+        )
+    )
+
+    assert mock_async_azure_client.analyze_document_from_url.await_count == 1
+    assert response == one_page_analyse_result
+
+
+def test_analyze_large_document_from_bytes(
+    mock_async_azure_client: AsyncAzureApiWrapper,
+    one_page_analyse_result: AnalyzeResult,
+    two_page_pdf_bytes: bytes,
+) -> None:
+    """Test that batches are analyzed concurrently and returned in batch order."""
+    page_api_responses, merged_api_response = asyncio.run(
+        mock_async_azure_client.analyze_large_document_from_bytes(
+            two_page_pdf_bytes, batch_size=1, max_concurrency=2
+        )
+    )
+
+    assert len(page_api_responses) == 2
+    assert [batch.batch_number for batch in page_api_responses] == [0, 1]
+    assert [batch.page_range for batch in page_api_responses] == [(1, 1), (2, 2)]
+    for page_api_response in page_api_responses:
+        assert isinstance(page_api_response, PDFPagesBatchExtracted)
+        assert page_api_response.extracted_content == one_page_analyse_result
+    assert mock_async_azure_client.analyze_document_from_bytes.await_count == 2
+    assert isinstance(merged_api_response, AnalyzeResult)
+
+
+def test_analyze_large_document_from_url(
+    mock_async_azure_client: AsyncAzureApiWrapper,
+    two_page_pdf_bytes: bytes,
+) -> None:
+    """Test that the document is downloaded and then split into batches."""
+    mock_async_azure_client._download_document = AsyncMock(
+        return_value=io.BytesIO(two_page_pdf_bytes)
+    )
+
+    response = asyncio.run(
+        mock_async_azure_client.analyze_large_document_from_url(
+            "https://example.com/test.pdf", batch_size=1
+        )
+    )
+
+    page_api_responses: Sequence[PDFPagesBatchExtracted] = response[0]
+
+    mock_async_azure_client._download_document.assert_awaited_once_with(
+        doc_url="https://example.com/test.pdf"
+    )
+    assert len(page_api_responses) == 2
+    assert isinstance(response[1], AnalyzeResult)
+
+
+def test_analyze_large_document_batch_failure(
+    mock_async_azure_client: AsyncAzureApiWrapper,
+    two_page_pdf_bytes: bytes,
+) -> None:
+    """Test that a batch which fails after its retries raises the error."""
+    mock_async_azure_client.analyze_document_from_bytes.side_effect = Exception(
+        "Simulated API error"
+    )
+
+    with pytest.raises(Exception, match="Simulated API error"):
+        asyncio.run(
+            mock_async_azure_client.analyze_large_document_from_bytes(
+                two_page_pdf_bytes, batch_size=1
+            )
+        )
+
+
+def test_analyze_large_document_from_url_remote_page_ranges(
+    mock_async_azure_client: AsyncAzureApiWrapper,
+) -> None:
+    """Test that page ranges of a remote document are analyzed without downloading."""
+    mock_async_azure_client._download_document = AsyncMock()
+
+    with patch(
+        "azure_pdf_parser.async_azure_wrapper.get_remote_pdf_page_count",
+        return_value=3,
+    ):
+        page_api_responses, _ = asyncio.run(
+            mock_async_azure_client.analyze_large_document_from_url(
+                "https://example.com/test.pdf", batch_size=2, remote_page_ranges=True
+            )
+        )
+
+    mock_async_azure_client._download_document.assert_not_awaited()
+    assert [
+        call.kwargs["pages"]
+        for call in mock_async_azure_client.analyze_document_from_url.await_args_list
+    ] == ["1-2", "3-3"]
+    assert [batch.page_range for batch in page_api_responses] == [(1, 2), (3, 3)]
+
+
+def test_map_concurrently_takes_items_lazily() -> None:
+    """Test that items are only taken once there's room for them among those running."""
+    finished = 0
+    held = []
+
+    async def items():
+        for taken, item in enumerate(range(10), start=1):
+            held.append(taken - finished)
+            yield item
+
+    async def double(item: int) -> int:
+        nonlocal finished
+        await asyncio.sleep(0.01)
+        finished += 1
+        return item * 2
+
+    results = asyncio.run(
+        AsyncAzureApiWrapper._map_concurrently(double, items(), max_concurrency=3)
+    )
+
+    assert results == [item * 2 for item in range(10)]
+    assert max(held) <= 3
@@ -1,6 +1,10 @@
-from typing import Sequence
-from unittest.mock import Mock, patch
+import io
+import threading
+import time
+from typing import Optional, Sequence
+from unittest.mock import MagicMock, Mock, patch
 
+import pytest
 from azure.ai.formrecognizer import AnalyzeResult
 from cpr_sdk.parser_models import ParserInput, ParserOutput
 
@@ -9,7 +13,8 @@ from azure_pdf_parser import (
     PDFPagesBatchExtracted,
     azure_api_response_to_parser_output,
 )
-from azure_pdf_parser.utils import call_api_with_error_handling
+from azure_pdf_parser.utils import call_api_with_error_handling, shift_page_numbers
+from tests.helpers import FakeDeferredLROPolling, make_poller
 
 # TODO test non english document
 
@@ -183,3 +188,198 @@ def test_document_split_sixty_eight_page(
 
         assert isinstance(parser_output, ParserOutput)
         parser_output.vertically_flip_text_block_coords()
+
+
+def test_document_split_two_page_concurrent(
+    mock_azure_client: AzureApiWrapper,
+    one_page_analyse_result: AnalyzeResult,
+    two_page_pdf_bytes: bytes,
+) -> None:
+    """Test that batches analyzed concurrently are returned in batch order."""
+    response = mock_azure_client.analyze_large_document_from_bytes(
+        two_page_pdf_bytes,
+        batch_size=1,
+        max_concurrency=2,
+    )
+
+    page_api_responses: Sequence[PDFPagesBatchExtracted] = response[0]
+
+    assert len(page_api_responses) == 2
+    assert [batch.batch_number for batch in page_api_responses] == [0, 1]
+    assert [batch.page_range for batch in page_api_responses] == [(1, 1), (2, 2)]
+    assert mock_azure_client.analyze_document_from_bytes.call_count == 2
+    assert isinstance(response[1], AnalyzeResult)
+
+
+def test_document_split_two_page_on_batch(
+    mock_azure_client: AzureApiWrapper,
+    one_page_analyse_result: AnalyzeResult,
+    two_page_pdf_bytes: bytes,
+) -> None:
+    """Test that batches are handed to on_batch as they complete, not merged."""
+    for multiplex_polling in (False, True):
+        mock_azure_client.begin_analyze_document_from_bytes = MagicMock(
+            side_effect=lambda doc_bytes: make_poller(
+                FakeDeferredLROPolling(
+                    result=one_page_analyse_result, polls_until_done=1
+                )
+            )
+        )
+        batches: list[PDFPagesBatchExtracted] = []
+
+        response = mock_azure_client.analyze_large_document_from_bytes(
+            two_page_pdf_bytes,
+            batch_size=1,
+            max_concurrency=2,
+            multiplex_polling=multiplex_polling,
+            on_batch=batches.append,
+        )
+
+        assert response == ([], None)
+        assert sorted(batch.page_range for batch in batches) == [(1, 1), (2, 2)]
+
+
+def test_analyze_batches_invalid_max_concurrency(
+    mock_azure_client: AzureApiWrapper,
+    two_page_pdf_bytes: bytes,
+) -> None:
+    """Test that a max concurrency of less than one is rejected."""
+    with pytest.raises(ValueError):
+        mock_azure_client.analyze_large_document_from_bytes(
+            two_page_pdf_bytes, batch_size=1, max_concurrency=0
+        )
+
+
+def test_map_concurrently_takes_items_lazily() -> None:
+    """Test that items are only taken from the iterable as earlier calls finish."""
+    finished = 0
+    held = []
+    lock = threading.Lock()
+
+    def items():
+        for taken, item in enumerate(range(10), start=1):
+            with lock:
+                held.append(taken - finished)
+            yield item
+
+    def double(item: int) -> int:
+        nonlocal finished
+        time.sleep(0.01)
+        with lock:
+            finished += 1
+        return item * 2
+
+    results = AzureApiWrapper._map_concurrently(double, items(), max_concurrency=3)
+
+    assert results == [item * 2 for item in range(10)]
+    assert max(held) <= 3
+
+
+def test_document_split_two_page_multiplexed(
+    mock_azure_client: AzureApiWrapper,
+    one_page_analyse_result: AnalyzeResult,
+    two_page_pdf_bytes: bytes,
+) -> None:
+    """Test that batches are submitted up front and polled from a single loop."""
+    mock_azure_client.begin_analyze_document_from_bytes = MagicMock(
+        side_effect=[
+            make_poller(
+                FakeDeferredLROPolling(
+                    result=one_page_analyse_result, polls_until_done=1
+                )
+            ),
+            make_poller(
+                FakeDeferredLROPolling(
+                    result=one_page_analyse_result,
+                    polls_until_done=1,
+                    final_status="failed",
+                )
+            ),
+            make_poller(
+                FakeDeferredLROPolling(
+                    result=one_page_analyse_result, polls_until_done=1
+                )
+            ),
+        ]
+    )
+
+    page_api_responses, merged_api_response = (
+        mock_azure_client.analyze_large_document_from_bytes(
+            two_page_pdf_bytes, batch_size=1, multiplex_polling=True
+        )
+    )
+
+    # The second batch failed once and was resubmitted
+    assert mock_azure_client.begin_analyze_document_from_bytes.call_count == 3
+    assert mock_azure_client.analyze_document_from_bytes.call_count == 0
+    assert [batch.batch_number for batch in page_api_responses] == [0, 1]
+    for page_api_response in page_api_responses:
+        assert page_api_response.extracted_content == one_page_analyse_result
+    assert isinstance(merged_api_response, AnalyzeResult)
+
+
+def test_analyze_large_document_from_url_remote_page_ranges(
+    mock_azure_client: AzureApiWrapper,
+    one_page_analyse_result: AnalyzeResult,
+) -> None:
+    """Test that page ranges of a remote document are analyzed without downloading."""
+
+    def analyze_document_from_url(
+        doc_url: str, timeout: Optional[int] = None, pages: Optional[str] = None
+    ) -> AnalyzeResult:
+        # Azure numbers the pages of a range as in the whole document.
+        first_page = int(pages.split("-")[0])
+        return shift_page_numbers(
+            AnalyzeResult.from_dict(one_page_analyse_result.to_dict()), first_page - 1
+        )
+
+    mock_azure_client.analyze_document_from_url = MagicMock(
+        side_effect=analyze_document_from_url
+    )
+
+    with (
+        patch(
+            "azure_pdf_parser.azure_wrapper.get_remote_pdf_page_count", return_value=3
+        ),
+        patch("azure_pdf_parser.azure_wrapper.download_document") as mock_download,
+    ):
+        page_api_responses, merged_api_response = (
+            mock_azure_client.analyze_large_document_from_url(
+                "https://example.com/test.pdf",
+                batch_size=2,
+                max_concurrency=2,
+                remote_page_ranges=True,
+            )
+        )
+
+    mock_download.assert_not_called()
+    assert sorted(
+        call.kwargs["pages"]
+        for call in mock_azure_client.analyze_document_from_url.call_args_list
+    ) == ["1-2", "3-3"]
+    assert [batch.page_range for batch in page_api_responses] == [(1, 2), (3, 3)]
+    assert [page.page_number for page in merged_api_response.pages] == [1, 3]
+
+
+def test_analyze_large_document_from_url_remote_page_ranges_unsupported(
+    mock_azure_client: AzureApiWrapper,
+    two_page_pdf_bytes: bytes,
+) -> None:
+    """Test that the document is downloaded if its page count can't be read."""
+    with (
+        patch(
+            "azure_pdf_parser.azure_wrapper.get_remote_pdf_page_count",
+            return_value=None,
+        ),
+        patch(
+            "azure_pdf_parser.azure_wrapper.download_document",
+            return_value=io.BytesIO(two_page_pdf_bytes),
+        ),
+    ):
+        page_api_responses, _ = mock_azure_client.analyze_large_document_from_url(
+            "https://example.com/test.pdf", batch_size=1, remote_page_ranges=True
+        )
+
+    assert mock_azure_client.analyze_document_from_url.call_count == 0
+    assert mock_azure_client.analyze_document_from_bytes.call_count == 2
+    assert [batch.page_range for batch in page_api_responses] == [(1, 1), (2, 2)]
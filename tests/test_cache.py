@@ -0,0 +1,119 @@
+import os
+from pathlib import Path
+from unittest.mock import MagicMock, Mock, patch
+
+from azure.ai.formrecognizer import AnalyzeResult
+
+from azure_pdf_parser import AnalyzeResultCache, AzureApiWrapper
+
+
+def test_cache_round_trip(
+    tmp_path: Path, one_page_analyse_result: AnalyzeResult, one_page_pdf_bytes: bytes
+) -> None:
+    """Test that cached results are returned as they were stored."""
+    cache = AnalyzeResultCache(tmp_path)
+    key = cache.key_for_bytes(one_page_pdf_bytes)
+
+    assert cache.get(key) is None
+    cache.set(key, one_page_analyse_result)
+
+    cached_result = cache.get(key)
+    assert isinstance(cached_result, AnalyzeResult)
+    assert cached_result.to_dict() == one_page_analyse_result.to_dict()
+    assert cache.stats() == {"hits": 1, "misses": 1}
+
+
+def test_cache_keys(one_page_pdf_bytes: bytes, two_page_pdf_bytes: bytes) -> None:
+    """Test that keys depend on the content, pages, model and API version."""
+    key = AnalyzeResultCache.key_for_bytes(one_page_pdf_bytes)
+
+    assert key == AnalyzeResultCache.key_for_bytes(one_page_pdf_bytes)
+    assert key != AnalyzeResultCache.key_for_bytes(two_page_pdf_bytes)
+    assert key != AnalyzeResultCache.key_for_bytes(one_page_pdf_bytes, pages="1-1")
+    assert key != AnalyzeResultCache.key_for_bytes(
+        one_page_pdf_bytes, model_id="prebuilt-layout"
+    )
+    assert key != AnalyzeResultCache.key_for_bytes(
+        one_page_pdf_bytes, api_version="2022-08-31"
+    )
+
+    head_response = Mock()
+    head_response.headers = {"etag": '"1"'}
+    with patch("requests.head", return_value=head_response):
+        url_key = AnalyzeResultCache.key_for_url("https://example.com/test.pdf")
+        head_response.headers = {"etag": '"2"'}
+        assert url_key != AnalyzeResultCache.key_for_url("https://example.com/test.pdf")
+
+
+def test_cache_evicts_least_recently_used(
+    tmp_path: Path, one_page_analyse_result: AnalyzeResult
+) -> None:
+    """Test that the least recently used results are evicted once over size."""
+    cache = AnalyzeResultCache(tmp_path)
+    for key in ("a1", "b2", "c3"):
+        cache.set(key, one_page_analyse_result)
+    entry_size = cache._path("a1").stat().st_size
+
+    for mtime, key in enumerate(("b2", "a1", "c3")):
+        os.utime(cache._path(key), (mtime, mtime))
+
+    cache.max_size = 2 * entry_size
+    cache.evict()
+
+    assert not cache._path("b2").exists()
+    assert cache._path("a1").exists()
+    assert cache._path("c3").exists()
+
+
+def test_cache_only_scans_when_over_size(
+    tmp_path: Path, one_page_analyse_result: AnalyzeResult
+) -> None:
+    """Test that writes only scan the cache once the running size exceeds max_size."""
+    cache = AnalyzeResultCache(tmp_path)
+    with patch.object(cache, "evict", wraps=cache.evict) as evict:
+        cache.set("a1", one_page_analyse_result)
+        cache.set("a1", one_page_analyse_result)
+        evict.assert_not_called()
+
+        cache.max_size = cache._path("a1").stat().st_size
+        cache.set("b2", one_page_analyse_result)
+        evict.assert_called_once()
+
+    assert cache._size == cache.max_size
+    assert not cache._path("a1").exists() or not cache._path("b2").exists()
+
+
+def test_cache_removes_stale_temp_files(tmp_path: Path) -> None:
+    """Test that temporary files left by interrupted writes are removed."""
+    (tmp_path / "a1").mkdir()
+    stale_file = tmp_path / "a1" / "stale.tmp"
+    fresh_file = tmp_path / "a1" / "fresh.tmp"
+    stale_file.write_text("{")
+    fresh_file.write_text("{")
+    os.utime(stale_file, (0, 0))
+
+    AnalyzeResultCache(tmp_path)
+
+    assert not stale_file.exists()
+    assert fresh_file.exists()
+
+
+def test_azure_api_wrapper_cache(
+    tmp_path: Path, one_page_analyse_result: AnalyzeResult, one_page_pdf_bytes: bytes
+) -> None:
+    """Test that the wrapper only calls Azure for documents that aren't cached."""
+    azure_client = AzureApiWrapper(
+        "key", "https://example.com", cache=AnalyzeResultCache(tmp_path)
+    )
+    poller = MagicMock()
+    poller.done.return_value = True
+    poller.result.return_value = one_page_analyse_result
+    azure_client.document_analysis_client = MagicMock()
+    azure_client.document_analysis_client.begin_analyze_document.return_value = poller
+
+    first_result = azure_client.analyze_document_from_bytes(one_page_pdf_bytes)
+    second_result = azure_client.analyze_document_from_bytes(one_page_pdf_bytes)
+
+    assert azure_client.document_analysis_client.begin_analyze_document.call_count == 1
+    assert first_result == one_page_analyse_result
+    assert second_result.to_dict() == one_page_analyse_result.to_dict()
@@ -0,0 +1,104 @@
+import asyncio
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from azure.ai.formrecognizer import AnalyzeResult
+
+from azure_pdf_parser import (
+    AsyncAzureApiWrapper,
+    AzureApiWrapper,
+    PDFPagesBatchExtracted,
+)
+from azure_pdf_parser.checkpoint import BatchCheckpointStore
+from azure_pdf_parser.utils import calculate_md5_sum
+
+
+def test_checkpoint_store(tmp_path: Path, pdf_page: PDFPagesBatchExtracted) -> None:
+    """Test that checkpointed batches are loaded as they were saved."""
+    checkpoint_store = BatchCheckpointStore(tmp_path)
+
+    assert checkpoint_store.get("hash", pdf_page.page_range) is None
+    checkpoint_store.save("hash", pdf_page)
+
+    batch = checkpoint_store.get("hash", pdf_page.page_range)
+    assert batch is not None
+    assert batch.page_range == pdf_page.page_range
+    assert batch.batch_number == pdf_page.batch_number
+    assert batch.batch_size_max == pdf_page.batch_size_max
+    assert batch.extracted_content.to_dict() == pdf_page.extracted_content.to_dict()
+    assert list(checkpoint_store.load("hash", [(1, 1), pdf_page.page_range])) == [
+        pdf_page.page_range
+    ]
+
+    checkpoint_store.clear("hash")
+    assert checkpoint_store.get("hash", pdf_page.page_range) is None
+
+
+def test_large_document_resumes_from_checkpoints(
+    tmp_path: Path,
+    mock_azure_client: AzureApiWrapper,
+    one_page_analyse_result: AnalyzeResult,
+    two_page_pdf_bytes: bytes,
+) -> None:
+    """Test that a failed document only submits its missing batches when retried."""
+    checkpoint_store = BatchCheckpointStore(tmp_path)
+    mock_azure_client.checkpoint_store = checkpoint_store
+    mock_azure_client.analyze_document_from_bytes = MagicMock(
+        side_effect=[one_page_analyse_result] + [Exception("API error")] * 3
+    )
+
+    with pytest.raises(Exception, match="API error"):
+        mock_azure_client.analyze_large_document_from_bytes(
+            two_page_pdf_bytes, batch_size=1
+        )
+
+    document_hash = calculate_md5_sum(two_page_pdf_bytes)
+    assert checkpoint_store.get(document_hash, (1, 1)) is not None
+    assert checkpoint_store.get(document_hash, (2, 2)) is None
+
+    mock_azure_client.analyze_document_from_bytes = MagicMock(
+        return_value=one_page_analyse_result
+    )
+    page_api_responses, _ = mock_azure_client.analyze_large_document_from_bytes(
+        two_page_pdf_bytes, batch_size=1
+    )
+
+    assert mock_azure_client.analyze_document_from_bytes.call_count == 1
+    assert [batch.page_range for batch in page_api_responses] == [(1, 1), (2, 2)]
+    assert not (tmp_path / document_hash).exists()
+
+
+def test_async_large_document_resumes_from_checkpoints(
+    tmp_path: Path,
+    mock_async_azure_client: AsyncAzureApiWrapper,
+    one_page_analyse_result: AnalyzeResult,
+    two_page_pdf_bytes: bytes,
+    pdf_page: PDFPagesBatchExtracted,
+) -> None:
+    """Test that the async wrapper also skips checkpointed batches."""
+    checkpoint_store = BatchCheckpointStore(tmp_path)
+    document_hash = calculate_md5_sum(two_page_pdf_bytes)
+    checkpoint_store.save(
+        document_hash,
+        PDFPagesBatchExtracted(
+            page_range=(2, 2),
+            extracted_content=one_page_analyse_result,
+            batch_number=1,
+            batch_size_max=1,
+        ),
+    )
+    mock_async_azure_client.checkpoint_store = checkpoint_store
+    mock_async_azure_client.analyze_document_from_bytes = AsyncMock(
+        return_value=one_page_analyse_result
+    )
+
+    page_api_responses, _ = asyncio.run(
+        mock_async_azure_client.analyze_large_document_from_bytes(
+            two_page_pdf_bytes, batch_size=1
+        )
+    )
+
+    assert mock_async_azure_client.analyze_document_from_bytes.await_count == 1
+    assert [batch.batch_number for batch in page_api_responses] == [0, 1]
+    assert not (tmp_path / document_hash).exists()
@@ -1,27 +1,48 @@
+import logging
 import unittest
 
+import pytest
 from azure.ai.formrecognizer import (
     AnalyzeResult,
     DocumentParagraph,
+    DocumentSpan,
     DocumentTable,
+    DocumentTableCell,
     Point,
 )
-from cpr_sdk.parser_models import BlockType, ParserInput, ParserOutput, PDFTextBlock
+from cpr_sdk.parser_models import (
+    BlockType,
+    ParserInput,
+    ParserOutput,
+    PDFPageMetadata,
+    PDFTextBlock,
+)
+from pydantic import ValidationError
 
-from azure_pdf_parser.base import DIMENSION_CONVERSION_FACTOR
+from azure_pdf_parser.base import DIMENSION_CONVERSION_FACTOR, PDFPagesBatchExtracted
 from azure_pdf_parser.convert import (
+    BatchedResponseConverter,
     azure_api_response_to_parser_output,
     azure_paragraph_to_text_block,
+    azure_table_to_compact_table,
     azure_table_to_table_block,
+    build_parser_output,
+    extract_azure_api_response_page_metadata,
+    extract_azure_api_response_paragraphs,
+    extract_azure_api_response_tables,
     get_all_table_cell_spans,
+    match_table_paragraphs,
     polygon_to_co_ordinates,
+    scale_polygons,
     tag_table_paragraphs,
 )
 from azure_pdf_parser.experimental_base import (
+    CompactTable,
     ExperimentalParserOutput,
     ExperimentalPDFTableBlock,
     ExperimentalTableCell,
 )
+from azure_pdf_parser.utils import merge_responses
 
 
 def test_valid_polygon_to_co_ordinates() -> None:
@@ -101,6 +122,76 @@ def test_azure_table_to_table_block(document_table: DocumentTable) -> None:
     #   function and tests
 
 
+def test_azure_table_to_compact_table(document_table: DocumentTable) -> None:
+    """Test that compact tables hold the same cells as table blocks."""
+    table = azure_table_to_compact_table(document_table, index=123, page_offset=16)
+
+    assert isinstance(table, CompactTable)
+    assert len(table) == len(document_table.cells)
+    table_block = table.to_table_block()
+    assert table_block == azure_table_to_table_block(
+        document_table, index=123, page_offset=16
+    )
+    assert table.to_table_block(trusted=True).model_dump() == table_block.model_dump()
+
+    compact_table_block = table.to_compact_table_block()
+    assert compact_table_block.table_id == "123"
+    for index, cell in enumerate(table_block.cells):
+        assert compact_table_block.cell_types[index] == cell.cell_type
+        assert compact_table_block.row_indices[index] == cell.row_index
+        assert compact_table_block.column_spans[index] == cell.column_span
+        assert compact_table_block.contents[index] == cell.content
+        region = cell.bounding_regions[0]
+        assert compact_table_block.page_numbers[index] == region.page_number
+        assert compact_table_block.polygons[index] == [
+            value for point in region.polygon for value in (point.x, point.y)
+        ]
+
+    assert table.with_table_id("7").table_id == "7"
+    assert table.table_id == "123"
+
+
+def test_azure_api_response_to_parser_output_compact_tables(
+    parser_input: ParserInput, sixteen_page_analyse_result: AnalyzeResult
+) -> None:
+    """Test that compact tables are output in place of table blocks."""
+    parser_output = azure_api_response_to_parser_output(
+        parser_input=parser_input,
+        md5_sum="123456",
+        api_response=sixteen_page_analyse_result,
+        experimental_extract_tables=True,
+        compact_tables=True,
+    )
+
+    assert parser_output.pdf_data.table_blocks is None
+    compact_table_blocks = parser_output.pdf_data.compact_table_blocks
+    assert [int(table.table_id) for table in compact_table_blocks] == list(
+        range(len(sixteen_page_analyse_result.tables))
+    )
+    assert (
+        ExperimentalParserOutput.model_validate_json(parser_output.model_dump_json())
+        == parser_output
+    )
+
+
+def test_scale_polygons(document_table: DocumentTable) -> None:
+    """Test that polygons scaled together match scaling each point on its own."""
+    polygons = [cell.bounding_regions[0].polygon for cell in document_table.cells]
+    polygons.append([Point(x=1.5, y=2.0), Point(x=3.25, y=0.0)])
+
+    assert scale_polygons(polygons) == [
+        [
+            (
+                DIMENSION_CONVERSION_FACTOR * point.x,
+                DIMENSION_CONVERSION_FACTOR * point.y,
+            )
+            for point in polygon
+        ]
+        for polygon in polygons
+    ]
+    assert scale_polygons([]) == []
+
+
 def test_azure_api_response_to_parser_output(
     parser_input: ParserInput,
     parser_input_no_content_type: ParserInput,
@@ -170,6 +261,156 @@ def test_azure_api_response_to_parser_output(
     parser_output.vertically_flip_text_block_coords().get_text_blocks()
 
 
+def test_azure_api_response_to_parser_output_matches_separate_passes(
+    parser_input: ParserInput, sixteen_page_analyse_result: AnalyzeResult
+) -> None:
+    """Test that converting in one traversal gives byte-identical output."""
+
+    def merged_api_response() -> AnalyzeResult:
+        return merge_responses(
+            [
+                PDFPagesBatchExtracted(
+                    page_range=(first_page, first_page + 15),
+                    extracted_content=AnalyzeResult.from_dict(
+                        sixteen_page_analyse_result.to_dict()
+                    ),
+                    batch_number=batch_number,
+                    batch_size_max=16,
+                )
+                for batch_number, first_page in enumerate((1, 17, 33))
+            ]
+        )
+
+    for experimental_extract_tables in (False, True):
+        api_response = tag_table_paragraphs(merged_api_response())
+        separate_passes_output = build_parser_output(
+            parser_input=parser_input,
+            md5_sum="123456",
+            text_blocks=extract_azure_api_response_paragraphs(api_response),
+            page_metadata=extract_azure_api_response_page_metadata(api_response),
+            table_blocks=(
+                extract_azure_api_response_tables(api_response)
+                if experimental_extract_tables
+                else None
+            ),
+            experimental_extract_tables=experimental_extract_tables,
+        )
+
+        parser_output = azure_api_response_to_parser_output(
+            parser_input=parser_input,
+            md5_sum="123456",
+            api_response=merged_api_response(),
+            experimental_extract_tables=experimental_extract_tables,
+        )
+
+        assert (
+            parser_output.model_dump_json() == separate_passes_output.model_dump_json()
+        )
+
+
+def test_azure_api_response_to_parser_output_trusted(
+    parser_input: ParserInput, sixteen_page_analyse_result: AnalyzeResult
+) -> None:
+    """Test that trusted conversion gives the same output as validated conversion."""
+    for experimental_extract_tables in (False, True):
+        parser_output, trusted_parser_output = (
+            azure_api_response_to_parser_output(
+                parser_input=parser_input,
+                md5_sum="123456",
+                api_response=AnalyzeResult.from_dict(
+                    sixteen_page_analyse_result.to_dict()
+                ),
+                experimental_extract_tables=experimental_extract_tables,
+                trusted=trusted,
+            )
+            for trusted in (False, True)
+        )
+
+        assert type(trusted_parser_output) is type(parser_output)
+        assert (
+            trusted_parser_output.model_dump_json() == parser_output.model_dump_json()
+        )
+
+
+def test_validate_trusted_sample(
+    caplog, parser_input: ParserInput, one_page_analyse_result: AnalyzeResult
+) -> None:
+    """Test that a sample of trusted output is validated when debug logging."""
+    caplog.set_level(logging.DEBUG, logger="azure_pdf_parser.convert")
+    text_blocks = extract_azure_api_response_paragraphs(one_page_analyse_result)
+    page_metadata = extract_azure_api_response_page_metadata(one_page_analyse_result)
+
+    build_parser_output(
+        parser_input=parser_input,
+        md5_sum="123456",
+        text_blocks=text_blocks,
+        page_metadata=page_metadata,
+        trusted=True,
+    )
+
+    invalid_page_metadata = PDFPageMetadata.model_construct(
+        page_number=-1, dimensions=page_metadata[0].dimensions
+    )
+    with pytest.raises(ValidationError):
+        build_parser_output(
+            parser_input=parser_input,
+            md5_sum="123456",
+            text_blocks=text_blocks,
+            page_metadata=[invalid_page_metadata],
+            trusted=True,
+        )
+
+    caplog.set_level(logging.INFO, logger="azure_pdf_parser.convert")
+    build_parser_output(
+        parser_input=parser_input,
+        md5_sum="123456",
+        text_blocks=text_blocks,
+        page_metadata=[invalid_page_metadata],
+        trusted=True,
+    )
+
+
+def test_batched_response_converter(
+    parser_input: ParserInput, sixteen_page_analyse_result: AnalyzeResult
+) -> None:
+    """Test that converting batches as they arrive matches converting the merge."""
+
+    def batches() -> list[PDFPagesBatchExtracted]:
+        return [
+            PDFPagesBatchExtracted(
+                page_range=(first_page, first_page + 15),
+                extracted_content=AnalyzeResult.from_dict(
+                    sixteen_page_analyse_result.to_dict()
+                ),
+                batch_number=batch_number,
+                batch_size_max=16,
+            )
+            for batch_number, first_page in enumerate((1, 17, 33))
+        ]
+
+    for experimental_extract_tables in (False, True):
+        merged_parser_output = azure_api_response_to_parser_output(
+            parser_input=parser_input,
+            md5_sum="123456",
+            api_response=merge_responses(batches()),
+            experimental_extract_tables=experimental_extract_tables,
+        )
+
+        for trusted in (False, True):
+            converter = BatchedResponseConverter(
+                experimental_extract_tables=experimental_extract_tables,
+                trusted=trusted,
+            )
+            for batch in reversed(batches()):
+                converter.add_batch(batch)
+            parser_output = converter.to_parser_output(
+                parser_input=parser_input, md5_sum="123456"
+            )
+
+            assert type(parser_output) is type(merged_parser_output)
+            assert parser_output.model_dump() == merged_parser_output.model_dump()
+
+
 def test_get_table_cell_spans(analyze_result_known_table_content) -> None:
     """Test that we can get the cell spans from a table block."""
     # Get the input data
@@ -219,6 +460,47 @@ def test_tag_table_paragraphs(analyze_result_known_table_content) -> None:
     assert table_paragraph_spans == spans
 
 
+def test_match_table_paragraphs_by_overlap(
+    one_page_analyse_result: AnalyzeResult,
+) -> None:
+    """Test that paragraphs covering part of a cell or several cells are matched."""
+    content_length = len(one_page_analyse_result.content)
+    cell_spans = [(content_length + 10, 10), (content_length + 20, 10)]
+    one_page_analyse_result.tables = one_page_analyse_result.tables[:1]
+    one_page_analyse_result.tables[0].cells = [
+        DocumentTableCell(
+            column_index=column_index,
+            content="",
+            row_index=0,
+            spans=[DocumentSpan(offset=offset, length=length)],
+        )
+        for column_index, (offset, length) in enumerate(cell_spans)
+    ]
+    paragraph_count = len(one_page_analyse_result.paragraphs)
+    one_page_analyse_result.paragraphs += [
+        DocumentParagraph(
+            content="",
+            spans=[DocumentSpan(offset=content_length + offset, length=length)],
+        )
+        for offset, length in [(12, 3), (15, 10), (5, 5), (30, 5)]
+    ]
+
+    matches = match_table_paragraphs(one_page_analyse_result)
+
+    assert matches == {
+        paragraph_count: [(0, 0)],
+        paragraph_count + 1: [(0, 0), (0, 1)],
+    }
+    tagged_paragraphs = [
+        paragraph_index
+        for paragraph_index, paragraph in enumerate(
+            tag_table_paragraphs(one_page_analyse_result).paragraphs
+        )
+        if paragraph.role == BlockType.TABLE_CELL.value
+    ]
+    assert tagged_paragraphs == [paragraph_count, paragraph_count + 1]
+
+
 def test_tag_table_paragraphs_bad_data(
     analyze_result_table_cell_no_spans: AnalyzeResult,
 ) -> None:
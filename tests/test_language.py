@@ -0,0 +1,164 @@
+from typing import Optional
+
+from azure.ai.formrecognizer import AnalyzeResult
+from cpr_sdk.parser_models import BlockType, ParserInput, TextBlock
+
+from azure_pdf_parser.convert import azure_api_response_to_parser_output
+from azure_pdf_parser.language import (
+    LANGUAGE_DETECTION_ENGINES,
+    BlockLanguageDetector,
+    LanguageDetectionEngine,
+    NgramEngine,
+    detect_language,
+    language_detection_stats,
+    sample_text_blocks,
+    text_hash,
+)
+
+
+def text_blocks(texts: list[str]) -> list[TextBlock]:
+    return [
+        TextBlock(
+            text_block_id=str(index),
+            text=[text],
+            type=BlockType.TEXT,
+            type_confidence=1.0,
+        )
+        for index, text in enumerate(texts)
+    ]
+
+
+def test_sample_text_blocks_within_budget() -> None:
+    """Test that all the text is sampled when it fits in the character budget."""
+    texts = ["The first block.", "The second block.", "The third block."]
+
+    assert sample_text_blocks(text_blocks(texts), max_chars=100) == texts
+
+
+def test_sample_text_blocks_stratified() -> None:
+    """Test that blocks are sampled from every part of a document within budget."""
+    texts = [f"Block {index} " + "x" * 100 for index in range(1000)]
+
+    sample = sample_text_blocks(text_blocks(texts), max_blocks=10, max_chars=500)
+
+    assert len(sample) == 10
+    assert [text.split()[1] for text in sample] == [
+        str(index) for index in range(0, 1000, 100)
+    ]
+    assert len(" ".join(sample)) <= 500
+
+
+def test_detect_language() -> None:
+    """Test that the language is detected from a sample and its cost is counted."""
+    documents = language_detection_stats.stats()["documents"]
+    english = "This is a long document about climate policy and the law. " * 500
+    french = "Ceci est un long document sur la politique climatique et le droit. "
+
+    assert detect_language(text_blocks([english] * 50 + [french])) == "en"
+    assert detect_language(text_blocks(["1234", "5678"])) is None
+
+    stats = language_detection_stats.stats()
+    assert stats["documents"] == documents + 2
+    assert stats["seconds"] >= 0
+
+
+def test_parser_output_languages(
+    parser_input: ParserInput, sixteen_page_analyse_result: AnalyzeResult
+) -> None:
+    """Test that the sampled language is set on the parser output and its blocks."""
+    for experimental_extract_tables in (False, True):
+        parser_output = azure_api_response_to_parser_output(
+            parser_input=parser_input,
+            md5_sum="123456",
+            api_response=AnalyzeResult.from_dict(sixteen_page_analyse_result.to_dict()),
+            experimental_extract_tables=experimental_extract_tables,
+        )
+
+        assert parser_output.languages == ["ar"]
+        assert {block.language for block in parser_output.text_blocks} == {"ar"}
+
+
+class CountingEngine(LanguageDetectionEngine):
+    """An engine that records the texts it's asked to detect."""
+
+    def __init__(self) -> None:
+        self.texts: list[str] = []
+
+    def detect(self, text: str) -> Optional[str]:
+        """Record the text, and detect French from a single word."""
+        self.texts.append(text)
+        return "fr" if "climatique" in text else "en"
+
+
+def test_text_hash() -> None:
+    """Test that texts differing only in case, digits and punctuation share a hash."""
+    assert text_hash("Annual Report 2019 - Page 3") == text_hash(
+        "annual report, page 4"
+    )
+    assert text_hash("Annual Report") != text_hash("Annual Review")
+    assert text_hash("12 - 13") is None
+
+
+def test_language_detection_engines() -> None:
+    """Test that both engines detect the language of a block of text."""
+    texts = {
+        "en": "This report sets out the national strategy for climate adaptation.",
+        "fr": "Ce rapport présente la stratégie nationale d'adaptation au climat.",
+        "es": "Este informe presenta la estrategia nacional de adaptación al clima.",
+    }
+    for engine_class in LANGUAGE_DETECTION_ENGINES.values():
+        engine = engine_class()
+        assert engine.detect_batch(list(texts.values())) == list(texts)
+        assert engine.detect("1234") is None
+
+
+def test_block_language_detector_cache() -> None:
+    """Test that repeated block texts are only detected once."""
+    engine = CountingEngine()
+    detector = BlockLanguageDetector(engine=engine)
+    cache_hits = language_detection_stats.stats()["cache_hits"]
+
+    assert detector.detect(["Page 1 - Header", "Page 2 - header", "12", "Body"]) == [
+        "en",
+        "en",
+        None,
+        "en",
+    ]
+    assert detector.detect(["Page 3 - Header", "La politique climatique"]) == [
+        "en",
+        "fr",
+    ]
+    assert engine.texts == ["Page 1 - Header", "Body", "La politique climatique"]
+    assert language_detection_stats.stats()["cache_hits"] == cache_hits + 1
+
+
+def test_block_language_detector_process_pool() -> None:
+    """Test that texts are detected in batches in worker processes."""
+    texts = ["The climate policy of the country.", "La politique climatique du pays."]
+    with BlockLanguageDetector(
+        engine=NgramEngine(), max_workers=2, batch_size=1
+    ) as detector:
+        assert detector.detect(texts * 2 + ["Un autre texte sur le climat."]) == [
+            "en",
+            "fr",
+            "en",
+            "fr",
+            "fr",
+        ]
+        assert detector._executor is not None
+    assert detector._executor is None
+
+
+def test_parser_output_block_languages(
+    parser_input: ParserInput, one_page_analyse_result: AnalyzeResult
+) -> None:
+    """Test that the language of each block is detected and sets the documents'."""
+    parser_output = azure_api_response_to_parser_output(
+        parser_input=parser_input,
+        md5_sum="123456",
+        api_response=one_page_analyse_result,
+        language_detector=BlockLanguageDetector(engine=CountingEngine()),
+    )
+
+    assert {block.language for block in parser_output.text_blocks} == {"en", None}
+    assert parser_output.languages == ["en"]
@@ -0,0 +1,111 @@
+import time
+
+import pytest
+from azure.core.exceptions import HttpResponseError
+
+from azure_pdf_parser.polling import PollMultiplexer, poll_many
+from tests.helpers import FakeDeferredLROPolling, make_poller
+
+
+def test_deferred_polling_makes_no_requests_of_its_own() -> None:
+    """Test that the poller's thread doesn't poll a deferred polling method."""
+    polling_method = FakeDeferredLROPolling(result="a", polls_until_done=2)
+    poller = make_poller(polling_method)
+    poller.wait()
+
+    assert polling_method.status_requests == 0
+    assert polling_method.step() is False
+    assert polling_method.step() is True
+    assert polling_method.status_requests == 2
+    assert poller.result() == "a"
+
+
+def test_poll_many_yields_results_as_they_complete() -> None:
+    """Test that pollers are driven from one loop and yielded in completion order."""
+    polling_methods = [
+        FakeDeferredLROPolling(result="slow", polls_until_done=3),
+        FakeDeferredLROPolling(result="fast", polls_until_done=1),
+    ]
+    pollers = [make_poller(polling_method) for polling_method in polling_methods]
+
+    results = list(poll_many(pollers, initial_delay=0, max_delay=0))
+
+    assert results == [(1, "fast"), (0, "slow")]
+    assert [polling_method.status_requests for polling_method in polling_methods] == [
+        3,
+        1,
+    ]
+
+
+def test_poll_multiplexer_honours_retry_after() -> None:
+    """Test that the Retry-After header sets a minimum delay before the next poll."""
+    multiplexer: PollMultiplexer[str] = PollMultiplexer(initial_delay=0, max_delay=0)
+    multiplexer.add(
+        "a",
+        make_poller(
+            FakeDeferredLROPolling(result="a", polls_until_done=2, retry_after="1")
+        ),
+    )
+
+    multiplexer._step("a")
+
+    assert multiplexer._delays["a"] == 1.0
+
+
+def test_poll_multiplexer_backoff() -> None:
+    """Test that the delay between polls grows up to the maximum delay."""
+    multiplexer: PollMultiplexer[str] = PollMultiplexer(
+        initial_delay=1, max_delay=2, backoff_factor=1.5
+    )
+    multiplexer.add(
+        "a", make_poller(FakeDeferredLROPolling(result="a", polls_until_done=10))
+    )
+
+    multiplexer._step("a")
+    assert multiplexer._delays["a"] == 1.5
+    multiplexer._step("a")
+    assert multiplexer._delays["a"] == 2
+    assert multiplexer.status_requests == 2
+
+
+def test_poll_multiplexer_schedule() -> None:
+    """Test that scheduled operations are submitted once their delay has passed."""
+    multiplexer: PollMultiplexer[str] = PollMultiplexer(initial_delay=0, max_delay=0)
+    submitted_at = []
+
+    def submit():
+        submitted_at.append(time.monotonic())
+        return make_poller(FakeDeferredLROPolling(result="b", polls_until_done=1))
+
+    multiplexer.add(
+        "a", make_poller(FakeDeferredLROPolling(result="a", polls_until_done=1))
+    )
+    scheduled_at = time.monotonic()
+    multiplexer.schedule("b", submit, delay=0.1)
+    assert len(multiplexer) == 2
+
+    results = [(key, poller.result()) for key, poller in multiplexer.as_completed()]
+
+    assert results == [("a", "a"), ("b", "b")]
+    assert submitted_at[0] - scheduled_at >= 0.1
+
+
+def test_poll_multiplexer_failed_operation() -> None:
+    """Test that a failed operation is yielded and raises when getting the result."""
+    multiplexer: PollMultiplexer[str] = PollMultiplexer(initial_delay=0, max_delay=0)
+    multiplexer.add(
+        "a",
+        make_poller(
+            FakeDeferredLROPolling(
+                result="a", polls_until_done=1, final_status="failed"
+            )
+        ),
+    )
+
+    completed = list(multiplexer.as_completed())
+
+    assert len(completed) == 1
+    assert completed[0][0] == "a"
+    with pytest.raises(HttpResponseError):
+        completed[0][1].result()
+    assert len(multiplexer) == 0
@@ -0,0 +1,125 @@
+import asyncio
+from pathlib import Path
+from unittest.mock import Mock
+
+import pytest
+from azure.core.pipeline.policies import RetryPolicy
+
+from azure_pdf_parser import AzureApiWrapper
+from azure_pdf_parser.rate_limit import (
+    AzureRateLimiter,
+    FileTokenBucket,
+    LocalTokenBucket,
+    RateLimitPolicy,
+)
+
+
+def test_local_token_bucket() -> None:
+    """Test that the bucket allows a burst up to its capacity and then waits."""
+    bucket = LocalTokenBucket(rate=10, capacity=2)
+
+    assert bucket.try_acquire() == 0
+    assert bucket.try_acquire() == 0
+    wait = bucket.try_acquire()
+    assert 0 < wait <= 0.1
+
+
+def test_token_bucket_acquire_waits(monkeypatch) -> None:
+    """Test that acquiring from an empty bucket sleeps for the time to refill."""
+    sleeps = []
+    monkeypatch.setattr("time.sleep", sleeps.append)
+    bucket = LocalTokenBucket(rate=1000, capacity=1)
+
+    bucket.acquire()
+    bucket.acquire()
+    asyncio.run(bucket.acquire_async())
+
+    assert len(sleeps) >= 1
+    assert all(0 < sleep <= 0.001 for sleep in sleeps)
+
+
+def test_invalid_token_bucket() -> None:
+    """Test that invalid rates and capacities are rejected."""
+    with pytest.raises(ValueError):
+        LocalTokenBucket(rate=0)
+    with pytest.raises(ValueError):
+        LocalTokenBucket(rate=1, capacity=0.5)
+
+
+def test_token_bucket_fractional_rate() -> None:
+    """Test that rates below one per second default to a capacity of one token."""
+    rate_limiter = AzureRateLimiter.from_tps(analyze_tps=0.5)
+    assert rate_limiter.analyze_bucket.capacity == 1
+    assert rate_limiter.analyze_bucket.try_acquire() == 0
+    assert rate_limiter.analyze_bucket.try_acquire() == pytest.approx(2, abs=0.1)
+
+
+def test_file_token_bucket_is_shared(tmp_path: Path) -> None:
+    """Test that buckets using the same state file share a budget."""
+    first_bucket = FileTokenBucket(tmp_path / "analyze.bucket", rate=1, capacity=2)
+    second_bucket = FileTokenBucket(tmp_path / "analyze.bucket", rate=1, capacity=2)
+
+    assert first_bucket.try_acquire() == 0
+    assert second_bucket.try_acquire() == 0
+    assert first_bucket.try_acquire() > 0
+    assert second_bucket.try_acquire() > 0
+
+
+def test_file_token_bucket_async(tmp_path: Path) -> None:
+    """Test that the file bucket takes its lock off the event loop."""
+    bucket = FileTokenBucket(tmp_path / "analyze.bucket", rate=1, capacity=1)
+
+    assert asyncio.run(bucket.try_acquire_async()) == 0
+    assert asyncio.run(bucket.try_acquire_async()) > 0
+
+
+def test_rate_limiter_budgets(tmp_path: Path) -> None:
+    """Test that analyze submissions and status polls use separate budgets."""
+    rate_limiter = AzureRateLimiter.from_tps(analyze_tps=1, poll_tps=5)
+    assert rate_limiter.bucket_for_method("POST") is rate_limiter.analyze_bucket
+    assert rate_limiter.bucket_for_method("get") is rate_limiter.poll_bucket
+    assert rate_limiter.analyze_bucket.rate == 1
+    assert rate_limiter.poll_bucket.rate == 5
+
+    shared_rate_limiter = AzureRateLimiter.from_tps(state_dir=tmp_path)
+    assert isinstance(shared_rate_limiter.analyze_bucket, FileTokenBucket)
+    assert (tmp_path / "analyze.bucket").exists()
+    assert (tmp_path / "poll.bucket").exists()
+
+
+def test_rate_limit_policy() -> None:
+    """Test that the policy waits for the rate limiter before sending a request."""
+    rate_limiter = Mock()
+    policy = RateLimitPolicy(rate_limiter)
+    policy.next = Mock()
+    request = Mock()
+    request.http_request.method = "POST"
+
+    response = policy.send(request)
+
+    rate_limiter.acquire.assert_called_once_with("POST")
+    policy.next.send.assert_called_once_with(request)
+    assert response == policy.next.send.return_value
+
+
+def test_azure_api_wrapper_rate_limiter() -> None:
+    """Test that the wrapper's client sends requests through the rate limit policy."""
+    rate_limiter = AzureRateLimiter.from_tps()
+    rate_limiter.analyze_bucket = Mock()
+    rate_limiter.analyze_bucket.acquire.side_effect = RuntimeError("Rate limited")
+
+    azure_client = AzureApiWrapper("key", "https://example.com", rate_limiter)
+
+    with pytest.raises(RuntimeError, match="Rate limited"):
+        azure_client.begin_analyze_document_from_bytes(b"%PDF-1.7")
+
+
+def test_azure_api_wrapper_rate_limits_retries() -> None:
+    """Test that the rate limit policy follows the pipeline's retry policy."""
+    azure_client = AzureApiWrapper(
+        "key", "https://example.com", AzureRateLimiter.from_tps()
+    )
+
+    pipeline = azure_client.document_analysis_client._client._client._pipeline
+    policy_types = [type(policy) for policy in pipeline._impl_policies]
+    assert policy_types.index(RateLimitPolicy) > policy_types.index(RetryPolicy)
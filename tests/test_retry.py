@@ -0,0 +1,139 @@
+import asyncio
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+import requests
+from azure.core.exceptions import HttpResponseError, ServiceRequestError
+from pypdf.errors import PdfReadError
+
+from azure_pdf_parser import AzureApiWrapper
+from azure_pdf_parser.retry import ErrorKind, RetryPolicy, parse_retry_after
+from azure_pdf_parser.utils import (
+    call_api_with_error_handling,
+    call_api_with_error_handling_async,
+)
+
+
+def http_response_error(status_code: int, headers: dict = {}) -> HttpResponseError:
+    """Create an azure HttpResponseError for a response with the given status."""
+    response = Mock()
+    response.status_code = status_code
+    response.reason = "Reason"
+    response.headers = headers
+    response.text.return_value = ""
+    return HttpResponseError(response=response)
+
+
+@pytest.mark.parametrize(
+    "error,kind",
+    [
+        (http_response_error(429), ErrorKind.THROTTLED),
+        (http_response_error(503), ErrorKind.SERVER_ERROR),
+        (http_response_error(408), ErrorKind.TIMEOUT),
+        (http_response_error(400), ErrorKind.PERMANENT),
+        (http_response_error(404), ErrorKind.PERMANENT),
+        (requests.Timeout(), ErrorKind.TIMEOUT),
+        (TimeoutError(), ErrorKind.TIMEOUT),
+        (ConnectionResetError(), ErrorKind.CONNECTION),
+        (requests.ConnectionError(), ErrorKind.CONNECTION),
+        (ServiceRequestError("Connection refused"), ErrorKind.CONNECTION),
+        (PdfReadError("EOF marker not found"), ErrorKind.PERMANENT),
+        (Exception("API error"), ErrorKind.UNKNOWN),
+    ],
+)
+def test_classify(error: Exception, kind: ErrorKind) -> None:
+    """Test that errors are classified correctly."""
+    assert RetryPolicy.classify(error) == kind
+
+
+def test_backoff() -> None:
+    """Test that the backoff grows exponentially, up to the maximum."""
+    retry_policy = RetryPolicy(initial_backoff=1, max_backoff=5, jitter=False)
+
+    assert [retry_policy.backoff(attempt) for attempt in range(5)] == [1, 2, 4, 5, 5]
+
+    retry_policy = RetryPolicy(initial_backoff=1, max_backoff=5)
+    assert all(0 <= retry_policy.backoff(4) <= 5 for _ in range(100))
+
+
+def test_backoff_honours_retry_after() -> None:
+    """Test that a Retry-After header is used as the minimum delay."""
+    retry_policy = RetryPolicy(initial_backoff=1, jitter=False)
+
+    error = http_response_error(429, headers={"retry-after": "10"})
+    assert retry_policy.backoff(0, error) == 10
+
+    error = http_response_error(429, headers={"retry-after-ms": "500"})
+    assert retry_policy.backoff(0, error) == 1
+
+
+def test_parse_retry_after() -> None:
+    """Test that the retry headers Azure may send are parsed."""
+    assert parse_retry_after({}) is None
+    assert parse_retry_after({"retry-after": "2"}) == 2
+    assert parse_retry_after({"x-ms-retry-after-ms": "1500"}) == 1.5
+    assert parse_retry_after({"retry-after": "Wed, 21 Oct 2015 07:28:00 GMT"}) == 0
+    assert parse_retry_after({"retry-after": "soon"}) is None
+
+
+def test_call_api_with_retry_policy(retry_sleeps: list[float]) -> None:
+    """Test that transient errors are retried after backing off, and counted."""
+    retry_policy = RetryPolicy(jitter=False)
+    mock_api_function = Mock(
+        side_effect=[http_response_error(429), requests.Timeout(), "response"]
+    )
+
+    result = call_api_with_error_handling(
+        3, mock_api_function, "arg1", retry_policy=retry_policy
+    )
+
+    assert result == "response"
+    assert mock_api_function.call_count == 3
+    assert retry_sleeps == [1, 2]
+    assert retry_policy.stats() == {
+        "calls": 3,
+        "successes": 1,
+        "retries": 2,
+        "failures": 0,
+        "errors": {"throttled": 1, "timeout": 1},
+    }
+
+
+def test_call_api_with_retry_policy_permanent_error(
+    retry_sleeps: list[float],
+) -> None:
+    """Test that permanent errors are raised without retrying."""
+    retry_policy = RetryPolicy()
+    mock_api_function = Mock(side_effect=http_response_error(400))
+
+    with pytest.raises(HttpResponseError):
+        call_api_with_error_handling(3, mock_api_function, retry_policy=retry_policy)
+
+    assert mock_api_function.call_count == 1
+    assert retry_sleeps == []
+    assert retry_policy.failures == 1
+    assert retry_policy.errors == {ErrorKind.PERMANENT: 1}
+
+
+def test_call_api_with_retry_policy_async(retry_sleeps: list[float]) -> None:
+    """Test that async calls are retried in the same way."""
+    retry_policy = RetryPolicy(jitter=False)
+    mock_api_function = AsyncMock(side_effect=[http_response_error(503), "response"])
+
+    result = asyncio.run(
+        call_api_with_error_handling_async(
+            3, mock_api_function, retry_policy=retry_policy
+        )
+    )
+
+    assert result == "response"
+    assert retry_sleeps == [1]
+    assert retry_policy.errors == {ErrorKind.SERVER_ERROR: 1}
+
+
+def test_azure_api_wrapper_disables_sdk_retries() -> None:
+    """Test that the SDK's retry policy makes no retries of its own."""
+    azure_client = AzureApiWrapper("key", "https://example.com")
+
+    retry_policy = azure_client.document_analysis_client._client._config.retry_policy
+    assert retry_policy.total_retries == 0
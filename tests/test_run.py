@@ -0,0 +1,145 @@
+from unittest.mock import MagicMock, patch
+
+from azure.ai.formrecognizer import AnalyzeResult
+from azure.core.exceptions import HttpResponseError
+
+# Note: azure_pdf_parser.run is imported in each test, as it reads the Azure
+# credentials from the environment on import and the cli tests monkeypatch them.
+
+
+def test_choose_processing_route_bytes(two_page_pdf_bytes: bytes) -> None:
+    """Test that documents from bytes are routed on their page count and size."""
+    from azure_pdf_parser.run import (
+        BATCHED_ROUTE,
+        SINGLE_CALL_ROUTE,
+        choose_processing_route,
+    )
+
+    assert choose_processing_route(two_page_pdf_bytes) == SINGLE_CALL_ROUTE
+    assert (
+        choose_processing_route(two_page_pdf_bytes, max_single_call_pages=1)
+        == BATCHED_ROUTE
+    )
+    assert (
+        choose_processing_route(
+            two_page_pdf_bytes, max_single_call_bytes=len(two_page_pdf_bytes) - 1
+        )
+        == BATCHED_ROUTE
+    )
+
+
+def test_choose_processing_route_url() -> None:
+    """Test that documents from urls are routed on their Content-Length."""
+    from azure_pdf_parser.run import (
+        BATCHED_ROUTE,
+        SINGLE_CALL_ROUTE,
+        choose_processing_route,
+    )
+
+    with patch("azure_pdf_parser.run.get_content_length", return_value=100):
+        assert (
+            choose_processing_route("https://example.com/", max_single_call_bytes=100)
+            == SINGLE_CALL_ROUTE
+        )
+        assert (
+            choose_processing_route("https://example.com/", max_single_call_bytes=99)
+            == BATCHED_ROUTE
+        )
+
+    with patch("azure_pdf_parser.run.get_content_length", return_value=None):
+        assert (
+            choose_processing_route("https://example.com/", max_single_call_bytes=1)
+            == SINGLE_CALL_ROUTE
+        )
+
+
+def test_process_document_routes_large_documents_to_batches(
+    two_page_pdf_bytes: bytes, one_page_analyse_result: AnalyzeResult
+) -> None:
+    """Test that documents over the thresholds skip the single call."""
+    from azure_pdf_parser.run import process_document
+
+    process_callable = MagicMock()
+    process_callable_retry = MagicMock(return_value=([], one_page_analyse_result))
+
+    result = process_document(
+        two_page_pdf_bytes,
+        process_callable=process_callable,
+        process_callable_retry=process_callable_retry,
+        max_single_call_pages=1,
+    )
+
+    assert result == one_page_analyse_result
+    process_callable.assert_not_called()
+    process_callable_retry.assert_called_once_with(two_page_pdf_bytes)
+
+
+def test_process_document_falls_back_to_batches(
+    two_page_pdf_bytes: bytes, one_page_analyse_result: AnalyzeResult
+) -> None:
+    """Test that a rejected single call still falls back to the batched path."""
+    from azure_pdf_parser.run import process_document
+
+    error = HttpResponseError("Too many pages")
+    error.status_code = 400
+    process_callable = MagicMock(side_effect=error)
+    process_callable_retry = MagicMock(return_value=([], one_page_analyse_result))
+
+    result = process_document(
+        two_page_pdf_bytes,
+        process_callable=process_callable,
+        process_callable_retry=process_callable_retry,
+    )
+
+    assert result == one_page_analyse_result
+    process_callable_retry.assert_called_once_with(two_page_pdf_bytes)
+
+
+def test_process_document_doesnt_fall_back_when_throttled(
+    two_page_pdf_bytes: bytes,
+) -> None:
+    """Test that a single call failing with a retryable error isn't split."""
+    from azure_pdf_parser.run import process_document
+
+    error = HttpResponseError("Too many requests")
+    error.status_code = 429
+    process_callable = MagicMock(side_effect=error)
+    process_callable_retry = MagicMock()
+
+    result = process_document(
+        two_page_pdf_bytes,
+        process_callable=process_callable,
+        process_callable_retry=process_callable_retry,
+    )
+
+    assert result is None
+    assert process_callable.call_count == 3
+    process_callable_retry.assert_not_called()
+
+
+def test_analyze_and_convert_batches(
+    parser_input, one_page_analyse_result: AnalyzeResult
+) -> None:
+    """Test that batches are converted as they're handed over by the wrapper."""
+    from azure_pdf_parser.base import PDFPagesBatchExtracted
+    from azure_pdf_parser.run import analyze_and_convert_batches
+
+    def analyze_large_document(document_parameter, on_batch):
+        on_batch(
+            PDFPagesBatchExtracted(
+                page_range=(1, 1),
+                extracted_content=one_page_analyse_result,
+                batch_number=0,
+                batch_size_max=1,
+            )
+        )
+        return [], None
+
+    batches, converter = analyze_and_convert_batches(
+        analyze_large_document, b"document"
+    )
+
+    assert batches == []
+    parser_output = converter.to_parser_output(parser_input, md5_sum="123456")
+    assert parser_output.pdf_data is not None
+    assert len(parser_output.pdf_data.text_blocks) > 0
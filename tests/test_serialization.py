@@ -0,0 +1,109 @@
+import importlib.util
+import io
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+from azure.ai.formrecognizer import AnalyzeResult
+from cpr_sdk.parser_models import ParserInput, ParserOutput
+
+from azure_pdf_parser.convert import azure_api_response_to_parser_output
+from azure_pdf_parser.experimental_base import ExperimentalParserOutput
+from azure_pdf_parser.serialization import (
+    JsonBackend,
+    OrjsonBackend,
+    StdlibJsonBackend,
+    default_json_backend,
+    load_analyze_result,
+    save_analyze_result,
+    save_model_json,
+    write_model_json,
+)
+
+
+def test_write_model_json(
+    parser_input: ParserInput, sixteen_page_analyse_result: AnalyzeResult
+) -> None:
+    """Test that streamed json is the same as model_dump_json and loads back."""
+    for experimental_extract_tables, compact_tables, output_type in (
+        (False, False, ParserOutput),
+        (True, False, ExperimentalParserOutput),
+        (True, True, ExperimentalParserOutput),
+    ):
+        parser_output = azure_api_response_to_parser_output(
+            parser_input=parser_input,
+            md5_sum="123456",
+            api_response=AnalyzeResult.from_dict(sixteen_page_analyse_result.to_dict()),
+            experimental_extract_tables=experimental_extract_tables,
+            compact_tables=compact_tables,
+        )
+        file = io.StringIO()
+        write_model_json(parser_output, file)
+
+        assert file.getvalue() == parser_output.model_dump_json()
+        assert output_type.model_validate_json(file.getvalue()) == parser_output
+
+
+def test_save_model_json(
+    tmp_path: Path, parser_input: ParserInput, one_page_analyse_result: AnalyzeResult
+) -> None:
+    """Test that models are saved atomically, keeping the old file on failure."""
+    parser_output = azure_api_response_to_parser_output(
+        parser_input=parser_input,
+        md5_sum="123456",
+        api_response=one_page_analyse_result,
+    )
+    path = tmp_path / "output.json"
+    path.write_text("previous output")
+
+    with (
+        patch(
+            "azure_pdf_parser.serialization.write_model_json",
+            side_effect=RuntimeError("interrupted"),
+        ),
+        pytest.raises(RuntimeError),
+    ):
+        save_model_json(parser_output, path)
+    assert path.read_text() == "previous output"
+    assert list(tmp_path.iterdir()) == [path]
+
+    save_model_json(parser_output, path)
+    assert path.read_bytes() == parser_output.model_dump_json().encode()
+    assert ParserOutput.model_validate_json(path.read_bytes()) == parser_output
+    assert list(tmp_path.iterdir()) == [path]
+
+
+requires_orjson = pytest.mark.skipif(
+    importlib.util.find_spec("orjson") is None, reason="orjson isn't installed"
+)
+
+
+@pytest.mark.parametrize(
+    "backend_class",
+    [StdlibJsonBackend, pytest.param(OrjsonBackend, marks=requires_orjson)],
+)
+def test_save_and_load_analyze_result(
+    tmp_path: Path,
+    backend_class: type[JsonBackend],
+    sixteen_page_analyse_result: AnalyzeResult,
+) -> None:
+    """Test that raw responses load back with the backend or the json module."""
+    path = tmp_path / "raw.json"
+    save_analyze_result(sixteen_page_analyse_result, path, backend=backend_class())
+
+    for backend in (backend_class(), StdlibJsonBackend()):
+        result = load_analyze_result(path, backend=backend)
+        assert isinstance(result, AnalyzeResult)
+        assert result.to_dict() == sixteen_page_analyse_result.to_dict()
+    assert list(tmp_path.iterdir()) == [path]
+
+
+@requires_orjson
+def test_default_json_backend() -> None:
+    """Test that orjson is used where it's installed, falling back to json."""
+    assert isinstance(default_json_backend(), OrjsonBackend)
+
+    with patch("azure_pdf_parser.serialization.orjson", None):
+        assert isinstance(default_json_backend(), StdlibJsonBackend)
+        with pytest.raises(RuntimeError):
+            OrjsonBackend()
@@ -1,19 +1,34 @@
 import io
+import logging
 import unittest
+from typing import Iterator
 from unittest import mock
 
+import pytest
 from azure.ai.formrecognizer import AnalyzeResult
+from pypdf import PdfReader
 
 from azure_pdf_parser import PDFPagesBatchExtracted
 from azure_pdf_parser.base import PDFPagesBatch
 from azure_pdf_parser.utils import (
+    HttpRangeReader,
     calculate_md5_sum,
     call_api_with_error_handling,
+    download_document,
+    get_remote_pdf_page_count,
+    iter_batches,
     merge_responses,
     propagate_page_number,
     split_into_batches,
+    split_into_page_ranges,
+    write_pdf_pages,
+)
+from tests.helpers import (
+    is_valid_md5,
+    is_valid_pdf,
+    make_range_request_mocks,
+    make_shared_resources_pdf,
 )
-from tests.helpers import is_valid_md5, is_valid_pdf
 
 
 @mock.patch("azure_pdf_parser.utils.logger")
@@ -182,6 +197,44 @@ def test_merge_api_responses_sixteen_page_results(
     assert len(merged_api_response.tables) == table_number_initial
 
 
+def test_merge_responses_rebases_spans(
+    sixteen_page_analyse_result: AnalyzeResult,
+) -> None:
+    """Test that the spans of merged batches are offsets into the merged content."""
+    api_responses = [
+        PDFPagesBatchExtracted(
+            page_range=(first_page, first_page + 15),
+            extracted_content=AnalyzeResult.from_dict(
+                sixteen_page_analyse_result.to_dict()
+            ),
+            batch_number=batch_number,
+            batch_size_max=16,
+        )
+        for batch_number, first_page in enumerate((1, 17))
+    ]
+
+    merged_api_response = merge_responses(api_responses, rebuild_content=True)
+
+    assert merged_api_response.content == "\n".join(
+        [sixteen_page_analyse_result.content] * 2
+    )
+    assert merged_api_response.paragraphs is not None
+    for paragraph in merged_api_response.paragraphs:
+        span = paragraph.spans[0]
+        assert (
+            merged_api_response.content[span.offset : span.offset + span.length]
+            == paragraph.content
+        )
+    paragraph_spans = [
+        (paragraph.spans[0].offset, paragraph.spans[0].length)
+        for paragraph in merged_api_response.paragraphs
+    ]
+    assert len(set(paragraph_spans)) == len(paragraph_spans)
+    assert merged_api_response.pages[16].spans[0].offset == (
+        len(sixteen_page_analyse_result.content) + 1
+    )
+
+
 def test_split_into_batches(
     one_page_pdf_bytes: bytes,
     two_page_pdf_bytes: bytes,
@@ -240,3 +293,169 @@ def test_calculate_md5_sum(one_page_pdf_bytes: bytes) -> None:
     md5_sum = calculate_md5_sum(b"Random bytes!")
     assert isinstance(md5_sum, str)
     assert is_valid_md5(md5_sum)
+
+
+def test_download_document(two_page_pdf_bytes: bytes) -> None:
+    """Test that a document is streamed in chunks into a readable file."""
+    chunks = [
+        two_page_pdf_bytes[i : i + 1024]
+        for i in range(0, len(two_page_pdf_bytes), 1024)
+    ]
+    mock_response = mock.Mock()
+    mock_response.status_code = 200
+    mock_response.iter_content.return_value = iter(chunks)
+
+    with mock.patch("requests.get", return_value=mock_response) as mock_get:
+        with download_document(
+            "https://example.com/test.pdf", chunk_size=1024, spool_max_size=2048
+        ) as document_file:
+            assert document_file.read() == two_page_pdf_bytes
+            document_file.seek(0)
+            batches = split_into_batches(document_file, batch_size=1)
+
+    mock_get.assert_called_once_with("https://example.com/test.pdf", stream=True)
+    mock_response.iter_content.assert_called_once_with(chunk_size=1024)
+    mock_response.close.assert_called_once()
+    assert [batch.page_range for batch in batches] == [(1, 1), (2, 2)]
+
+
+def test_split_into_batches_max_batch_bytes(two_page_pdf_bytes: bytes) -> None:
+    """Test that batches are shrunk to fit the max batch bytes."""
+    single_page_batches = split_into_batches(
+        io.BytesIO(two_page_pdf_bytes), batch_size=1
+    )
+    two_page_batch = split_into_batches(io.BytesIO(two_page_pdf_bytes), batch_size=2)[0]
+    max_page_bytes = max(len(batch.batch_content) for batch in single_page_batches)
+    assert max_page_bytes < len(two_page_batch.batch_content)
+
+    batches = split_into_batches(
+        io.BytesIO(two_page_pdf_bytes),
+        batch_size=2,
+        max_batch_bytes=len(two_page_batch.batch_content),
+    )
+    assert [batch.page_range for batch in batches] == [(1, 2)]
+
+    batches = split_into_batches(
+        io.BytesIO(two_page_pdf_bytes), batch_size=2, max_batch_bytes=max_page_bytes
+    )
+    assert [batch.page_range for batch in batches] == [(1, 1), (2, 2)]
+    assert [batch.batch_number for batch in batches] == [0, 1]
+    for batch in batches:
+        assert len(batch.batch_content) <= max_page_bytes
+        assert batch.batch_size_max == 2
+        assert is_valid_pdf(batch.batch_content)
+
+    # Pages larger than the limit on their own still get a batch each.
+    batches = split_into_batches(
+        io.BytesIO(two_page_pdf_bytes), batch_size=2, max_batch_bytes=1
+    )
+    assert [batch.page_range for batch in batches] == [(1, 1), (2, 2)]
+
+    with pytest.raises(ValueError):
+        split_into_batches(io.BytesIO(two_page_pdf_bytes), max_batch_bytes=0)
+
+
+def test_iter_batches(two_page_pdf_bytes: bytes) -> None:
+    """Test that batches are written lazily, matching split_into_batches."""
+    batches = iter_batches(io.BytesIO(two_page_pdf_bytes), batch_size=1)
+    assert isinstance(batches, Iterator)
+
+    first_batch = next(batches)
+    assert first_batch.page_range == (1, 1)
+    assert [batch.page_range for batch in batches] == [(2, 2)]
+    assert (
+        first_batch.batch_content
+        == (
+            split_into_batches(io.BytesIO(two_page_pdf_bytes), batch_size=1)[0]
+        ).batch_content
+    )
+
+
+def test_iter_batches_only_measures_optimization_when_debug_logging(
+    two_page_pdf_bytes: bytes, caplog: pytest.LogCaptureFixture
+) -> None:
+    """Test that batches are only written a second time to log the bytes saved."""
+    for level, writes in ((logging.INFO, 2), (logging.DEBUG, 4)):
+        caplog.set_level(level, logger="azure_pdf_parser.utils")
+        with mock.patch(
+            "azure_pdf_parser.utils.write_pdf_pages", wraps=write_pdf_pages
+        ) as mock_write_pdf_pages:
+            split_into_batches(io.BytesIO(two_page_pdf_bytes), batch_size=1)
+        assert mock_write_pdf_pages.call_count == writes
+
+
+def test_split_into_batches_max_workers(two_page_pdf_bytes: bytes) -> None:
+    """Test that batches written in processes match those written serially."""
+    serial_batches = split_into_batches(io.BytesIO(two_page_pdf_bytes), batch_size=1)
+
+    parallel_batches = split_into_batches(
+        io.BytesIO(two_page_pdf_bytes), batch_size=1, max_workers=2
+    )
+    assert parallel_batches == serial_batches
+
+    with open("./tests/data/sample-two-page.pdf", "rb") as document_file:
+        parallel_batches = split_into_batches(
+            document_file, batch_size=1, max_workers=2
+        )
+    assert parallel_batches == serial_batches
+
+    with pytest.raises(ValueError):
+        split_into_batches(io.BytesIO(two_page_pdf_bytes), max_workers=0)
+
+
+def test_write_pdf_pages_optimize() -> None:
+    """Test that optimizing drops only the resources none of the pages use."""
+    pdf = PdfReader(io.BytesIO(make_shared_resources_pdf(page_count=3)))
+
+    batch = PdfReader(io.BytesIO(write_pdf_pages(pdf.pages[:1], optimize=True)))
+    assert list(batch.pages[0]["/Resources"]["/Font"]) == ["/F1"]
+    assert batch.pages[0].extract_text() == "page 1"
+
+    batch = PdfReader(io.BytesIO(write_pdf_pages(pdf.pages[1:], optimize=True)))
+    for page in batch.pages:
+        assert sorted(page["/Resources"]["/Font"]) == ["/F2", "/F3"]
+    assert [page.extract_text() for page in batch.pages] == ["page 2", "page 3"]
+
+    # The source document's pages are left as they were.
+    assert sorted(pdf.pages[0]["/Resources"]["/Font"]) == ["/F1", "/F2", "/F3"]
+    assert len(write_pdf_pages(pdf.pages[:1], optimize=True)) < len(
+        write_pdf_pages(pdf.pages[:1])
+    )
+
+
+def test_split_into_page_ranges() -> None:
+    """Test that page ranges cover the document in batches of at most batch_size."""
+    assert split_into_page_ranges(5, batch_size=2) == [(1, 2), (3, 4), (5, 5)]
+    assert split_into_page_ranges(4, batch_size=2) == [(1, 2), (3, 4)]
+    assert split_into_page_ranges(1) == [(1, 1)]
+
+
+def test_http_range_reader(two_page_pdf_bytes: bytes) -> None:
+    """Test that the reader serves reads and seeks from range requests."""
+    _, get = make_range_request_mocks(two_page_pdf_bytes)
+
+    with mock.patch("requests.Session.get", side_effect=get):
+        range_reader = HttpRangeReader(
+            "https://example.com/test.pdf", len(two_page_pdf_bytes)
+        )
+        assert range_reader.read(8) == two_page_pdf_bytes[:8]
+        range_reader.seek(-5, io.SEEK_END)
+        assert range_reader.read() == two_page_pdf_bytes[-5:]
+        assert range_reader.read(1) == b""
+
+    assert range_reader.range_requests == 2
+
+
+def test_get_remote_pdf_page_count(two_page_pdf_bytes: bytes) -> None:
+    """Test that the page count is read without downloading the whole document."""
+    head_response, get = make_range_request_mocks(two_page_pdf_bytes)
+
+    with (
+        mock.patch("requests.head", return_value=head_response),
+        mock.patch("requests.Session.get", side_effect=get),
+    ):
+        assert get_remote_pdf_page_count("https://example.com/test.pdf") == 2
+
+    head_response.headers.pop("accept-ranges")
+    with mock.patch("requests.head", return_value=head_response):
+        assert get_remote_pdf_page_count("https://example.com/test.pdf") is None